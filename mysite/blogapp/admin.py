@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db.models import Count, Prefetch, QuerySet
+from django.http import HttpRequest
 
+from mysite.db import EstimatedCountPaginator
 from .models import Author, Category, Tag, Article
 
 
@@ -58,6 +61,11 @@ class ArticleAdmin(admin.ModelAdmin):
     list_display_links = "pk", "title", "author_name", "category_name"
     ordering = ["-pub_date", "title", "pk"]
     search_fields = ["title", "content", "author__name", "category__name", "tags__name"]
+    list_select_related = "author", "category"
+    # без COUNT(*) всей таблицы на каждой странице
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     readonly_fields = ["pub_date"]
     fieldsets = [
         ("Cтатья", {
@@ -72,10 +80,17 @@ class ArticleAdmin(admin.ModelAdmin):
 
     ]
 
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Кол-во тегов аннотацией, имена тегов одним запросом на страницу (автор и категория - list_select_related)"""
+        queryset = (super().get_queryset(request).
+                    annotate(tags_amount=Count("tags", distinct=True)).
+                    prefetch_related(Prefetch("tags", queryset=Tag.objects.only("name"))))
+        return queryset
+
     def short_content(self, article: Article) -> str:
         """Функция для отображения короткой версии контента в админке"""
-        if article.content:
-            content = article.content[:50] + ("..." if len(article.content) >= 50 else "")
+        if article.excerpt:
+            content = article.excerpt[:50] + ("..." if len(article.excerpt) >= 50 else "")
             return content
         else:
             return "-"
@@ -84,18 +99,17 @@ class ArticleAdmin(admin.ModelAdmin):
 
     def tags_amount(self, article: Article) -> int:
         """
-        Функция подсчитывающая кол - во тегов для вывода в админ панель
+        Кол - во тегов для вывода в админ панель (аннотация из get_queryset)
         :param article: модель авторов
         :return: кол - во тегов
         """
-        tags = article.tags.count()
-        return tags
+        return article.tags_amount
     tags_amount.admin_order_field = "tags_amount"
     tags_amount.short_description = "Кол-во тегов"
 
     def display_3_tags(self, article: Article) -> str:
         """Функция для отображения первых трех тегов в админке"""
-        tags = article.tags.all()[:3]  # QuerySet
+        tags = list(article.tags.all())[:3]  # из prefetch, без запроса
         if not tags:
             return "Нет тегов"
         return ", ".join(tag.name for tag in tags)
@@ -1,5 +1,33 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 
 
 class BlogappConfig(AppConfig):
     name = 'blogapp'
+
+    def ready(self):
+        from . import cache, facets, related
+        from .models import Article, Author, Category, Tag
+
+        # Изменения статьи и связанных с ней моделей меняют версию кэша статьи.
+        # Автор и категория удаляются вместе со статьями, тег - нет: его ловим до удаления связей
+        post_save.connect(cache.article_changed, sender=Article, dispatch_uid="blog_article_saved")
+        post_delete.connect(cache.article_changed, sender=Article, dispatch_uid="blog_article_deleted")
+        post_save.connect(cache.author_changed, sender=Author, dispatch_uid="blog_author_saved")
+        post_save.connect(cache.category_changed, sender=Category, dispatch_uid="blog_category_saved")
+        post_save.connect(cache.tag_changed, sender=Tag, dispatch_uid="blog_tag_saved")
+        pre_delete.connect(cache.tag_changed, sender=Tag, dispatch_uid="blog_tag_deleted")
+        m2m_changed.connect(cache.article_tags_changed, sender=Article.tags.through, dispatch_uid="blog_article_tags")
+
+        # Кол-ва фасетов и битовый индекс пересчитываются после изменений статей, тегов и категорий
+        post_save.connect(facets.facets_changed, sender=Article, dispatch_uid="blog_facets_article_saved")
+        post_delete.connect(facets.facets_changed, sender=Article, dispatch_uid="blog_facets_article_deleted")
+        m2m_changed.connect(facets.facets_changed, sender=Article.tags.through, dispatch_uid="blog_facets_article_tags")
+        for model in (Tag, Category):
+            post_save.connect(facets.facets_changed, sender=model, dispatch_uid=f"blog_facets_{model.__name__}_saved")
+            post_delete.connect(facets.facets_changed, sender=model, dispatch_uid=f"blog_facets_{model.__name__}_deleted")
+
+        # Похожие статьи пересчитываются при изменении тегов, заголовок статьи выводится в чужих списках
+        m2m_changed.connect(related.article_tags_changed, sender=Article.tags.through, dispatch_uid="blog_related_tags")
+        pre_delete.connect(related.tag_deleted, sender=Tag, dispatch_uid="blog_related_tag_deleted")
+        post_save.connect(related.article_saved, sender=Article, dispatch_uid="blog_related_article_saved")
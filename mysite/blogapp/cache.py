@@ -0,0 +1,79 @@
+"""
+Кэш отрендеренных статей блога.
+
+HTML тела статьи хранится под ключом blogapp:article:<pk>:<версия>.
+Версия статьи меняется при изменении самой статьи, ее автора, категории
+или тегов - старые фрагменты просто перестают читаться и истекают сами.
+Вытесненная версия заменяется новой, а не нулевой (mysite.cache.get_or_init_version).
+"""
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from mysite.cache import get_or_init_version, new_version
+from .models import Article, Author, Category, Tag
+
+
+ARTICLE_CACHE_TIMEOUT = getattr(settings, "BLOG_ARTICLE_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def article_version_key(article_id: int) -> str:
+    return f"blogapp:article:{article_id}:version"
+
+
+def article_fragment_key(article_id: int) -> str:
+    """Ключ фрагмента с текущей версией статьи (при попадании - один запрос к кэшу)."""
+    version = get_or_init_version(article_version_key(article_id))
+    return f"blogapp:article:{article_id}:{version}"
+
+
+def set_article_fragment(key: str, fragment: Dict[str, str]) -> None:
+    cache.set(key, fragment, ARTICLE_CACHE_TIMEOUT)
+
+
+def bump_article_versions(article_ids: Iterable[int]) -> None:
+    """
+    Новая версия для статей после коммита транзакции.
+
+    До коммита читатель мог бы закэшировать старые данные уже под новой версией.
+    """
+    article_ids = set(article_ids)
+    if not article_ids:
+        return
+
+    def bump():
+        version = new_version()
+        cache.set_many({article_version_key(article_id): version for article_id in article_ids}, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def article_changed(sender, instance: Article, **kwargs) -> None:
+    bump_article_versions([instance.pk])
+
+
+def author_changed(sender, instance: Author, **kwargs) -> None:
+    bump_article_versions(Article.objects.filter(author_id=instance.pk).values_list("pk", flat=True))
+
+
+def category_changed(sender, instance: Category, **kwargs) -> None:
+    bump_article_versions(Article.objects.filter(category_id=instance.pk).values_list("pk", flat=True))
+
+
+def tag_changed(sender, instance: Tag, **kwargs) -> None:
+    bump_article_versions(Article.tags.through.objects.filter(tag_id=instance.pk).values_list("article_id", flat=True))
+
+
+def article_tags_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    """m2m_changed Article.tags: с обеих сторон связи."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        bump_article_versions([instance.pk])
+    elif action == "pre_clear":
+        tag_changed(sender, instance)
+    else:
+        bump_article_versions(pk_set or [])
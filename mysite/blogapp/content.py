@@ -0,0 +1,53 @@
+"""
+Компиляция контента статьи.
+
+Article.content пишется в Markdown (допускается HTML), при сохранении статьи
+он один раз превращается в очищенный HTML, текстовую выдержку и кол-во слов.
+Страницы, RSS и API отдают уже готовые значения.
+"""
+import html
+import re
+from typing import NamedTuple
+
+import markdown
+import nh3
+
+
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+
+EXCERPT_LENGTH = 100
+
+_whitespace = re.compile(r"\s+")
+
+
+class CompiledContent(NamedTuple):
+    html: str
+    excerpt: str
+    word_count: int
+
+
+def render_html(text: str) -> str:
+    """Markdown -> HTML без опасных тегов и атрибутов (script, on*, javascript: и т.п.)."""
+    rendered = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, output_format="html")
+    return nh3.clean(rendered, link_rel="noopener noreferrer nofollow")
+
+
+def plain_text(rendered: str) -> str:
+    """Текст HTML без разметки, пробелы схлопнуты."""
+    text = html.unescape(nh3.clean(rendered, tags=set()))
+    return _whitespace.sub(" ", text).strip()
+
+
+def make_excerpt(text: str, length: int = EXCERPT_LENGTH) -> str:
+    if len(text) <= length:
+        return text
+    return text[:length] + "..."
+
+
+def compile_content(text: str) -> CompiledContent:
+    if not text:
+        return CompiledContent(html="", excerpt="", word_count=0)
+
+    rendered = render_html(text)
+    plain = plain_text(rendered)
+    return CompiledContent(html=rendered, excerpt=make_excerpt(plain), word_count=len(plain.split()))
@@ -0,0 +1,189 @@
+"""
+Фасетный просмотр статей по тегам и категориям.
+
+Кол-ва статей по каждому тегу и категории хранятся в таблице FacetCount.
+Для выборки по нескольким фасетам в памяти процесса держится индекс
+тег/категория -> битовая карта статей (int), где номер бита - позиция статьи
+в порядке (-pub_date, title, pk). Пересечение фильтров и подсчет фасетов - это
+операции & и bit_count() над int, без запросов к таблице связей.
+
+Индекс перестраивается лениво при смене версии в кэше (после изменений статей,
+тегов и категорий), так что все процессы видят изменения. Сколько бы сигналов
+ни пришло в транзакции, пересчет после ее коммита выполняется один раз.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from mysite.cache import get_or_init_version, new_version
+from mysite.db import on_commit_collect
+from .models import Article, Category, FacetCount, Tag
+
+
+FACETS_VERSION_KEY = "blogapp:facets:version"
+
+SEEK_BLOCK_BYTES = 512  # блок битовой карты при поиске начала страницы (4096 статей)
+
+
+def bitmap(positions: Iterable[int], size: int) -> int:
+    """int с установленными битами positions (собирается через bytearray, без копирования длинных int)."""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class FacetIndex:
+    """Битовые карты опубликованных статей по тегам и категориям."""
+
+    def __init__(self, version: int, article_ids: List[int],
+                 tags: Dict[int, int], categories: Dict[int, int],
+                 tag_names: Dict[int, str], category_names: Dict[int, str]):
+        self.version = version
+        self.article_ids = article_ids  # позиция бита -> id статьи
+        self.all = (1 << len(article_ids)) - 1
+        self.tags = tags
+        self.categories = categories
+        self.tag_names = tag_names
+        self.category_names = category_names
+
+    @classmethod
+    def build(cls, version: int) -> "FacetIndex":
+        published = Article.objects.filter(pub_date__isnull=False)
+
+        rows = published.order_by("-pub_date", "title", "pk").values_list("pk", "category_id")
+        article_ids, positions = [], {}
+        category_positions: Dict[int, List[int]] = {}
+        for position, (article_id, category_id) in enumerate(rows.iterator()):
+            article_ids.append(article_id)
+            positions[article_id] = position
+            category_positions.setdefault(category_id, []).append(position)
+
+        tag_positions: Dict[int, List[int]] = {}
+        links = Article.tags.through.objects.filter(article__pub_date__isnull=False).values_list("article_id", "tag_id")
+        for article_id, tag_id in links.iterator():
+            position = positions.get(article_id)
+            if position is not None:  # статья опубликована после чтения списка статей
+                tag_positions.setdefault(tag_id, []).append(position)
+
+        size = len(article_ids)
+        return cls(version=version,
+                   article_ids=article_ids,
+                   tags={tag_id: bitmap(items, size) for tag_id, items in tag_positions.items()},
+                   categories={category_id: bitmap(items, size) for category_id, items in category_positions.items()},
+                   tag_names=dict(Tag.objects.values_list("pk", "name")),
+                   category_names=dict(Category.objects.values_list("pk", "name")))
+
+    def select(self, tag_ids: Iterable[int] = (), category_ids: Iterable[int] = ()) -> int:
+        """Статьи со всеми выбранными тегами и любой из выбранных категорий."""
+        selection = self.all
+        for tag_id in tag_ids:
+            selection &= self.tags.get(tag_id, 0)
+
+        category_ids = list(category_ids)
+        if category_ids:
+            any_category = 0
+            for category_id in category_ids:
+                any_category |= self.categories.get(category_id, 0)
+            selection &= any_category
+
+        return selection
+
+    def counts(self, selection: int) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Сколько статей выборки приходится на каждый тег и каждую категорию."""
+        tag_counts = {tag_id: (selection & tag_bitmap).bit_count() for tag_id, tag_bitmap in self.tags.items()}
+        category_counts = {category_id: (selection & category_bitmap).bit_count()
+                           for category_id, category_bitmap in self.categories.items()}
+        return tag_counts, category_counts
+
+    def page(self, selection: int, offset: int, limit: int) -> List[int]:
+        """
+        id статей выборки в порядке сортировки.
+
+        Блоки карты до offset пропускаются целиком по bit_count(), биты перебираются
+        от младшего только в блоках самой страницы.
+        """
+        data = selection.to_bytes((selection.bit_length() + 7) // 8, "little")
+        ids = []
+        for start in range(0, len(data), SEEK_BLOCK_BYTES):
+            block = int.from_bytes(data[start:start + SEEK_BLOCK_BYTES], "little")
+            count = block.bit_count()
+            if count <= offset:
+                offset -= count
+                continue
+
+            while block and len(ids) < limit:
+                lowest = block & -block
+                if offset:
+                    offset -= 1
+                else:
+                    ids.append(self.article_ids[start * 8 + lowest.bit_length() - 1])
+                block ^= lowest
+            if len(ids) >= limit:
+                break
+        return ids
+
+
+_index: Optional[FacetIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_facet_index() -> FacetIndex:
+    """Индекс текущей версии (перестраивается один раз на процесс после изменений)."""
+    global _index
+
+    version = get_or_init_version(FACETS_VERSION_KEY)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = FacetIndex.build(version)
+        return _index
+
+
+def update_facet_counts() -> None:
+    """Пересчитывает таблицу FacetCount двумя агрегирующими запросами."""
+    tag_counts = dict(Article.tags.through.objects.
+                      filter(article__pub_date__isnull=False).
+                      values("tag_id").
+                      annotate(count=Count("article_id")).
+                      values_list("tag_id", "count"))
+    category_counts = dict(Article.objects.
+                           filter(pub_date__isnull=False).
+                           values("category_id").
+                           annotate(count=Count("pk")).
+                           values_list("category_id", "count"))
+
+    rows = [FacetCount(facet=FacetCount.FACET_TAG, value_id=tag_id, count=tag_counts.get(tag_id, 0))
+            for tag_id in Tag.objects.values_list("pk", flat=True)]
+    rows += [FacetCount(facet=FacetCount.FACET_CATEGORY, value_id=category_id, count=category_counts.get(category_id, 0))
+             for category_id in Category.objects.values_list("pk", flat=True)]
+
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows)
+
+
+def refresh_facets() -> None:
+    update_facet_counts()
+    cache.set(FACETS_VERSION_KEY, new_version(), timeout=None)
+
+
+def facets_changed(sender, **kwargs) -> None:
+    """Обработчик сигналов статей, тегов и категорий: один пересчет после коммита транзакции."""
+    if kwargs.get("action", "post_").startswith("pre_"):  # m2m_changed: только после изменения связей
+        return
+    on_commit_collect(FACETS_VERSION_KEY, lambda items: refresh_facets())
+
+
+def stored_counts() -> Tuple[Dict[int, int], Dict[int, int]]:
+    """Кол-ва без фильтров из таблицы FacetCount."""
+    tag_counts, category_counts = {}, {}
+    for facet, value_id, count in FacetCount.objects.values_list("facet", "value_id", "count"):
+        (tag_counts if facet == FacetCount.FACET_TAG else category_counts)[value_id] = count
+    return tag_counts, category_counts
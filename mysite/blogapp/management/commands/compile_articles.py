@@ -0,0 +1,48 @@
+from django.core.management import BaseCommand
+
+from blogapp.cache import bump_article_versions
+from blogapp.content import compile_content
+from blogapp.models import Article
+
+
+class Command(BaseCommand):
+    """
+    Перекомпилирует контент статей в HTML, выдержку и кол-во слов.
+
+    Нужна после изменения настроек Markdown или очистки HTML (blogapp.content).
+    Записываются только изменившиеся статьи, пачками через bulk_update.
+    """
+    help = "Перекомпилирует Markdown контент статей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("article_ids", nargs="*", type=int, help="ID статей (по умолчанию все)")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Compile articles")
+
+        articles = Article.objects.only("content", *Article.COMPILED_FIELDS).order_by("pk")
+        if options["article_ids"]:
+            articles = articles.filter(pk__in=options["article_ids"])
+
+        batch, updated = [], 0
+        for article in articles.iterator(chunk_size=options["batch_size"]):
+            compiled = compile_content(article.content)
+            if compiled == (article.content_html, article.excerpt, article.word_count):
+                continue
+
+            article.content_html, article.excerpt, article.word_count = compiled
+            batch.append(article)
+            if len(batch) >= options["batch_size"]:
+                updated += self.save(batch)
+                batch = []
+
+        updated += self.save(batch)
+        self.stdout.write(self.style.SUCCESS(f"Done, {updated} articles updated"))
+
+    @staticmethod
+    def save(batch) -> int:
+        """bulk_update не отправляет сигналы, поэтому версии кэша статей меняем сами"""
+        Article.objects.bulk_update(batch, Article.COMPILED_FIELDS)
+        bump_article_versions(article.pk for article in batch)
+        return len(batch)
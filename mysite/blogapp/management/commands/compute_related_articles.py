@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from blogapp.related import compute_related
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает таблицу похожих статей (blogapp.related).
+
+    При изменении тегов списки обновляются сами, полный пересчет нужен
+    периодически (IDF слов заголовков, измененные заголовки) и после импорта.
+    """
+    help = "Пересчитывает похожие статьи"
+
+    def add_arguments(self, parser):
+        parser.add_argument("article_ids", nargs="*", type=int, help="ID статей (по умолчанию все)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Compute related articles")
+        links = compute_related(options["article_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Done, {links} links saved"))
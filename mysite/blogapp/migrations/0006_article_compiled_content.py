@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+def compile_articles(apps, schema_editor):
+    """Компиляция контента уже существующих статей"""
+    from blogapp.content import compile_content
+
+    Article = apps.get_model("blogapp", "Article")
+    articles = list(Article.objects.only("content"))
+    for article in articles:
+        compiled = compile_content(article.content)
+        article.content_html, article.excerpt, article.word_count = compiled
+    Article.objects.bulk_update(articles, ["content_html", "excerpt", "word_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0005_alter_article_author_alter_article_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='HTML контента'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Выдержка'),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во слов'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='content',
+            field=models.TextField(blank=True, default='', help_text='Контент статьи в Markdown', verbose_name='Контент'),
+        ),
+        migrations.RunPython(compile_articles, migrations.RunPython.noop),
+    ]
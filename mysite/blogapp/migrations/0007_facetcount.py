@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-19 11:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_facets(apps, schema_editor):
+    """Начальные кол-ва опубликованных статей по тегам и категориям"""
+    Article = apps.get_model("blogapp", "Article")
+    Tag = apps.get_model("blogapp", "Tag")
+    Category = apps.get_model("blogapp", "Category")
+    FacetCount = apps.get_model("blogapp", "FacetCount")
+
+    published = Article.objects.filter(pub_date__isnull=False)
+    tag_counts = dict(published.values("tags").annotate(count=Count("pk")).values_list("tags", "count"))
+    category_counts = dict(published.values("category").annotate(count=Count("pk")).values_list("category", "count"))
+
+    rows = [FacetCount(facet="tag", value_id=pk, count=tag_counts.get(pk, 0))
+            for pk in Tag.objects.values_list("pk", flat=True)]
+    rows += [FacetCount(facet="category", value_id=pk, count=category_counts.get(pk, 0))
+             for pk in Category.objects.values_list("pk", flat=True)]
+    FacetCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0006_article_compiled_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('tag', 'Тег'), ('category', 'Категория')], max_length=10)),
+                ('value_id', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Кол-во статей фасета',
+                'verbose_name_plural': 'Кол-ва статей фасетов',
+                'ordering': ['facet', 'value_id'],
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value_id'), name='unique_facet_value')],
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 12:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogapp', '0007_facetcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='blogapp.article')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blogapp.article')),
+            ],
+            options={
+                'verbose_name': 'Похожая статья',
+                'verbose_name_plural': 'Похожие статьи',
+                'ordering': ['article', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('article', 'related'), name='unique_related_article')],
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.urls import reverse
 
+from .content import compile_content
+
 
 class Author(models.Model):
     """Модель описыабщая автора. Содержит информацию об авторе и его биографию."""
@@ -84,7 +86,12 @@ class Article(models.Model):
                              help_text="Заголовок статьи",
                              verbose_name="Заголовок статьи")
 
-    content = models.TextField(help_text="Контент статьи", verbose_name="Контент", blank=True, default="")
+    content = models.TextField(help_text="Контент статьи в Markdown", verbose_name="Контент", blank=True, default="")
+
+    # Заполняются из content при сохранении (blogapp.content)
+    content_html = models.TextField(verbose_name="HTML контента", blank=True, default="", editable=False)
+    excerpt = models.TextField(verbose_name="Выдержка", blank=True, default="", editable=False)
+    word_count = models.PositiveIntegerField(verbose_name="Кол-во слов", default=0, editable=False)
     pub_date = models.DateTimeField(db_index=True, verbose_name="Дата", null=True, blank=True)
 
     author = models.ForeignKey(to=Author,
@@ -110,14 +117,82 @@ class Article(models.Model):
         """Строковое представление объекта"""
         return self.title
 
-    def content_short(self):
-        """Краткое содержание статьи"""
+    COMPILED_FIELDS = ("content_html", "excerpt", "word_count")
 
-        if self.content:
-            content = self.content[:100] + ("..." if len(self.content) > 100 else "" )
-            return content
-        return "Контента нет"
+    def save(self, *args, **kwargs):
+        """Перед сохранением компилирует content в HTML, выдержку и кол-во слов"""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.compile_content()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *self.COMPILED_FIELDS}
+        super().save(*args, **kwargs)
+
+    def compile_content(self) -> None:
+        compiled = compile_content(self.content)
+        self.content_html = compiled.html
+        self.excerpt = compiled.excerpt
+        self.word_count = compiled.word_count
+
+    def content_short(self):
+        """Краткое содержание статьи (выдержка, подготовленная при сохранении)"""
+        return self.excerpt or "Контента нет"
 
     def get_absolute_url(self):
         """Возвращает канонический URL для статьи."""
         return reverse("blogapp:article", kwargs={"pk": self.pk})
+
+
+class FacetCount(models.Model):
+    """
+    Кол-во опубликованных статей по тегу или категории.
+
+    Пересчитывается при изменениях статей (blogapp.facets), страница фасетов
+    без выбранных фильтров читает кол-ва отсюда, а не из таблицы связей.
+    """
+
+    FACET_TAG = "tag"
+    FACET_CATEGORY = "category"
+    FACET_CHOICES = [
+        (FACET_TAG, "Тег"),
+        (FACET_CATEGORY, "Категория"),
+    ]
+
+    class Meta:
+        verbose_name = "Кол-во статей фасета"
+        verbose_name_plural = "Кол-ва статей фасетов"
+        ordering = ["facet", "value_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["facet", "value_id"], name="unique_facet_value"),
+        ]
+
+    facet = models.CharField(max_length=10, choices=FACET_CHOICES)
+    value_id = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.facet}#{self.value_id}: {self.count}"
+
+
+class RelatedArticle(models.Model):
+    """
+    Похожая статья: top-N по сходству тегов (Jaccard) и заголовков (TF-IDF).
+
+    Заполняется заранее (blogapp.related), страница статьи читает готовый список.
+    """
+
+    class Meta:
+        verbose_name = "Похожая статья"
+        verbose_name_plural = "Похожие статьи"
+        ordering = ["article", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["article", "related"], name="unique_related_article"),
+        ]
+
+    article = models.ForeignKey(to=Article, on_delete=models.CASCADE, related_name="related_links")
+    related = models.ForeignKey(to=Article, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField(verbose_name="Сходство")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+
+    def __str__(self):
+        return f"{self.article_id} -> {self.related_id} ({self.score:.3f})"
@@ -0,0 +1,109 @@
+"""
+Keyset (seek) пагинация.
+
+Вместо OFFSET и COUNT(*) следующая страница выбирается условием по значениям
+сортировки последней строки: (pub_date, title, pk) < (последняя дата, заголовок, pk).
+Позиция передается в URL курсором ?after=... / ?before=...
+"""
+import base64
+import json
+from typing import Any, List, Optional, Sequence
+
+from django.db.models import Model, Q, QuerySet
+
+
+class KeysetPage:
+    """Страница keyset пагинации, совместимая по использованию с page_obj в шаблонах."""
+
+    def __init__(self, object_list: List[Model], next_cursor: Optional[str], previous_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Пагинатор по уникальному упорядочиванию ordering (последнее поле должно быть уникальным, обычно pk).
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int, ordering: Sequence[str]):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [name.lstrip("-") for name in self.ordering]
+
+    def encode(self, obj: Model) -> str:
+        values = [getattr(obj, field) for field in self.fields]
+        # isoformat() вместо DjangoJSONEncoder: тот обрезает микросекунды, и сравнение по дате стало бы неточным
+        data = json.dumps(values, default=lambda value: value.isoformat()).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> Optional[List[Any]]:
+        """Значения сортировки из курсора, None - если курсор поврежден."""
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(data)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                return None
+
+            meta = self.queryset.model._meta
+            return [
+                (meta.pk if field == "pk" else meta.get_field(field)).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except Exception:
+            return None
+
+    def seek(self, values: List[Any], backwards: bool) -> Q:
+        """Условие "строго после (или до) позиции values" для составного ключа сортировки."""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            descending = name.startswith("-")
+            lookup = "lt" if descending != backwards else "gt"
+            equal = {field: value for field, value in zip(self.fields[:index], values[:index])}
+            condition |= Q(**equal, **{f"{self.fields[index]}__{lookup}": values[index]})
+        return condition
+
+    def page(self, after: Optional[str] = None, before: Optional[str] = None) -> KeysetPage:
+        """Страница после курсора after, до курсора before или первая страница."""
+        backwards = bool(before) and not after
+        cursor = before if backwards else after
+        position = self.decode(cursor) if cursor else None
+        backwards = backwards and position is not None  # поврежденный курсор - первая страница
+
+        ordering = self.ordering
+        if backwards:
+            ordering = [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek(position, backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_previous, has_next = has_more, position is not None
+        else:
+            has_previous, has_next = position is not None, has_more
+
+        return KeysetPage(object_list=rows,
+                          next_cursor=self.encode(rows[-1]) if rows and has_next else None,
+                          previous_cursor=self.encode(rows[0]) if rows and has_previous else None)
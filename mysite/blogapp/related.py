@@ -0,0 +1,243 @@
+"""
+Похожие статьи.
+
+Сходство двух опубликованных статей - взвешенная сумма коэффициента Жаккара
+по тегам и косинуса TF-IDF векторов заголовков. Матрицы статьи x тег и
+статьи x слово строятся в NumPy, сходства считаются блоками строк матричным
+умножением, top-N каждой строки сохраняется в таблицу RelatedArticle.
+
+Теги и слова, встречающиеся только в одной статье, на сходство разных статей
+не влияют: в матрицы попадают только столбцы, общие хотя бы для двух статей,
+а размеры множеств тегов и нормы векторов считаются по всем.
+
+При изменении тегов статьи пересчитываются ее список и списки статей, с
+которыми у нее есть общие теги или в которые она уже входит - после коммита
+транзакции, одной задачей на транзакцию в фоновом потоке. Дрейф IDF и
+заголовки правятся полным пересчетом командой compute_related_articles.
+"""
+import logging
+import math
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from mysite.db import on_commit_collect
+from .cache import bump_article_versions
+from .models import Article, RelatedArticle
+
+log = logging.getLogger(__name__)
+
+
+RELATED_ARTICLES_COUNT = getattr(settings, "BLOG_RELATED_ARTICLES", 5)
+
+TAG_WEIGHT = 0.7
+TITLE_WEIGHT = 0.3
+
+BLOCK_SIZE = 512  # строк матрицы сходства за раз: память O(BLOCK_SIZE * кол-во статей)
+
+_word = re.compile(r"\w{2,}")
+
+# Один поток: пересчеты пересекающихся наборов статей не перемешивают удаление и вставку связей
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="related")
+
+
+def title_words(title: str) -> List[str]:
+    return _word.findall(title.lower())
+
+
+def shared_columns(links: Dict[int, Iterable], n_rows: int):
+    """
+    Матрица 0/1 (или кол-ва) строк x значений, только по значениям минимум из двух строк.
+
+    links: позиция строки -> значения (с повторами для кол-ва).
+    """
+    frequency = Counter(value for values in links.values() for value in set(values))
+    columns = {value: index for index, value in enumerate(v for v, df in frequency.items() if df > 1)}
+
+    matrix = np.zeros((n_rows, len(columns)), dtype=np.float32)
+    for row, values in links.items():
+        for value in values:
+            if value in columns:
+                matrix[row, columns[value]] += 1
+    return matrix, columns, frequency
+
+
+class RelatedCorpus:
+    """Опубликованные статьи в виде матриц для расчета сходства."""
+
+    def __init__(self):
+        rows = list(Article.objects.filter(pub_date__isnull=False).order_by("pk").values_list("pk", "title"))
+        self.article_ids = np.array([pk for pk, _ in rows], dtype=np.int64)
+        self.positions = {pk: position for position, (pk, _) in enumerate(rows)}
+        n = len(rows)
+
+        tags: Dict[int, List[int]] = {}
+        links = Article.tags.through.objects.filter(article__pub_date__isnull=False).values_list("article_id", "tag_id")
+        for article_id, tag_id in links.iterator():
+            position = self.positions.get(article_id)
+            if position is not None:  # статья опубликована после чтения списка статей
+                tags.setdefault(position, []).append(tag_id)
+
+        self.tags, _, _ = shared_columns(tags, n)
+        self.tag_sizes = np.zeros(n, dtype=np.float32)
+        for position, values in tags.items():
+            self.tag_sizes[position] = len(values)
+
+        words = {position: title_words(title) for position, (_, title) in enumerate(rows)}
+        counts, columns, frequency = shared_columns(words, n)
+        idf = {word: math.log((1 + n) / (1 + df)) + 1 for word, df in frequency.items()}
+
+        # нормы считаются по всем словам заголовка, в том числе по отброшенным столбцам
+        norms = np.ones(n, dtype=np.float32)
+        for position, title in words.items():
+            squares = sum((count * idf[word]) ** 2 for word, count in Counter(title).items())
+            if squares:
+                norms[position] = math.sqrt(squares)
+
+        column_idf = np.empty(len(columns), dtype=np.float32)
+        for word, index in columns.items():
+            column_idf[index] = idf[word]
+        self.titles = counts * column_idf / norms[:, None]
+
+    def __len__(self) -> int:
+        return len(self.article_ids)
+
+    def scores(self, rows: np.ndarray) -> np.ndarray:
+        """Сходство статей rows со всеми статьями корпуса (блок len(rows) x n)."""
+        intersection = self.tags[rows] @ self.tags.T
+        union = self.tag_sizes[rows, None] + self.tag_sizes[None, :] - intersection
+        jaccard = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        cosine = self.titles[rows] @ self.titles.T
+
+        scores = TAG_WEIGHT * jaccard + TITLE_WEIGHT * cosine
+        scores[np.arange(len(rows)), rows] = 0  # статья не похожа сама на себя
+        return scores
+
+    def top(self, article_ids: Optional[Iterable[int]] = None,
+            count: int = RELATED_ARTICLES_COUNT) -> List[RelatedArticle]:
+        """Top-count похожих для статей article_ids (по умолчанию всех) с ненулевым сходством."""
+        if article_ids is None:
+            rows = np.arange(len(self))
+        else:
+            rows = np.array(sorted(self.positions[pk] for pk in article_ids if pk in self.positions), dtype=np.int64)
+
+        count = min(count, len(self) - 1)
+        if count <= 0 or not len(rows):
+            return []
+
+        result = []
+        for start in range(0, len(rows), BLOCK_SIZE):
+            block = rows[start:start + BLOCK_SIZE]
+            scores = self.scores(block)
+            best = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+
+            for row, article_id in enumerate(self.article_ids[block]):
+                rank = 0
+                for column in best[row, order[row]]:
+                    score = float(scores[row, column])
+                    if score <= 0:
+                        break
+                    rank += 1
+                    result.append(RelatedArticle(article_id=int(article_id),
+                                                 related_id=int(self.article_ids[column]),
+                                                 score=score,
+                                                 rank=rank))
+        return result
+
+
+def compute_related(article_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Пересчитывает похожие статьи для article_ids (по умолчанию для всех).
+
+    Возвращает кол-во сохраненных связей.
+    """
+    if article_ids is not None:
+        article_ids = set(article_ids)
+        if not article_ids:
+            return 0
+
+    links = RelatedCorpus().top(article_ids)
+    with transaction.atomic():
+        stale = RelatedArticle.objects.all()
+        if article_ids is not None:
+            stale = stale.filter(article_id__in=article_ids)
+        stale.delete()
+        RelatedArticle.objects.bulk_create(links, batch_size=500)
+
+    if article_ids is None:
+        article_ids = Article.objects.values_list("pk", flat=True)
+    bump_article_versions(article_ids)
+    return len(links)
+
+
+def affected_articles(article_ids: Set[int]) -> Set[int]:
+    """Статьи, чьи списки могут измениться вместе с тегами article_ids."""
+    through = Article.tags.through.objects
+    sharing = through.filter(tag_id__in=through.filter(article_id__in=article_ids).values("tag_id"))
+    listing = RelatedArticle.objects.filter(related_id__in=article_ids)
+    return (article_ids |
+            set(sharing.values_list("article_id", flat=True)) |
+            set(listing.values_list("article_id", flat=True)))
+
+
+def update_related(article_ids: Set[int]) -> int:
+    return compute_related(affected_articles(article_ids))
+
+
+def _update_in_background(article_ids: Set[int]) -> None:
+    """Задача пула: у потока свое соединение с БД, закрываем его по завершении."""
+    try:
+        update_related(article_ids)
+    except Exception:
+        log.exception("Related articles update failed for articles %s", sorted(article_ids))
+    finally:
+        connection.close()
+
+
+def _submit_related(article_ids: Set[int]) -> None:
+    if not getattr(settings, "BLOG_RELATED_ASYNC", True):
+        update_related(article_ids)
+        return
+    _executor.submit(_update_in_background, article_ids)
+
+
+def schedule_related(article_ids: Iterable[int]) -> None:
+    """
+    Пересчет после коммита транзакции, когда связи тегов уже видны.
+
+    Статьи всех изменений транзакции пересчитываются одной задачей в фоновом потоке,
+    при BLOG_RELATED_ASYNC = False - сразу после коммита (тесты, команды).
+    """
+    article_ids = set(article_ids)
+    if article_ids:
+        on_commit_collect("blogapp:related", _submit_related, article_ids)
+
+
+def article_tags_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    """m2m_changed Article.tags: с обеих сторон связи."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        schedule_related([instance.pk])
+    elif action == "pre_clear":
+        tag_deleted(sender, instance)
+    else:
+        schedule_related(pk_set or [])
+
+
+def tag_deleted(sender, instance, **kwargs) -> None:
+    """Статьи тега запоминаются до удаления связей."""
+    schedule_related(Article.tags.through.objects.filter(tag_id=instance.pk).values_list("article_id", flat=True))
+
+
+def article_saved(sender, instance: Article, **kwargs) -> None:
+    """Статьи, в списках которых есть instance, выводят его заголовок - новая версия их кэша."""
+    bump_article_versions(RelatedArticle.objects.filter(related_id=instance.pk).values_list("article_id", flat=True))
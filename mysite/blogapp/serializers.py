@@ -11,6 +11,7 @@ class ArticleSerializer(serializers.ModelSerializer):
 
     Преобразует объекты Article в JSON и обратно.
     Включает все поля модели для создания/чтения статей.
+    content_html, excerpt и word_count только для чтения: компилируются из content при сохранении.
     """
 
     author_name = serializers.SerializerMethodField()
@@ -20,8 +21,9 @@ class ArticleSerializer(serializers.ModelSerializer):
     class Meta:
         """Настройка"""
         model = Article
-        fields = ("pk", "title", "content", "pub_date", "author",
+        fields = ("pk", "title", "content", "content_html", "excerpt", "word_count", "pub_date", "author",
                   "author_name", "category", "category_name", "tags", "all_tags")
+        read_only_fields = ("content_html", "excerpt", "word_count")
 
     def get_author_name(self, article: Article) -> str:
         """Получить имя автора"""
@@ -1,3 +1,475 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import article_version_key
+from .facets import FACETS_VERSION_KEY, FacetIndex, bitmap, get_facet_index, refresh_facets, stored_counts
+from .models import Article, Author, Category, FacetCount, RelatedArticle, Tag
+from .pagination import KeysetPaginator
+from .related import RelatedCorpus, compute_related
+
+
+class ArticleListViewTestCase(TestCase):
+    """Класс тестирования списка статей блога"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """Статьи с одинаковыми датами, чтобы порядок определяли title и pk"""
+        cls.author = Author.objects.create(name="Test author")
+        cls.category = Category.objects.create(name="Test category")
+        cls.tags = [Tag.objects.create(name=f"tag-{number}") for number in range(4)]
+
+        now = timezone.now()
+        for number in range(25):
+            article = Article.objects.create(title=f"Article {number % 7}",
+                                             content="x" * 300,
+                                             pub_date=now - timedelta(days=number // 3),
+                                             author=cls.author,
+                                             category=cls.category)
+            article.tags.set(cls.tags[:number % 4])
+
+        Article.objects.create(title="Draft", author=cls.author, category=cls.category)  # не опубликована
+
+    def test_list_queries_do_not_depend_on_page_size(self) -> None:
+        """Тест: страница статей - один запрос статей и один запрос имен тегов"""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("blogapp:articles"))
+
+        self.assertEqual(response.status_code, 200)
+        article = response.context["articles"][1]
+        self.assertEqual(article.tags_amount, len(article.tags.all()))
+        self.assertEqual(article.content_short(), "x" * 100 + "...")
+
+    def test_keyset_pages_cover_all_articles_in_order(self) -> None:
+        """Тест: проход по страницам вперед и назад возвращает все статьи без повторов"""
+        expected = list(Article.objects.
+                        filter(pub_date__isnull=False).
+                        order_by("-pub_date", "title", "pk").
+                        values_list("pk", flat=True))
+
+        pages, params = [], {}
+        while True:
+            response = self.client.get(reverse("blogapp:articles"), params)
+            page = response.context["page_obj"]
+            pages.append([article.pk for article in page])
+            if not page.has_next():
+                break
+            params = {"after": page.next_cursor}
+
+        self.assertEqual([pk for page in pages for pk in page], expected)
+        self.assertEqual(len(pages), 3)
+
+        response = self.client.get(reverse("blogapp:articles"), {"before": page.previous_cursor})
+        self.assertEqual([article.pk for article in response.context["page_obj"]], pages[-2])
+
+    def test_broken_cursor_returns_first_page(self) -> None:
+        """Тест: поврежденный курсор показывает первую страницу"""
+        response = self.client.get(reverse("blogapp:articles"), {"after": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_paginator_cursor_keeps_microseconds(self) -> None:
+        """Тест: курсор сохраняет дату с микросекундами"""
+        article = Article.objects.filter(pub_date__isnull=False).first()
+        paginator = KeysetPaginator(Article.objects.all(), 10, ["-pub_date", "title", "pk"])
+
+        self.assertEqual(paginator.decode(paginator.encode(article)), [article.pub_date, article.title, article.pk])
+
+
+class ArticleAdminTestCase(TestCase):
+    """Класс тестирования списка статей в админке"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_superuser(username="BlogAdmin", password="BlogAdminPassword")
+        cls.author = Author.objects.create(name="Admin author")
+        cls.category = Category.objects.create(name="Admin category")
+        cls.tags = [Tag.objects.create(name=f"admin-tag-{number}") for number in range(5)]
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+
+    def create_articles(self, count: int) -> None:
+        for number in range(count):
+            article = Article.objects.create(title=f"Admin article {number}",
+                                             pub_date=timezone.now(),
+                                             author=self.author,
+                                             category=self.category)
+            article.tags.set(self.tags)
+
+    def test_changelist_queries_do_not_grow_with_rows(self) -> None:
+        """Тест: кол-во запросов списка статей не зависит от числа строк"""
+        self.create_articles(2)
+        url = reverse("admin:blogapp_article_changelist")
+        response = self.client.get(url)
+        self.assertContains(response, "admin-tag-0, admin-tag-1, admin-tag-2")
+
+        # пользователь (сессия из кэша), статистика таблицы, COUNT, статьи с авторами/категориями/кол-вом тегов, имена тегов
+        with self.assertNumQueries(5):
+            self.client.get(url)
+        self.create_articles(10)
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+    def test_tags_amount_sorting(self) -> None:
+        """Тест: сортировка по кол-ву тегов использует аннотацию"""
+        self.create_articles(1)
+        article = Article.objects.create(title="No tags", pub_date=timezone.now(),
+                                         author=self.author, category=self.category)
+
+        response = self.client.get(reverse("admin:blogapp_article_changelist"), {"o": "8"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_list[0].pk, article.pk)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   BLOG_RELATED_ASYNC=False)
+class ArticleDetailCacheTestCase(TestCase):
+    """Класс тестирования кэша отрендеренных статей"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = Author.objects.create(name="Cached author")
+        cls.category = Category.objects.create(name="Cached category")
+        cls.tag = Tag.objects.create(name="cached-tag")
+        cls.article = Article.objects.create(title="Cached article", content="Cached content",
+                                             pub_date=timezone.now(), author=cls.author, category=cls.category)
+        cls.article.tags.add(cls.tag)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.url = reverse("blogapp:article", kwargs={"pk": self.article.pk})
+
+    def test_cached_article_served_without_queries(self) -> None:
+        """Тест: промах - статья с автором и категорией одним запросом плюс теги и похожие, попадание - без запросов"""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Cached author")
+        self.assertContains(response, "cached-tag")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, "Cached content")
+        self.assertContains(response, "<title>", count=1)
+
+    def assert_change_visible(self, change, expected: str) -> None:
+        """Изменение в транзакции: после коммита страница рендерится заново"""
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertContains(self.client.get(self.url), expected)
+
+    def test_related_changes_invalidate_fragment(self) -> None:
+        """Тест: изменение автора, категории, тегов и статьи меняет версию фрагмента"""
+        self.client.get(self.url)
+
+        self.author.name = "Renamed author"
+        self.assert_change_visible(self.author.save, "Renamed author")
+
+        self.category.name = "Renamed category"
+        self.assert_change_visible(self.category.save, "Renamed category")
+
+        self.tag.name = "renamed-tag"
+        self.assert_change_visible(self.tag.save, "renamed-tag")
+
+        self.assert_change_visible(lambda: self.article.tags.add(Tag.objects.create(name="new-tag")), "new-tag")
+
+        self.article.content = "Updated content"
+        self.assert_change_visible(self.article.save, "Updated content")
+
+    def test_evicted_version_does_not_restore_fragment(self) -> None:
+        """Тест: после вытеснения ключа версии не отдается фрагмент, закэшированный до изменения статьи"""
+        self.client.get(self.url)
+
+        self.article.content = "Updated content"
+        self.assert_change_visible(self.article.save, "Updated content")
+
+        cache.delete(article_version_key(self.article.pk))  # вытеснен при очистке FileBasedCache
+        self.assertContains(self.client.get(self.url), "Updated content")
+
+    def test_deleted_article_not_served_from_cache(self) -> None:
+        """Тест: удаленная статья больше не отдается из кэша"""
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.get(pk=self.article.pk).delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ArticleContentTestCase(TestCase):
+    """Класс тестирования компиляции Markdown контента статей"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = Author.objects.create(name="Markdown author")
+        cls.category = Category.objects.create(name="Markdown category")
+
+    def create_article(self, content: str) -> Article:
+        return Article.objects.create(title="Markdown", content=content, pub_date=timezone.now(),
+                                      author=self.author, category=self.category)
+
+    def test_content_compiled_on_save(self) -> None:
+        """Тест: при сохранении строятся очищенный HTML, выдержка и кол-во слов"""
+        article = self.create_article("# Title\n\nSome **bold** text <script>alert(1)</script>\n\n"
+                                      "[link](javascript:alert(1))")
+
+        self.assertIn("<h1>Title</h1>", article.content_html)
+        self.assertIn("<strong>bold</strong>", article.content_html)
+        self.assertNotIn("<script", article.content_html)
+        self.assertNotIn("javascript:", article.content_html)
+        self.assertEqual(article.excerpt, "Title Some bold text link")
+        self.assertEqual(article.word_count, 5)
+
+    def test_update_fields_recompiles(self) -> None:
+        """Тест: save(update_fields=["content"]) сохраняет и скомпилированные поля"""
+        article = self.create_article("old")
+        article.content = "new *text* " + "word " * 40
+        article.save(update_fields=["content"])
+
+        article.refresh_from_db()
+        self.assertIn("<em>text</em>", article.content_html)
+        self.assertTrue(article.excerpt.endswith("..."))
+        self.assertEqual(article.word_count, 42)
+
+    def test_feed_and_api_use_compiled_content(self) -> None:
+        """Тест: RSS и API отдают подготовленные выдержку и HTML"""
+        article = self.create_article("Feed **content**")
+
+        feed = self.client.get(reverse("blogapp:articles-feed"))
+        self.assertContains(feed, "Feed content")
+
+        data = self.client.get(reverse("blogapp:article-detail", kwargs={"pk": article.pk})).json()
+        self.assertEqual(data["content_html"], "<p>Feed <strong>content</strong></p>")
+        self.assertEqual(data["word_count"], 2)
+
+    def test_compile_articles_command(self) -> None:
+        """Тест: команда перекомпилирует статьи, измененные в обход save()"""
+        article = self.create_article("before")
+        Article.objects.filter(pk=article.pk).update(content="after **update**")
+
+        out = StringIO()
+        call_command("compile_articles", stdout=out)
+
+        article.refresh_from_db()
+        self.assertEqual(article.content_html, "<p>after <strong>update</strong></p>")
+        self.assertIn("1 articles updated", out.getvalue())
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   BLOG_RELATED_ASYNC=False)
+class ArticleFacetsTestCase(TestCase):
+    """Класс тестирования фасетного поиска статей"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """12 статей: тег python у четных, django у кратных трем, категория по остатку от деления на 3"""
+        cls.author = Author.objects.create(name="Facet author")
+        cls.categories = [Category.objects.create(name=f"category-{number}") for number in range(3)]
+        cls.python = Tag.objects.create(name="python")
+        cls.django = Tag.objects.create(name="django")
+        cls.unused = Tag.objects.create(name="unused")
+
+        now = timezone.now()
+        cls.articles = []
+        for number in range(12):
+            article = Article.objects.create(title=f"Facet {number:02}",
+                                             pub_date=now - timedelta(hours=number),
+                                             author=cls.author,
+                                             category=cls.categories[number % 3])
+            article.tags.set([tag for tag, used in ((cls.python, number % 2 == 0), (cls.django, number % 3 == 0))
+                              if used])
+            cls.articles.append(article)
+
+        Article.objects.create(title="Draft", author=cls.author, category=cls.categories[0])  # не опубликована
+
+    def setUp(self) -> None:
+        cache.clear()
+        refresh_facets()
+        self.url = reverse("blogapp:article-facets")
+
+    def facet_counts(self, data: dict, name: str) -> dict:
+        return {item["name"]: item["count"] for item in data["facets"][name]}
+
+    def test_counts_without_filters_from_table(self) -> None:
+        """Тест: без фильтров кол-ва берутся из FacetCount, черновики не учитываются"""
+        tag_counts, category_counts = stored_counts()
+        self.assertEqual(tag_counts, {self.python.pk: 6, self.django.pk: 4, self.unused.pk: 0})
+        self.assertEqual(category_counts, {category.pk: 4 for category in self.categories})
+
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["count"], 12)
+        self.assertEqual(len(data["results"]), 10)
+        self.assertEqual(self.facet_counts(data, "tags"), {"python": 6, "django": 4, "unused": 0})
+
+    def test_filters_and_counts(self) -> None:
+        """Тест: теги пересекаются, категории объединяются, кол-ва считаются по выборке"""
+        data = self.client.get(self.url, {"tags": f"{self.python.pk},{self.django.pk}"}).json()
+        self.assertEqual([item["title"] for item in data["results"]], ["Facet 00", "Facet 06"])
+        self.assertEqual(self.facet_counts(data, "categories"), {"category-0": 2, "category-1": 0, "category-2": 0})
+
+        data = self.client.get(self.url, {"tags": self.python.pk,
+                                          "category": [self.categories[1].pk, self.categories[2].pk]}).json()
+        self.assertEqual([item["title"] for item in data["results"]], ["Facet 02", "Facet 04", "Facet 08", "Facet 10"])
+        self.assertEqual(self.facet_counts(data, "tags"), {"python": 4, "django": 0, "unused": 0})
+
+    def test_pages_follow_article_order(self) -> None:
+        """Тест: вторая страница продолжает порядок по дате публикации"""
+        data = self.client.get(self.url, {"page": 2}).json()
+        self.assertEqual([item["title"] for item in data["results"]], ["Facet 10", "Facet 11"])
+
+    def test_invalid_params(self) -> None:
+        """Тест: нечисловые id и номер страницы - ошибка 400"""
+        self.assertEqual(self.client.get(self.url, {"tags": "python"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"page": "last"}).status_code, 400)
+
+    def test_changes_refresh_table_and_index(self) -> None:
+        """Тест: после коммита изменений пересчитываются таблица и индекс"""
+        index = get_facet_index()
+        version = cache.get(FACETS_VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.articles[1].tags.add(self.unused)
+        self.assertEqual(FacetCount.objects.get(facet=FacetCount.FACET_TAG, value_id=self.unused.pk).count, 1)
+        self.assertNotEqual(cache.get(FACETS_VERSION_KEY), version)
+        self.assertIsNot(get_facet_index(), index)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Article.objects.get(pk=self.articles[0].pk).delete()
+        data = self.client.get(self.url, {"tags": self.django.pk}).json()
+        self.assertEqual(data["count"], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name="fresh")
+        self.assertIn("fresh", self.facet_counts(self.client.get(self.url).json(), "tags"))
+        self.assertTrue(FacetCount.objects.filter(facet=FacetCount.FACET_TAG, value_id=tag.pk).exists())
+
+    def test_one_refresh_per_transaction(self) -> None:
+        """Тест: много изменений в одной транзакции - один пересчет после коммита"""
+        with mock.patch("blogapp.facets.refresh_facets") as refresh_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                for article in self.articles[:3]:
+                    article.tags.add(self.unused)
+                    article.save()
+                Tag.objects.create(name="fresh")
+        self.assertEqual(refresh_mock.call_count, 1)
+
+    def test_page_seeks_by_blocks(self) -> None:
+        """Тест: страницы за границами блоков карты совпадают с перебором в лоб"""
+        size = 20000
+        index = FacetIndex(version=0, article_ids=[number * 10 for number in range(size)],
+                           tags={}, categories={}, tag_names={}, category_names={})
+        positions = [number for number in range(size) if number % 3 == 0 or number % 7 == 0]
+        selection = bitmap(positions, size)
+
+        for offset in (0, 5, 4095, 4096, 5000, 8191, len(positions) - 3, len(positions) + 1):
+            self.assertEqual(index.page(selection, offset, 10),
+                             [position * 10 for position in positions[offset:offset + 10]])
+
+    def test_index_reused_until_version_changes(self) -> None:
+        """Тест: индекс строится один раз на версию"""
+        index = get_facet_index()
+        self.assertIs(get_facet_index(), index)
+
+        # выборка и кол-ва - из индекса, запросы только за статьями страницы и их тегами
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"tags": self.python.pk, "category": self.categories[0].pk})
+        self.assertIs(get_facet_index(), index)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   BLOG_RELATED_ASYNC=False)
+class RelatedArticlesTestCase(TestCase):
+    """Класс тестирования похожих статей"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = Author.objects.create(name="Related author")
+        cls.category = Category.objects.create(name="Related category")
+        cls.python, cls.django, cls.orm, cls.css = (Tag.objects.create(name=name)
+                                                    for name in ("python", "django", "orm", "css"))
+
+        def create(title: str, *tags: Tag) -> Article:
+            article = Article.objects.create(title=title, pub_date=timezone.now(),
+                                             author=cls.author, category=cls.category)
+            article.tags.set(tags)
+            return article
+
+        cls.base = create("Django ORM queries", cls.python, cls.django, cls.orm)
+        cls.close = create("Optimizing ORM queries", cls.python, cls.django, cls.orm)
+        cls.partial = create("Django templates", cls.python, cls.django)
+        cls.title_only = create("Writing queries by hand")
+        cls.unrelated = create("Flexbox layouts", cls.css)
+        Article.objects.create(title="Draft ORM queries", author=cls.author, category=cls.category)
+
+    def setUp(self) -> None:
+        cache.clear()
+        compute_related()
+
+    def related_titles(self, article: Article) -> list:
+        return list(RelatedArticle.objects.filter(article=article).values_list("related__title", flat=True))
+
+    def test_ranking_combines_tags_and_titles(self) -> None:
+        """Тест: порядок по сходству тегов и заголовков, без себя, черновиков и статей без сходства"""
+        self.assertEqual(self.related_titles(self.base),
+                         ["Optimizing ORM queries", "Django templates", "Writing queries by hand"])
+        self.assertEqual(self.related_titles(self.unrelated), [])
+
+        scores = list(RelatedArticle.objects.filter(article=self.base).values_list("score", flat=True))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertTrue(0.7 < scores[0] < 1)  # одинаковые теги плюс часть слов заголовка
+
+    def test_top_count_limit(self) -> None:
+        """Тест: сохраняется не больше заданного кол-ва похожих статей"""
+        links = RelatedCorpus().top([self.base.pk], count=1)
+        self.assertEqual([(link.related_id, link.rank) for link in links], [(self.close.pk, 1)])
+
+    def test_tag_changes_refresh_lists(self) -> None:
+        """Тест: после коммита изменения тегов пересчитываются списки затронутых статей"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unrelated.tags.add(self.python, self.django, self.orm)
+        self.assertIn("Flexbox layouts", self.related_titles(self.base))
+        self.assertIn("Django ORM queries", self.related_titles(self.unrelated))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unrelated.tags.clear()
+        self.assertNotIn("Flexbox layouts", self.related_titles(self.base))
+
+    def test_one_update_per_transaction(self) -> None:
+        """Тест: изменения тегов нескольких статей в транзакции - один пересчет в фоновом потоке после коммита"""
+        with self.settings(BLOG_RELATED_ASYNC=True), \
+                mock.patch("blogapp.related._executor") as executor_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.unrelated.tags.add(self.python)
+                self.title_only.tags.add(self.css)
+            self.assertEqual(RelatedArticle.objects.filter(article=self.unrelated).count(), 0)  # запрос не ждет пересчета
+
+        executor_mock.submit.assert_called_once()
+        # плюс статьи из setUpTestData: ее транзакция не коммитится, их пересчет уходит со следующим коммитом
+        self.assertLessEqual({self.unrelated.pk, self.title_only.pk}, executor_mock.submit.call_args.args[1])
+
+    def test_detail_page_shows_related(self) -> None:
+        """Тест: страница статьи выводит похожие статьи и обновляется после переименования одной из них"""
+        url = reverse("blogapp:article", kwargs={"pk": self.base.pk})
+        self.assertContains(self.client.get(url), "Optimizing ORM queries")
+
+        self.close.title = "Renamed ORM article"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.close.save()
+        self.assertContains(self.client.get(url), "Renamed ORM article")
+
+    def test_command(self) -> None:
+        """Тест: команда пересчитывает таблицу"""
+        RelatedArticle.objects.all().delete()
+        out = StringIO()
+        call_command("compute_related_articles", stdout=out)
+        self.assertTrue(RelatedArticle.objects.filter(article=self.base).exists())
+        self.assertIn("links saved", out.getvalue())
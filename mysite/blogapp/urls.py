@@ -1,6 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from mysite.db import read_from_replica
+
 from .views import ArticleViewSet, ArticleListView, ArticleDetailView, LatestArticlesFeed
 
 
@@ -11,7 +13,7 @@ router.register("article", ArticleViewSet)
 
 urlpatterns = [
     path("api/", include(router.urls)),
-    path("articles/", ArticleListView.as_view(), name="articles"),
-    path("articles/<int:pk>/", ArticleDetailView.as_view(), name="article"),
-    path("articles/latest/feed/", LatestArticlesFeed(), name="articles-feed"),
+    path("articles/", read_from_replica(ArticleListView.as_view()), name="articles"),
+    path("articles/<int:pk>/", read_from_replica(ArticleDetailView.as_view()), name="article"),
+    path("articles/latest/feed/", read_from_replica(LatestArticlesFeed()), name="articles-feed"),
 ]
\ No newline at end of file
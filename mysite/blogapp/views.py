@@ -1,21 +1,58 @@
 from typing import List
 
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.db.models import Count, Prefetch
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.safestring import mark_safe
 from django.views.generic import DetailView, ListView
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
 
-from .models import Article
+from .cache import article_fragment_key, set_article_fragment
+from .facets import get_facet_index, stored_counts
+from .models import Article, RelatedArticle, Tag
+from .pagination import KeysetPaginator
 from .serializers import ArticleSerializer
 
 
+def parse_ids(request: Request, name: str) -> List[int]:
+    """id из параметра запроса: ?tags=1,2 или ?tags=1&tags=2"""
+    try:
+        return [int(value) for raw in request.query_params.getlist(name) for value in raw.split(",") if value]
+    except ValueError:
+        raise ValidationError({name: "Ожидается список целых чисел через запятую"})
+
+
+def tag_names_prefetch() -> Prefetch:
+    """Prefetch тегов статьи, из таблицы тегов выбираются только имена."""
+    return Prefetch("tags", queryset=Tag.objects.only("name"))
+
+
+def related_articles_prefetch() -> Prefetch:
+    """Готовый список похожих статей (blogapp.related): один запрос, только заголовки опубликованных."""
+    return Prefetch("related_links",
+                    queryset=(RelatedArticle.objects.
+                              select_related("related").
+                              only("article", "rank", "related__title").
+                              filter(related__pub_date__isnull=False)),
+                    to_attr="related_articles")
+
+
 @extend_schema(description="Представление для работы со статьями")
 class ArticleViewSet(ModelViewSet):
     """API endpoint для работы со статьями"""
-    queryset = Article.objects.select_related("author", "category").prefetch_related("tags").all()
+    queryset = Article.objects.select_related("author", "category").prefetch_related(tag_names_prefetch()).all()
     serializer_class = ArticleSerializer
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
     search_fields = ["title", "author__name"]
@@ -28,22 +65,100 @@ class ArticleViewSet(ModelViewSet):
     def retrieve(self, *args, **kwargs):
         return super().retrieve(*args, **kwargs)
 
+    @extend_schema(summary="Фасетный поиск статей",
+                   description="Опубликованные статьи со всеми тегами из tags и любой категорией из category "
+                               "(id через запятую) и кол-ва статей выборки по каждому тегу и категории")
+    @action(detail=False, methods=["get"])
+    def facets(self, request: Request) -> Response:
+        tag_ids = parse_ids(request, "tags")
+        category_ids = parse_ids(request, "category")
+        try:
+            page = max(int(request.query_params.get("page", 1)), 1)
+        except ValueError:
+            raise ValidationError({"page": "Ожидается номер страницы"})
+
+        index = get_facet_index()
+        selection = index.select(tag_ids, category_ids)
+        if tag_ids or category_ids:
+            tag_counts, category_counts = index.counts(selection)
+        else:
+            tag_counts, category_counts = stored_counts()
+
+        page_size = api_settings.PAGE_SIZE
+        ids = index.page(selection, offset=(page - 1) * page_size, limit=page_size)
+        articles = self.get_queryset().in_bulk(ids)
+
+        return Response({
+            "count": selection.bit_count(),
+            "page": page,
+            "results": self.get_serializer([articles[pk] for pk in ids if pk in articles], many=True).data,
+            "facets": {
+                "tags": [{"id": pk, "name": name, "count": tag_counts.get(pk, 0)}
+                         for pk, name in sorted(index.tag_names.items(), key=lambda item: item[1])],
+                "categories": [{"id": pk, "name": name, "count": category_counts.get(pk, 0)}
+                               for pk, name in sorted(index.category_names.items(), key=lambda item: item[1])],
+            },
+        })
+
 
 class ArticleListView(ListView):
-    """Представление для отображения списка всех статей блога"""
+    """
+    Представление для отображения списка всех статей блога.
+
+    Постраничный вывод по ключу (-pub_date, title, pk) без OFFSET и COUNT(*),
+    вместо контента выбирается готовая выдержка, теги - только имена.
+    """
     queryset = (Article.objects.
                 select_related("author", "category").
-                prefetch_related("tags").
-                defer("content").
-                filter(pub_date__isnull=False).
-                order_by("-pub_date"))
+                only("title", "pub_date", "excerpt", "author__name", "category__name").
+                annotate(tags_amount=Count("tags")).
+                prefetch_related(tag_names_prefetch()).
+                filter(pub_date__isnull=False))
 
+    ordering = ["-pub_date", "title", "pk"]
+    paginate_by = 10
     context_object_name = "articles"
 
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.ordering)
+        page = paginator.page(after=self.request.GET.get("after"), before=self.request.GET.get("before"))
+        return paginator, page, page.object_list, page.has_other_pages()
+
 
 class ArticleDetailView(DetailView):
-    """Отображение деталей статьи"""
-    model = Article
+    """
+    Отображение деталей статьи.
+
+    Тело статьи берется из кэша фрагментов (blogapp.cache) без обращения к БД,
+    при промахе статья загружается одним запросом с автором и категорией плюс теги
+    и похожие статьи.
+    """
+    queryset = (Article.objects.
+                select_related("author", "category").
+                prefetch_related(tag_names_prefetch(), related_articles_prefetch()).
+                defer("content"))  # страница выводит скомпилированный content_html
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        article_id = self.kwargs["pk"]
+        key = article_fragment_key(article_id)
+        fragment = cache.get(key)
+
+        if fragment is None:
+            self.object = self.get_object()
+            fragment = {
+                "title": self.object.title,
+                "body": render_to_string("blogapp/includes/article_body.html", {"article": self.object}),
+            }
+            set_article_fragment(key, fragment)
+
+        context = {
+            "article_title": fragment["title"],
+            "article_body": mark_safe(fragment["body"]),
+        }
+        return render(request, self.get_template_names(), context)
+
+    def get_template_names(self) -> List[str]:
+        return ["blogapp/article_detail.html"]
 
 
 class LatestArticlesFeed(Feed):
@@ -70,8 +185,8 @@ class LatestArticlesFeed(Feed):
         return (
             Article.objects
             .select_related("author", "category")  # Загружаем связанные модели
-            .prefetch_related("tags")  # Загружаем теги
-            .defer("content")  # Пропускаем тяжелый контент
+            .prefetch_related(tag_names_prefetch())  # Загружаем имена тегов
+            .defer("content", "content_html")  # Пропускаем тяжелый контент
             .filter(pub_date__isnull=False)  # Только опубликованные
             .order_by("-pub_date")  # Сортировка: новые первыми
             [:5]  # Берем только 5 записей
@@ -84,9 +199,9 @@ class LatestArticlesFeed(Feed):
     def item_description(self, item: Article) -> str:
         """
         Описание/контент для каждого элемента фида.
-        Возвращает первые 100 символов контента.
+        Возвращает выдержку, подготовленную при сохранении статьи.
         """
-        return item.content[:100] if item.content else ""
+        return item.excerpt
 
     def item_link(self, item: Article) -> str:
         """Ссылка на полную версию статьи."""
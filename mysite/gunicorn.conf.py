@@ -0,0 +1,35 @@
+"""
+Конфигурация gunicorn (prefork): мастер-процесс форкает воркеры.
+
+По умолчанию воркеры WSGI (gthread) с постоянными соединениями с БД. Для сравнения с ASGI:
+    GUNICORN_APP=mysite.asgi:application GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+
+wsgi_app = os.environ.get("GUNICORN_APP", "mysite.wsgi:application")
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8080")
+
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))  # используется только gthread воркерами
+
+# Под ASGI каждый запрос выполняется в своем потоке со своим соединением с БД, и такие
+# соединения не переиспользуются: постоянные соединения (CONN_MAX_AGE) только копили бы их
+if wsgi_app.startswith("mysite.asgi"):
+    raw_env = ["DJANGO_CONN_MAX_AGE=0"]
+
+# Приложение импортируется один раз в мастере, воркеры получают его через fork
+preload_app = True
+
+# Перезапуск воркеров защищает от утечек памяти, jitter - чтобы не рестартовали все разом
+max_requests = 2000
+max_requests_jitter = 200
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
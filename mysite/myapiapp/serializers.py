@@ -10,3 +10,11 @@ class GroupSerializer(serializers.ModelSerializer):
         model = Group
         fields = "pk", "name", "permissions"
 
+
+class GroupPermissionsSerializer(serializers.Serializer):
+    """Группа и права для нее в виде "app_label.codename" (GroupBulkView)"""
+    name = serializers.CharField(max_length=150)
+    permissions = serializers.ListField(
+        child=serializers.RegexField(r"^[\w-]+\.\w+$"),
+        default=list,
+    )
@@ -1,3 +1,97 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from myauth.backends import PERMISSIONS_VERSION_KEY
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class GroupsApiTestCase(TestCase):
+    """Класс тестирования API групп: список, массовая выдача прав и матрица прав"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(username="GroupsAdmin", password="GroupsPassword")
+        for number in range(3):
+            group = Group.objects.create(name=f"group{number}")
+            group.permissions.set(Permission.objects.order_by("pk")[number * 3:number * 3 + 3])
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_list_prefetches_permissions(self) -> None:
+        """Тест: права и их content_type загружаются для всех групп сразу"""
+        Group.objects.create(name="group3").permissions.set(Permission.objects.all()[:5])
+        # пользователь (сессия в кэше), кол-во групп, группы, права
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("myapiapp:groups"))
+        self.assertEqual(response.data["count"], 4)
+        self.assertEqual(len(response.data["results"][0]["permissions"]), 3)
+
+    def test_create_existing_group(self) -> None:
+        """Тест: повторное создание группы - ошибка 400, без лишней проверки exists()"""
+        response = self.client.post(reverse("myapiapp:groups"), {"name": "group0"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Group.objects.filter(name="group0").count(), 1)
+
+    def test_bulk_assign(self) -> None:
+        """Тест: группы создаются и получают права за постоянное число запросов"""
+        payload = [
+            {"name": "group0", "permissions": ["shopapp.add_product", "shopapp.view_order"]},
+            {"name": "managers", "permissions": ["shopapp.add_product", "shopapp.change_product"]},
+        ] + [{"name": f"bulk{number}", "permissions": ["blogapp.view_article"]} for number in range(20)]
+
+        # пользователь (сессия в кэше), права, savepoint, группы, вставка групп, новые группы, вставка связей, release
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse("myapiapp:groups_bulk"), payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["created"]), 21)
+
+        self.assertTrue(Group.objects.get(name="group0").permissions.filter(codename="view_order").exists())
+        self.assertEqual(Group.objects.get(name="group0").permissions.count(), 5)
+        self.assertEqual(Group.objects.get(name="bulk19").permissions.get().codename, "view_article")
+
+    def test_bulk_unknown_permission(self) -> None:
+        """Тест: неизвестное право - ошибка 400, группы не создаются"""
+        payload = [{"name": "broken", "permissions": ["shopapp.add_product", "shopapp.fly_product"]}]
+        response = self.client.post(reverse("myapiapp:groups_bulk"), payload, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["permissions"], ["shopapp.fly_product"])
+        self.assertFalse(Group.objects.filter(name="broken").exists())
+
+    def test_bulk_requires_staff(self) -> None:
+        """Тест: массовая выдача прав и матрица доступны только персоналу"""
+        self.client.logout()
+        payload = [{"name": "intruders", "permissions": ["auth.add_user"]}]
+        response = self.client.post(reverse("myapiapp:groups_bulk"), payload, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(reverse("myapiapp:groups_matrix")).status_code, 403)
+
+    def test_matrix_cached_until_change(self) -> None:
+        """Тест: матрица берется из кэша и строится заново после изменения прав"""
+        response = self.client.get(reverse("myapiapp:groups_matrix"))
+        self.assertEqual(len(response.data["permissions"]), Permission.objects.count())
+        self.assertEqual([group["name"] for group in response.data["groups"]], ["group0", "group1", "group2"])
+
+        # только пользователь (сессия в кэше)
+        with self.assertNumQueries(1):
+            self.client.get(reverse("myapiapp:groups_matrix"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("myapiapp:groups_bulk"), [{"name": "group1", "permissions": ["auth.add_user"]}],
+                             content_type="application/json")
+        response = self.client.get(reverse("myapiapp:groups_matrix"))
+        self.assertIn("auth.add_user", response.data["groups"][1]["permissions"])
+
+    def test_matrix_not_restored_after_version_eviction(self) -> None:
+        """Тест: после вытеснения ключа версии не отдается матрица, построенная до изменения прав"""
+        self.client.get(reverse("myapiapp:groups_matrix"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("myapiapp:groups_bulk"), [{"name": "group1", "permissions": ["auth.add_user"]}],
+                             content_type="application/json")
+
+        cache.delete(PERMISSIONS_VERSION_KEY)  # вытеснен при очистке FileBasedCache
+        response = self.client.get(reverse("myapiapp:groups_matrix"))
+        self.assertIn("auth.add_user", response.data["groups"][1]["permissions"])
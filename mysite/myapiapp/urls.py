@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import HelloWorldView, GroupListView
+from .views import HelloWorldView, GroupListView, GroupBulkView, GroupPermissionMatrixView
 
 
 app_name = "myapiapp"
@@ -9,4 +9,6 @@ app_name = "myapiapp"
 urlpatterns = [
     path("hello/", HelloWorldView.as_view(), name="hello"),
     path("groups/", GroupListView.as_view(), name="groups"),
+    path("groups/bulk/", GroupBulkView.as_view(), name="groups_bulk"),
+    path("groups/matrix/", GroupPermissionMatrixView.as_view(), name="groups_matrix"),
 ]
\ No newline at end of file
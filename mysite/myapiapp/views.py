@@ -1,11 +1,17 @@
 from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from rest_framework import status
 from rest_framework.generics import ListCreateAPIView
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.views import APIView
 
-from .serializers import GroupSerializer
+from mysite.cache import get_or_init_version
+from myauth.backends import PERMISSIONS_CACHE_TIMEOUT, PERMISSIONS_VERSION_KEY, reset_permissions
+from .serializers import GroupSerializer, GroupPermissionsSerializer
 
 
 class HelloWorldView(APIView):
@@ -18,7 +24,10 @@ class HelloWorldView(APIView):
 
 class GroupListView(ListCreateAPIView):
     """Все группы приложения"""
-    queryset = Group.objects.all()
+    # str() права выводит его content_type: загружаем их вместе с правами, без запроса на каждое
+    queryset = (Group.objects.
+                prefetch_related(Prefetch("permissions", queryset=Permission.objects.select_related("content_type"))).
+                order_by("name"))
     serializer_class = GroupSerializer
 
     def post(self, request: Request) -> Response:
@@ -34,15 +43,17 @@ class GroupListView(ListCreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST  # статус 400
             )
 
-        # 3. Проверяем, что группа с таким именем не существует
-        if Group.objects.filter(name=group_name).exists():
+        # 3. Создаем новую группу, существующую выдает уникальный индекс на name
+        #    (проверка exists() перед create не защищает от одновременных запросов)
+        try:
+            with transaction.atomic():
+                group = Group.objects.create(name=group_name)
+        except IntegrityError:
             return Response(
                 {"error": f"Группа '{group_name}' уже существует"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # 4. Создаем новую группу
-        group = Group.objects.create(name=group_name)
         base_permission_codenames = [
             'view_group',  # просмотр групп
             'add_permission',  # добавление разрешений
@@ -55,8 +66,90 @@ class GroupListView(ListCreateAPIView):
 
         group_serializer = GroupSerializer(group)
 
-        # 5. Возвращаем успешный ответ
+        # 4. Возвращаем успешный ответ
         return Response({
             "message": "Группа успешно создана",
             "group": group_serializer.data
         }, status=status.HTTP_201_CREATED)  # статус 201
+
+
+class GroupBulkView(APIView):
+    """
+    Создание групп и выдача им прав одним запросом.
+
+    Тело - список {"name": ..., "permissions": ["app_label.codename", ...]}.
+    Недостающие группы создаются, права добавляются к уже выданным. Запросов к БД
+    постоянное число, сколько бы ни было групп и прав.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request: Request) -> Response:
+        serializer = GroupPermissionsSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        requested = {}
+        for item in serializer.validated_data:
+            requested.setdefault(item["name"], set()).update(item["permissions"])
+
+        # права одним запросом по codename, app_label сверяется здесь
+        codenames = {code.partition(".")[2] for codes in requested.values() for code in codes}
+        found = Permission.objects.select_related("content_type").filter(codename__in=codenames).order_by()
+        permissions = {f"{permission.content_type.app_label}.{permission.codename}": permission for permission in found}
+        unknown = sorted({code for codes in requested.values() for code in codes} - permissions.keys())
+        if unknown:
+            return Response({"error": "Неизвестные права", "permissions": unknown},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            groups = {group.name: group for group in Group.objects.filter(name__in=requested)}
+            created = [name for name in requested if name not in groups]
+            if created:
+                # ignore_conflicts: группу мог создать параллельный запрос, pk тогда не заполняются
+                Group.objects.bulk_create([Group(name=name) for name in created], ignore_conflicts=True)
+                groups.update((group.name, group) for group in Group.objects.filter(name__in=created))
+
+            through = Group.permissions.through
+            through.objects.bulk_create(
+                [through(group_id=groups[name].pk, permission_id=permissions[code].pk)
+                 for name, codes in requested.items() for code in codes],
+                ignore_conflicts=True,
+            )
+            # bulk_create не отправляет post_save и m2m_changed: сбрасываем кэш прав сами
+            transaction.on_commit(reset_permissions)
+
+        return Response({"groups": sorted(requested), "created": created}, status=status.HTTP_201_CREATED)
+
+
+class GroupPermissionMatrixView(APIView):
+    """
+    Матрица группа x право для админки: все права и права каждой группы.
+
+    Матрица хранится в кэше под версией прав myauth.backends - любое изменение
+    групп и прав (в т.ч. GroupBulkView) выдает новую версию и новую матрицу.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: Request) -> Response:
+        key = f"myapiapp:groups:matrix:{get_or_init_version(PERMISSIONS_VERSION_KEY)}"
+        matrix = cache.get(key)
+        if matrix is None:
+            matrix = self.build_matrix()
+            cache.set(key, matrix, PERMISSIONS_CACHE_TIMEOUT)
+        return Response(matrix)
+
+    @staticmethod
+    def build_matrix() -> dict:
+        codes = {pk: f"{app_label}.{codename}"
+                 for pk, app_label, codename in Permission.objects.
+                 order_by("content_type__app_label", "codename").
+                 values_list("pk", "content_type__app_label", "codename")}
+
+        granted = {}
+        for group_id, permission_id in Group.permissions.through.objects.values_list("group_id", "permission_id"):
+            granted.setdefault(group_id, []).append(codes[permission_id])
+
+        return {
+            "permissions": list(codes.values()),
+            "groups": [{"pk": pk, "name": name, "permissions": sorted(granted.get(pk, []))}
+                       for pk, name in Group.objects.order_by("name").values_list("pk", "name")],
+        }
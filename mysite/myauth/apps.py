@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class MyauthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myauth'
+
+    def ready(self):
+        from django.contrib.auth.models import Group, Permission, User
+
+        from mysite import db  # noqa: F401 - UNICODE_LOWER в соединениях SQLite нужна индексам auth_user
+        from mysite.storage import connect_release_files
+
+        from .backends import permissions_changed
+
+        # Файлы аватаров в контентно-адресуемом хранилище удаляются вместе с последней ссылкой на них
+        connect_release_files(self)
+
+        # Закэшированные права (CachedPermissionsBackend) сбрасываются при изменении групп и прав
+        for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+            m2m_changed.connect(permissions_changed, sender=through,
+                                dispatch_uid=f"myauth_permissions_{through._meta.model_name}")
+        for model in (Group, Permission):
+            post_save.connect(permissions_changed, sender=model, dispatch_uid=f"myauth_{model.__name__}_saved")
+            post_delete.connect(permissions_changed, sender=model, dispatch_uid=f"myauth_{model.__name__}_deleted")
@@ -0,0 +1,102 @@
+"""
+Квадратные копии аватаров фиксированных размеров.
+
+Оригинал сохраняется как загружен (ContentAddressedStorage читает его потоково,
+большие загрузки Django держит во временном файле, а не в памяти). Копии
+AVATAR_SIZES строятся в фоновом потоке после коммита транзакции, страницы
+профилей показывают их, а до готовности - оригинал (Profile.get_avatar_url).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePath
+from typing import Dict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+from .models import Profile
+
+log = logging.getLogger(__name__)
+
+
+# Сторона квадратной копии в пикселях
+AVATAR_SIZES: Dict[str, int] = {
+    "small": 64,
+    "large": 256,
+}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="avatars")
+
+
+def render_avatar(source: FieldFile, side: int) -> ContentFile:
+    """Обрезает изображение по центру до квадрата и уменьшает до side x side (JPEG)"""
+    with source.open("rb"):
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=85, optimize=True)
+
+    return ContentFile(buffer.getvalue())
+
+
+def process_avatar(profile_id: int) -> bool:
+    """
+    Строит копии текущего аватара профиля.
+
+    Копии публикуются, только если аватар не заменили за время обработки.
+
+    Returns:
+        bool: построены ли копии
+    """
+    profile = Profile.objects.get(pk=profile_id)
+    source = profile.avatar
+    if not source or profile.avatar_source == source.name:
+        return False
+
+    old_names = [profile.avatar_small.name, profile.avatar_large.name]
+    stem = PurePath(source.name).stem
+    for size, side in AVATAR_SIZES.items():
+        getattr(profile, f"avatar_{size}").save(f"{stem}_{size}.jpg", render_avatar(source, side), save=False)
+
+    new_names = [profile.avatar_small.name, profile.avatar_large.name]
+    updated = (Profile.objects.
+               filter(pk=profile_id, avatar=source.name).
+               update(avatar_small=new_names[0], avatar_large=new_names[1], avatar_source=source.name))
+
+    # файлы без ссылок удаляются хранилищем (ContentAddressedStorage.delete проверяет ссылки)
+    for name in (old_names if updated else new_names):
+        if name:
+            profile.avatar.storage.delete(name)
+    return bool(updated)
+
+
+def _process_in_background(profile_id: int) -> None:
+    """Задача пула: у потока свое соединение с БД, закрываем его по завершении."""
+    try:
+        if process_avatar(profile_id):
+            log.info("Resized avatar of profile %s", profile_id)
+    except Exception:
+        log.exception("Avatar processing failed for profile %s", profile_id)
+    finally:
+        connection.close()
+
+
+def schedule_avatar(profile_id: int) -> None:
+    """
+    Ставит обработку аватара в фоновый поток после коммита текущей транзакции.
+
+    При AVATARS_ASYNC = False обрабатывает сразу (тесты, команды).
+    """
+    if not getattr(settings, "AVATARS_ASYNC", True):
+        process_avatar(profile_id)
+        return
+
+    transaction.on_commit(lambda: _executor.submit(_process_in_background, profile_id))
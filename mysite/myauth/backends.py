@@ -0,0 +1,63 @@
+"""
+Кэширование прав пользователей между запросами.
+
+ModelBackend кэширует права только на объекте пользователя, то есть на один
+запрос: каждый запрос с has_perm (UserPassesTestMixin, PermissionRequiredMixin,
+DRF, perms в шаблонах) снова загружает права пользователя и его групп.
+CachedPermissionsBackend хранит множество прав пользователя в кэше.
+
+Ключ содержит версию прав: любое изменение групп пользователей, прав групп и
+пользователей или самих групп/прав (админка, GroupsListView, API групп, команда
+bind_user) меняет версию после коммита транзакции, и все закэшированные права
+перестают использоваться. Версия, вытесненная из кэша, заменяется новой
+(mysite.cache.get_or_init_version), а не нулевой.
+"""
+from typing import Set
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+from mysite.cache import get_or_init_version, new_version
+
+
+PERMISSIONS_VERSION_KEY = "myauth:permissions:version"
+
+PERMISSIONS_CACHE_TIMEOUT = getattr(settings, "PERMISSIONS_CACHE_TIMEOUT", 60 * 10)
+
+
+def permissions_cache_key(user) -> str:
+    version = get_or_init_version(PERMISSIONS_VERSION_KEY)
+    # date_joined отличает пользователя от другого с тем же pk (пересозданная или тестовая БД при общем кэше),
+    # суперпользователь получает все права: смена флага - другой набор
+    return f"myauth:permissions:{version}:{user.pk}:{user.date_joined.timestamp()}:{int(user.is_superuser)}"
+
+
+class CachedPermissionsBackend(ModelBackend):
+    """ModelBackend, права пользователя которого берутся из кэша"""
+
+    def get_all_permissions(self, user_obj, obj=None) -> Set[str]:
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        if not hasattr(user_obj, "_perm_cache"):
+            key = permissions_cache_key(user_obj)
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, PERMISSIONS_CACHE_TIMEOUT)
+            user_obj._perm_cache = permissions
+
+        return user_obj._perm_cache
+
+
+def reset_permissions() -> None:
+    cache.set(PERMISSIONS_VERSION_KEY, new_version(), timeout=None)
+
+
+def permissions_changed(sender, **kwargs) -> None:
+    """Обработчик сигналов групп и прав: новая версия после коммита транзакции."""
+    if kwargs.get("action", "post_").startswith("pre_"):  # m2m_changed: только после изменения связей
+        return
+    transaction.on_commit(reset_permissions)
@@ -0,0 +1,91 @@
+"""
+Хэширование паролей в ограниченном пуле процессов.
+
+Хэш пароля - это сотни миллисекунд CPU (PBKDF2 на 1 млн итераций, scrypt, Argon2),
+и при всплеске входов/регистраций потоки запросов занимают все ядра. Хэшеры этого
+модуля - те же хэшеры Django (тот же algorithm и формат хранения, старые хэши
+проверяются как прежде), но encode() выполняется в пуле из PASSWORD_HASHING_WORKERS
+процессов. Ожидающий поток запроса не занимает CPU, а одновременно считается
+не больше PASSWORD_HASHING_WORKERS хэшей; в очереди пула - не больше
+PASSWORD_HASHING_QUEUE, остальные ждут места.
+
+Основной хэшер выбирается в settings.PASSWORD_HASHER_PROFILE (pbkdf2, scrypt, argon2 -
+нужен пакет argon2-cffi), хэши других профилей обновляются до основного при входе.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+log = logging.getLogger(__name__)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_queue_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Пул процессов хэширования или None, если хэшировать нужно в текущем процессе"""
+    global _pool, _queue_slots
+
+    workers = getattr(settings, "PASSWORD_HASHING_WORKERS", 0)
+    if not workers or multiprocessing.parent_process() is not None:  # в процессе пула - без вложенного пула
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            # fork из многопоточного процесса сервера копирует чужие блокировки (логгинг, БД)
+            # в состоянии "захвачена" - процессы пула запускаются через forkserver (на Windows - spawn)
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+            _queue_slots = threading.BoundedSemaphore(getattr(settings, "PASSWORD_HASHING_QUEUE", workers * 4))
+        return _pool
+
+
+def reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _encode(hasher_class, password: str, salt: str, args: tuple, kwargs: dict) -> str:
+    """Задача пула: encode() хэшера Django, без повторной отправки в пул"""
+    return super(PooledHasherMixin, hasher_class()).encode(password, salt, *args, **kwargs)
+
+
+class PooledHasherMixin:
+    """encode() (а значит и verify(), harden_runtime()) выполняется в пуле процессов"""
+
+    def encode(self, password, salt, *args, **kwargs):
+        pool = get_pool()
+        if pool is None:
+            return super().encode(password, salt, *args, **kwargs)
+
+        with _queue_slots:
+            try:
+                return pool.submit(_encode, type(self), password, salt, args, kwargs).result()
+            except BrokenProcessPool:
+                log.exception("Password hashing pool is broken, hashing in process")
+                reset_pool()
+                return super().encode(password, salt, *args, **kwargs)
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(PooledHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    pass
+
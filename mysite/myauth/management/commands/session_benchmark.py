@@ -0,0 +1,65 @@
+from importlib import import_module
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from myauth.sessions import wait_for_writes
+
+
+ENGINES = [
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+    "myauth.sessions",
+]
+
+
+class Command(BaseCommand):
+    """
+    Сравнение хранилищ сессий на запросах авторизованных пользователей.
+
+    Каждый "запрос" читает сессию, часть запросов (--writes) меняет ее, как
+    set_session_view. Считаются запросы к БД в потоке запроса и общее время,
+    для myauth.sessions - вместе с ожиданием фоновой записи.
+
+        python manage.py session_benchmark --sessions 50 --requests 2000 --writes 0.1
+    """
+    help = "Замер хранилищ сессий: db, cached_db и myauth.sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=50, help="Кол-во пользователей (сессий)")
+        parser.add_argument("--requests", type=int, default=2000, help="Кол-во запросов")
+        parser.add_argument("--writes", type=float, default=0.1, help="Доля запросов, изменяющих сессию")
+
+    def handle(self, *args, **options):
+        write_every = max(round(1 / options["writes"]), 1) if options["writes"] > 0 else 0
+        for engine in ENGINES:
+            self.benchmark(engine, options["sessions"], options["requests"], write_every)
+
+    def benchmark(self, engine: str, sessions: int, requests: int, write_every: int) -> None:
+        store_class = import_module(engine).SessionStore
+        keys = []
+        for number in range(sessions):
+            store = store_class()
+            store["_auth_user_id"] = str(number)
+            store.create()
+            keys.append(store.session_key)
+
+        started = default_timer()
+        with CaptureQueriesContext(connection) as context:
+            for number in range(requests):
+                store = store_class(keys[number % sessions])
+                counter = store.get("counter", 0)
+                if write_every and number % write_every == 0:
+                    store["counter"] = counter + 1
+                    store.save()
+        request_time = default_timer() - started
+        wait_for_writes()
+        total_time = default_timer() - started
+
+        for key in keys:
+            store_class(key).delete()
+
+        self.stdout.write(f"{engine:45} queries: {len(context.captured_queries):6}  "
+                          f"requests {request_time * 1000:8.1f}ms  total {total_time * 1000:8.1f}ms")
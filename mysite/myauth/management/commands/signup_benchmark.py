@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+
+from django.contrib.auth.hashers import check_password, get_hasher, make_password
+from django.core.management import BaseCommand
+from django.test.utils import override_settings
+
+from myauth.hashers import reset_pool
+
+
+class Command(BaseCommand):
+    """
+    Замер хэширования паролей при регистрации: регистраций в секунду.
+
+    Регистрация с authenticate() считала хэш дважды (сохранение и проверка),
+    с login() - один раз. Потоки изображают одновременные запросы, хэш считается
+    в потоке запроса или в пуле процессов myauth.hashers.
+
+        python manage.py signup_benchmark --signups 40 --threads 8 --algorithm scrypt
+    """
+    help = "Замер регистраций в секунду для хэшера паролей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signups", type=int, default=40, help="Кол-во регистраций")
+        parser.add_argument("--threads", type=int, default=8, help="Одновременных запросов")
+        parser.add_argument("--workers", type=int, default=2, help="Процессов пула хэширования")
+        parser.add_argument("--algorithm", default="default", help="pbkdf2_sha256, scrypt, argon2 (по умолчанию - основной)")
+
+    def handle(self, *args, **options):
+        hasher = get_hasher(options["algorithm"])
+        self.stdout.write(f"{hasher.algorithm}: {options['signups']} signups, {options['threads']} threads")
+
+        self.benchmark("authenticate after save, in thread", hasher.algorithm, 0, 2, options)
+        self.benchmark("login after save, in thread", hasher.algorithm, 0, 1, options)
+        self.benchmark(f"login after save, pool of {options['workers']}", hasher.algorithm, options["workers"], 1, options)
+
+    def benchmark(self, title: str, algorithm: str, workers: int, hashes: int, options: dict) -> None:
+        def signup(number: int) -> None:
+            password = f"benchmark-password-{number}"
+            encoded = make_password(password, hasher=algorithm)
+            if hashes == 2:
+                check_password(password, encoded, preferred=algorithm)
+
+        with override_settings(PASSWORD_HASHING_WORKERS=workers):
+            reset_pool()
+            signup(0)  # запуск процессов пула не входит в замер
+            started = default_timer()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                list(executor.map(signup, range(options["signups"])))
+            elapsed = default_timer() - started
+            reset_pool()
+
+        self.stdout.write(f"{title:40} {options['signups'] / elapsed:8.2f} signups/s")
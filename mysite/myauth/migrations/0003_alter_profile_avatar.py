@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 03:05
+
+import myauth.models
+import mysite.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0002_profile_avatar'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=myauth.models.avatar_directory_path),
+        ),
+    ]
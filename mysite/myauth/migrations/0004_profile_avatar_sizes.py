@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 16:05
+
+import myauth.models
+import mysite.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0003_alter_profile_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_large',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=myauth.models.avatar_directory_path),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_small',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=myauth.models.avatar_directory_path),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_source',
+            field=models.CharField(blank=True, editable=False, help_text='Имя оригинала, из которого построены avatar_small и avatar_large', max_length=255),
+        ),
+    ]
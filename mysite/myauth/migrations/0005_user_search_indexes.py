@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-19 17:10
+
+from django.db import migrations
+
+
+# Индексы на LOWER(...) для поиска по началу имени в каталоге пользователей
+# (myauth.views.UserDirectoryMixin). Таблица auth_user принадлежит django.contrib.auth,
+# поэтому индексы создаются здесь через SQL, а не в Meta модели.
+SEARCH_FIELDS = ("username", "first_name", "last_name")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('myauth', '0004_profile_avatar_sizes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX "auth_user_{field}_lower" ON "auth_user" (LOWER("{field}"));',
+            reverse_sql=f'DROP INDEX "auth_user_{field}_lower";',
+        )
+        for field in SEARCH_FIELDS
+    ]
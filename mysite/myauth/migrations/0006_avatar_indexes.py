@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 19:20
+
+import myauth.models
+import mysite.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0005_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=myauth.models.avatar_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar_large',
+            field=models.ImageField(blank=True, db_index=True, editable=False, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=myauth.models.avatar_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar_small',
+            field=models.ImageField(blank=True, db_index=True, editable=False, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=myauth.models.avatar_directory_path),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-19 19:45
+
+from django.db import migrations
+
+
+# Индексы каталога пользователей из 0005_user_search_indexes в SQLite перестраиваются
+# на UNICODE_LOWER (mysite.db.register_sqlite_functions): встроенная LOWER SQLite
+# меняет регистр только ASCII. В остальных СУБД LOWER учитывает Unicode, индексы прежние.
+SEARCH_FIELDS = ("username", "first_name", "last_name")
+
+
+def rebuild_indexes(schema_editor, function: str) -> None:
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX "auth_user_{field}_lower";')
+        schema_editor.execute(f'CREATE INDEX "auth_user_{field}_lower" ON "auth_user" ({function}("{field}"));')
+
+
+def unicode_indexes(apps, schema_editor):
+    rebuild_indexes(schema_editor, "UNICODE_LOWER")
+
+
+def ascii_indexes(apps, schema_editor):
+    rebuild_indexes(schema_editor, "LOWER")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0006_avatar_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(unicode_indexes, ascii_indexes),
+    ]
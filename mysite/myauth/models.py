@@ -1,15 +1,68 @@
 from django.contrib.auth.models import User
 from django.db import models
 
+from mysite.storage import content_addressed_storage
+
 
 def avatar_directory_path(instance: "Profile", avatar_name: str) -> str:
-    """Генерация пути для сохранения аватара"""
-    directory_path = "myauth/profile_{pk}/avatar/{filename}".format(pk=instance.pk, filename=avatar_name)
+    """Генерация пути для сохранения аватара, имя файла заменяется хэшем содержимого"""
+    directory_path = "myauth/avatars/{filename}".format(filename=avatar_name)
     return directory_path
 
 class Profile(models.Model):
-    """Модель пользователя"""
+    """
+    Модель пользователя
+
+    avatar - загруженный оригинал, avatar_small/avatar_large - квадратные копии
+    фиксированных размеров, строятся в фоне (см. myauth.avatars)
+    """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     agreement_accepted = models.BooleanField(default=False)
-    avatar = models.ImageField(null=True, blank=True, upload_to=avatar_directory_path)
+    avatar = models.ImageField(null=True,
+                               blank=True,
+                               upload_to=avatar_directory_path,
+                               storage=content_addressed_storage,
+                               db_index=True)  # подсчет ссылок на файл (ContentAddressedStorage.references)
+    avatar_small = models.ImageField(null=True, blank=True, editable=False,
+                                     upload_to=avatar_directory_path,
+                                     storage=content_addressed_storage,
+                                     db_index=True)
+    avatar_large = models.ImageField(null=True, blank=True, editable=False,
+                                     upload_to=avatar_directory_path,
+                                     storage=content_addressed_storage,
+                                     db_index=True)
+    avatar_source = models.CharField(max_length=255, blank=True, editable=False,
+                                     help_text="Имя оригинала, из которого построены avatar_small и avatar_large")
+
+    @classmethod
+    def for_user(cls, user: User) -> "Profile":
+        """
+        Профиль пользователя, создается при первом обращении.
+
+        Пользователи из createsuperuser, админки и команд создаются без профиля.
+        Профиль запоминается в user.profile, повторных запросов в рамках запроса нет.
+        """
+        try:
+            return user.profile
+        except cls.DoesNotExist:
+            profile, _ = cls.objects.get_or_create(user=user)
+            user.profile = profile
+            return profile
+
+    def get_avatar_url(self, size: str) -> str:
+        """URL копии размера size, пока она не построена для текущего оригинала - URL оригинала"""
+        if not self.avatar:
+            return ""
+        resized = getattr(self, f"avatar_{size}")
+        if resized and self.avatar_source == self.avatar.name:
+            return resized.url
+        return self.avatar.url
+
+    @property
+    def avatar_small_url(self) -> str:
+        return self.get_avatar_url("small")
+
+    @property
+    def avatar_large_url(self) -> str:
+        return self.get_avatar_url("large")
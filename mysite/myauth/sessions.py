@@ -0,0 +1,162 @@
+"""
+Сессии в кэше с отложенной записью в БД (SESSION_ENGINE = "myauth.sessions").
+
+Как cached_db, сессия читается из кэша (SESSION_CACHE_ALIAS) и только при промахе
+из таблицы django_session. Отличия при записи:
+
+- новая сессия (login, cycle_key) пишется в БД сразу - ключ должен быть уникальным;
+- измененная сессия сразу пишется в кэш, а в БД - фоновым потоком: изменения
+  сессий, накопившиеся за время записи, уходят одним UPDATE (bulk_update);
+- сохранение без изменений данных (совпадают с кэшем) ничего не пишет,
+  кроме SESSION_SAVE_EVERY_REQUEST, где запись продлевает срок сессии.
+
+Отложенная запись только обновляет существующие строки, поэтому сессию,
+удаленную при logout в другом процессе, она не восстановит. В кэш такую сессию
+не вернет и запрос, начатый до logout: delete() оставляет в кэше отметку об
+удалении, а сохранение сессии с отметкой (или без записи в кэше и строки в БД)
+завершается UpdateError, как в cached_db.
+
+Истекшие сессии удаляются пачками по SESSION_CLEANUP_BATCH_SIZE - и командой
+clearsessions, и тем же фоновым потоком не чаще раза в SESSION_CLEANUP_INTERVAL секунд.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core.cache import caches
+from django.db import connection, router, transaction
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+
+KEY_PREFIX = "myauth.sessions"
+
+CLEANUP_LOCK_KEY = "myauth:sessions:cleanup"
+
+# Сколько хранится отметка об удалении сессии: дольше любого запроса, начатого до удаления
+DELETED_TIMEOUT = getattr(settings, "SESSION_DELETED_TIMEOUT", 60 * 60)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-writes")
+
+# session_key -> (закодированные данные, expire_date) еще не записанных сессий
+_pending: Dict[str, Tuple[str, datetime]] = {}
+_pending_lock = threading.Lock()
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def save(self, must_create=False):
+        if must_create or self.session_key is None:
+            super().save(must_create)
+            return
+
+        data = self._get_session()
+        try:
+            cached = self._cache.get_many([self.cache_key, self.deleted_key(self.session_key)])
+        except Exception:
+            log.exception("Error saving session to cache (%s)", self._cache)
+            super().save()
+            return
+
+        if self.deleted_key(self.session_key) in cached:
+            raise UpdateError
+        if self.cache_key not in cached and not self.exists(self.session_key):
+            raise UpdateError  # вытеснена из кэша вместе с отметкой или удалена в обход delete()
+        if data == cached.get(self.cache_key) and not settings.SESSION_SAVE_EVERY_REQUEST:
+            return
+
+        try:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+        except Exception:
+            log.exception("Error saving session to cache (%s)", self._cache)
+            super().save()
+            return
+
+        queue_write(self.session_key, self.encode(data), self.get_expiry_date())
+
+    def delete(self, session_key=None):
+        session_key = session_key or self.session_key
+        if session_key is not None:
+            with _pending_lock:
+                _pending.pop(session_key, None)
+            self._cache.set(self.deleted_key(session_key), True, DELETED_TIMEOUT)
+        super().delete(session_key)
+
+    @staticmethod
+    def deleted_key(session_key: str) -> str:
+        return f"{KEY_PREFIX}:deleted:{session_key}"
+
+    @classmethod
+    def clear_expired(cls):
+        """Удаление истекших сессий пачками по индексу expire_date, каждая пачка - короткая транзакция"""
+        batch_size = getattr(settings, "SESSION_CLEANUP_BATCH_SIZE", 1000)
+        model = cls.get_model_class()
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(model.objects.filter(expire_date__lt=now).values_list("session_key", flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            deleted += model.objects.filter(session_key__in=keys).delete()[0]
+
+
+def queue_write(session_key: str, session_data: str, expire_date: datetime) -> None:
+    """
+    Ставит запись сессии в очередь фонового потока (после коммита текущей транзакции).
+
+    При SESSION_WRITE_ASYNC = False пишет сразу.
+    """
+    with _pending_lock:
+        _pending[session_key] = (session_data, expire_date)
+
+    if not getattr(settings, "SESSION_WRITE_ASYNC", True):
+        flush_writes()
+        return
+
+    transaction.on_commit(lambda: _executor.submit(_flush_in_background))
+
+
+def flush_writes() -> int:
+    """Записывает накопившиеся сессии одним UPDATE, возвращает кол-во обновленных строк"""
+    with _pending_lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    model = SessionStore.get_model_class()
+    sessions = [model(session_key=session_key, session_data=session_data, expire_date=expire_date)
+                for session_key, (session_data, expire_date) in batch.items()]
+    # bulk_update не создает строк: удаленная за это время сессия остается удаленной
+    return model.objects.using(router.db_for_write(model)).bulk_update(sessions, ["session_data", "expire_date"])
+
+
+def clear_expired_periodically() -> None:
+    """clear_expired() не чаще раза в SESSION_CLEANUP_INTERVAL секунд на все процессы"""
+    interval = getattr(settings, "SESSION_CLEANUP_INTERVAL", 60 * 60)
+    if caches[settings.SESSION_CACHE_ALIAS].add(CLEANUP_LOCK_KEY, 1, timeout=interval):
+        deleted = SessionStore.clear_expired()
+        log.info("Deleted %s expired sessions", deleted)
+
+
+def _flush_in_background() -> None:
+    """Задача пула: у потока свое соединение с БД, закрываем его по завершении."""
+    try:
+        flush_writes()
+        clear_expired_periodically()
+    except Exception:
+        log.exception("Session write failed")
+    finally:
+        connection.close()
+
+
+def wait_for_writes() -> None:
+    """Дожидается записи поставленных в очередь сессий (поток записи один)"""
+    _executor.submit(lambda: None).result()
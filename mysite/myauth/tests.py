@@ -1,6 +1,30 @@
 
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import hashers as django_hashers
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from myauth.backends import PERMISSIONS_VERSION_KEY
+from myauth.hashers import reset_pool
+from myauth.models import Profile
+from myauth.sessions import SessionStore, flush_writes
+from myauth.views import UsersListView
+
 
 class GetCookieViewTestCase(TestCase):
     def test_get_cookie_view(self):
@@ -17,3 +41,306 @@ class TestViewTest(TestCase):
         self.assertEqual(response.json(), expected_data)
 
 
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CachedPermissionsTestCase(TestCase):
+    """Класс тестирования кэша прав пользователей между запросами"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.permission = Permission.objects.get(codename="add_product")
+        cls.group = Group.objects.create(name="Cached permissions group")
+        cls.group.permissions.add(cls.permission)
+        cls.user = User.objects.create_user(username="CachedPermissionsUser", password="CachedPermissionsPassword")
+        cls.user.groups.add(cls.group)
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def fresh_user(self) -> User:
+        """Новый объект пользователя, как в следующем запросе"""
+        return User.objects.get(pk=self.user.pk)
+
+    def test_permissions_cached_between_requests(self) -> None:
+        """Тест: права пользователя и групп загружаются один раз, в следующих запросах - из кэша"""
+        user = self.fresh_user()
+        with self.assertNumQueries(2):  # права пользователя, права групп
+            self.assertTrue(user.has_perm("shopapp.add_product"))
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("shopapp.add_product"))
+            self.assertFalse(user.has_perm("shopapp.delete_product"))
+
+    def test_group_changes_reset_cache(self) -> None:
+        """Тест: изменение прав группы и состава групп пользователя сбрасывает кэш после коммита"""
+        self.assertTrue(self.fresh_user().has_perm("shopapp.add_product"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.remove(self.permission)
+        self.assertFalse(self.fresh_user().has_perm("shopapp.add_product"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.add(self.permission)
+            self.user.groups.clear()
+        self.assertFalse(self.fresh_user().has_perm("shopapp.add_product"))
+
+    def test_evicted_version_does_not_restore_permissions(self) -> None:
+        """Тест: после вытеснения ключа версии не читаются права, закэшированные до первой смены версии"""
+        self.assertTrue(self.fresh_user().has_perm("shopapp.add_product"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.permissions.remove(self.permission)
+        self.assertFalse(self.fresh_user().has_perm("shopapp.add_product"))
+
+        cache.delete(PERMISSIONS_VERSION_KEY)  # вытеснен при очистке FileBasedCache
+        self.assertFalse(self.fresh_user().has_perm("shopapp.add_product"))
+
+    def test_bind_user_resets_cache(self) -> None:
+        """Тест: команда bind_user выдает права, которые видны без ожидания истечения кэша"""
+        user = User.objects.create_user(username="Daria")
+        self.assertFalse(user.has_perm("admin.view_logentry"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("bind_user", stdout=StringIO())
+        self.assertTrue(User.objects.get(pk=user.pk).has_perm("admin.view_logentry"))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   SESSION_ENGINE="myauth.sessions", SESSION_WRITE_ASYNC=False)
+class SessionStoreTestCase(TestCase):
+    """Класс тестирования сессий в кэше с отложенной записью в БД"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.store = SessionStore()
+        self.store["user"] = "session user"
+        self.store.create()
+
+    def stored_data(self) -> dict:
+        return SessionStore().decode(Session.objects.get(session_key=self.store.session_key).session_data)
+
+    def test_reads_from_cache(self) -> None:
+        """Тест: чтение и сохранение без изменений не обращаются к БД"""
+        with self.assertNumQueries(0):
+            store = SessionStore(self.store.session_key)
+            self.assertEqual(store["user"], "session user")
+            store["user"] = "session user"
+            store.save()
+
+    def test_changes_written_in_one_update(self) -> None:
+        """Тест: изменения сразу в кэше, в БД - одним UPDATE на все сессии очереди"""
+        other = SessionStore()
+        other.create()
+
+        with self.settings(SESSION_WRITE_ASYNC=True):  # в TestCase on_commit не выполняется: запись ждет в очереди
+            for store, value in ((SessionStore(self.store.session_key), 1), (SessionStore(other.session_key), 2)):
+                store["counter"] = value
+                store.save()
+        self.assertEqual(SessionStore(self.store.session_key)["counter"], 1)
+        self.assertNotIn("counter", self.stored_data())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_writes(), 2)
+        self.assertEqual(self.stored_data()["counter"], 1)
+
+    def test_queued_write_does_not_restore_deleted_session(self) -> None:
+        """Тест: отложенная запись не восстанавливает сессию, удаленную при выходе"""
+        with self.settings(SESSION_WRITE_ASYNC=True):
+            store = SessionStore(self.store.session_key)
+            store["counter"] = 1
+            store.save()
+        SessionStore(self.store.session_key).flush()
+
+        flush_writes()
+        self.assertFalse(Session.objects.filter(session_key=self.store.session_key).exists())
+
+    def test_inflight_save_does_not_restore_deleted_session(self) -> None:
+        """Тест: запрос, начатый до logout в другом запросе, не возвращает сессию ни в кэш, ни в БД"""
+        inflight = SessionStore(self.store.session_key)
+        self.assertEqual(inflight["user"], "session user")
+        SessionStore(self.store.session_key).delete()
+
+        inflight["counter"] = 1
+        with self.assertRaises(UpdateError):
+            inflight.save()
+        self.assertEqual(SessionStore(self.store.session_key).load(), {})
+        self.assertFalse(Session.objects.filter(session_key=self.store.session_key).exists())
+
+    def test_save_after_cache_eviction_checks_row(self) -> None:
+        """Тест: без записи в кэше сессия сохраняется, только если ее строка есть в БД"""
+        store = SessionStore(self.store.session_key)
+        store["counter"] = 1
+        cache.clear()
+        store.save()
+        self.assertEqual(SessionStore(self.store.session_key).load()["counter"], 1)
+
+        store["counter"] = 2
+        cache.clear()
+        Session.objects.filter(session_key=self.store.session_key).delete()
+        with self.assertRaises(UpdateError):
+            store.save()
+        self.assertEqual(SessionStore(self.store.session_key).load(), {})
+
+    def test_clear_expired_in_batches(self) -> None:
+        """Тест: истекшие сессии удаляются пачками, действующие остаются"""
+        Session.objects.bulk_create([Session(session_key=f"expired{number}", session_data="",
+                                             expire_date=timezone.now() - timedelta(days=1)) for number in range(5)])
+
+        with self.settings(SESSION_CLEANUP_BATCH_SIZE=2):
+            self.assertEqual(SessionStore.clear_expired(), 5)
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), [self.store.session_key])
+
+    def test_session_view(self) -> None:
+        """Тест: значение, записанное set_session_view, читается следующим запросом"""
+        user = User.objects.create_user(username="SessionUser", password="SessionPassword")
+        user.user_permissions.add(Permission.objects.get(codename="view_profile"))
+        self.client.force_login(user)
+
+        self.client.get(reverse("myauth:session_set"))
+        self.assertContains(self.client.get(reverse("myauth:session_get")), "test2 - value")
+
+
+class PasswordHashingTestCase(TestCase):
+    """Класс тестирования хэширования паролей: одна операция при регистрации, пул процессов"""
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_register_hashes_password_once(self) -> None:
+        """Тест: регистрация сохраняет пользователя с профилем и входит без повторного хэширования"""
+        encode = django_hashers.PBKDF2PasswordHasher.encode
+        with mock.patch.object(django_hashers.PBKDF2PasswordHasher, "encode", autospec=True,
+                               side_effect=encode) as encode_mock:
+            response = self.client.post(reverse("myauth:register"), {"username": "NewSignup",
+                                                                     "password1": "Signup-Password-1",
+                                                                     "password2": "Signup-Password-1"})
+
+        self.assertRedirects(response, reverse("myauth:about_me"), fetch_redirect_response=False)
+        self.assertEqual(encode_mock.call_count, 1)
+        user = User.objects.get(username="NewSignup")
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertEqual(int(self.client.session["_auth_user_id"]), user.pk)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1)
+    def test_pool_keeps_hash_format(self) -> None:
+        """Тест: хэш из пула совпадает с хэшем Django, старые хэши проверяются"""
+        pooled = make_password("pooled password", salt="pooledsalt")
+        self.assertEqual(pooled, django_hashers.PBKDF2PasswordHasher().encode("pooled password", "pooledsalt"))
+        self.assertTrue(check_password("pooled password", pooled))
+
+        scrypt = django_hashers.ScryptPasswordHasher().encode("old password", "scryptsalt")
+        self.assertTrue(check_password("old password", scrypt))
+        self.assertFalse(check_password("wrong password", scrypt))
+        reset_pool()
+
+
+@override_settings(AVATARS_ASYNC=False)
+class ProfileAvatarTestCase(TestCase):
+    """Класс тестирования профиля: создание при первом обращении и копии аватара"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Временная папка для медиа файлов"""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Удаление временной папки"""
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_superuser(username="AvatarAdmin", password="AvatarPassword")
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def make_image(name: str, color: str, size=(800, 400)) -> SimpleUploadedFile:
+        buffer = BytesIO()
+        Image.new("RGB", size, color).save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def test_profile_created_on_first_visit(self) -> None:
+        """Тест: у пользователя из createsuperuser профиль создается при открытии about-me"""
+        self.assertFalse(Profile.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(reverse("myauth:about_me")).status_code, 200)
+        self.assertEqual(self.client.get(reverse("myauth:about_me")).status_code, 200)
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
+
+    def test_avatar_resized_and_replaced(self) -> None:
+        """Тест: загруженный аватар обрезается до квадратов, копии старого аватара удаляются"""
+        self.client.post(reverse("myauth:about_me"), {"avatar": self.make_image("first.png", "red")})
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+        self.assertEqual((profile.avatar_small.width, profile.avatar_small.height), (64, 64))
+        self.assertEqual((profile.avatar_large.width, profile.avatar_large.height), (256, 256))
+
+        response = self.client.get(reverse("myauth:user_detail", kwargs={"pk": profile.pk}))
+        self.assertContains(response, profile.avatar_large.url)
+
+        old_small = profile.avatar_small.name
+        self.client.post(reverse("myauth:user_detail", kwargs={"pk": profile.pk}),
+                         {"avatar": self.make_image("second.png", "blue")})
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+        self.assertNotEqual(profile.avatar_small.name, old_small)
+        self.assertFalse(profile.avatar_small.storage.exists(old_small))
+
+
+class UsersDirectoryTestCase(TestCase):
+    """Класс тестирования каталога пользователей: поиск, страницы, JSON"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        names = [("anna", "Anna", "Smirnova"), ("boris", "Boris", "Annenkov"), ("clara", "Clara", "Ivanova")]
+        names += [(f"user{number:02}", "", "") for number in range(30)]
+        for username, first_name, last_name in names:
+            user = User.objects.create(username=username, first_name=first_name, last_name=last_name)
+            Profile.objects.create(user=user)
+
+    def search(self, query: str) -> list:
+        response = self.client.get(reverse("myauth:user_list_api"), {"q": query})
+        return [result["username"] for result in response.json()["results"]]
+
+    def test_search_by_name_prefix(self) -> None:
+        """Тест: поиск без учета регистра по началу username, имени или фамилии"""
+        self.assertEqual(self.search("ANN"), ["anna", "boris"])
+        self.assertEqual(self.search("ivan"), ["clara"])
+        self.assertEqual(self.search("nna"), [])
+
+        response = self.client.get(reverse("myauth:user_list"), {"q": "cla"})
+        self.assertContains(response, "Clara Ivanova")
+        self.assertNotContains(response, "@anna")
+
+    def test_search_cyrillic(self) -> None:
+        """Тест: регистр кириллицы не учитывается - в SQLite поле и запрос приводятся через UNICODE_LOWER"""
+        Profile.objects.create(user=User.objects.create(username="Дмитрий", first_name="Дмитрий", last_name="Волков"))
+        self.assertEqual(self.search("Дми"), ["Дмитрий"])
+        self.assertEqual(self.search("дми"), ["Дмитрий"])
+        self.assertEqual(self.search("ВОЛК"), ["Дмитрий"])
+
+    def test_pages(self) -> None:
+        """Тест: каталог выдается страницами, двумя запросами (кол-во и страница)"""
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("myauth:user_list_api"), {"page": 2}).json()
+        self.assertEqual(data["count"], 33)
+        self.assertEqual((data["page"], data["next"], data["previous"]), (2, None, 1))
+        self.assertEqual(len(data["results"]), 9)
+        self.assertEqual(data["results"][0]["username"], "user21")
+
+        response = self.client.get(reverse("myauth:user_list"))
+        self.assertEqual(len(response.context["profiles"]), 24)
+        self.assertContains(response, "page=2")
+
+    @skipUnless(connection.vendor == "sqlite", "План запроса SQLite")
+    def test_search_uses_indexes(self) -> None:
+        """Тест: поиск идет по индексам на LOWER(...), без полного просмотра auth_user"""
+        request = RequestFactory().get(reverse("myauth:user_list"), {"q": "ann"})
+        view = UsersListView(request=request, kwargs={})
+        plan = view.get_queryset().explain()
+        for field in ("username", "first_name", "last_name"):
+            self.assertIn(f"auth_user_{field}_lower", plan)
+        self.assertNotIn("SCAN auth_user", plan)
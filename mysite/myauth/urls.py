@@ -9,7 +9,7 @@ from .views import (set_cookie_vierw,
                     RegisterView,
                     my_logout_view,
                     TestView,
-                    UsersListView, UserDetailView,
+                    UsersListView, UsersListApiView, UserDetailView,
                     HelloView)
 
 
@@ -27,6 +27,7 @@ urlpatterns = [
     path("about_me/", AboutMeView.as_view(), name="about_me"),
     path("users/<int:pk>/", UserDetailView.as_view(), name="user_detail"),
     path("user_list/", UsersListView.as_view(), name="user_list"),
+    path("user_list/api/", UsersListApiView.as_view(), name="user_list_api"),
     path("test_view/", TestView.as_view(), name="test_view"),
 
     path("hello/", HelloView.as_view(), name="hello"),
@@ -1,18 +1,23 @@
 from random import random
 
-from django.contrib.auth import logout, authenticate, login
+from django.contrib.auth import logout, login
 from django.contrib.auth.decorators import login_required, permission_required, user_passes_test
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
+from django.db.models import Q, Value
+from django.db.models.functions import Concat
 from django.http import HttpResponse, HttpRequest, JsonResponse
 from django.shortcuts import redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.decorators.cache import cache_page
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 from django.views import View
 from django.utils.translation import gettext_lazy as _, ngettext
 
+from mysite.db import UnicodeLower
+
+from .avatars import schedule_avatar
 from .forms import ProfileForm
 from .models import Profile
 
@@ -47,10 +52,16 @@ class AboutMeView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy("myauth:about_me")
 
     def get_object(self, queryset=None):
-        """Получаем профиль текущего пользователя"""
-        user_profile = self.request.user.profile
+        """Получаем профиль текущего пользователя (создается, если его еще нет)"""
+        user_profile = Profile.for_user(self.request.user)
         return user_profile
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if "avatar" in form.changed_data:
+            schedule_avatar(self.object.pk)
+        return response
+
 
 class UserDetailView(LoginRequiredMixin,DetailView):
     """Страница конкретного пользователя"""
@@ -71,17 +82,87 @@ class UserDetailView(LoginRequiredMixin,DetailView):
 
             raise PermissionDenied("Only staff can edit profiles")
 
-        # Меняем аватарку
+        # Меняем аватарку, копии нужных размеров строятся в фоне
         if 'avatar' in request.FILES:
             profile.avatar = request.FILES['avatar']
-            profile.save()
+            profile.save(update_fields=["avatar"])
+            schedule_avatar(profile.pk)
 
         return redirect('myauth:user_detail', pk=profile.pk)
 
-class UsersListView(ListView):
+class UserDirectoryMixin:
+    """
+    Каталог пользователей: постраничный, с поиском по началу username, имени или фамилии.
+
+    Поиск без учета регистра - диапазон по UnicodeLower(поле), по нему работают индексы
+    на выражения из миграции 0007_user_search_unicode_indexes (LIKE/istartswith их
+    не использует). Встроенная LOWER SQLite меняет только ASCII, поэтому в SQLite
+    это функция UNICODE_LOWER (mysite.db.register_sqlite_functions) - регистр
+    кириллицы тоже не учитывается. Запрос приводится к нижнему регистру той же функцией.
+    Выбираются только колонки, нужные карточке пользователя.
+    """
+    paginate_by = 24
+    search_fields = ("username", "first_name", "last_name")
+    directory_fields = ("id", "avatar", "avatar_small", "avatar_source",
+                        "user__id", "user__username", "user__first_name", "user__last_name",
+                        "user__email", "user__date_joined")
+
+    def get_search_query(self) -> str:
+        return self.request.GET.get("q", "").strip()
+
+    def get_queryset(self):
+        queryset = (Profile.objects.
+                    select_related("user").
+                    only(*self.directory_fields).
+                    order_by("user__username"))
+
+        query = self.get_search_query()
+        if not query:
+            return queryset
+
+        lower_query = UnicodeLower(Value(query))
+        condition = Q()
+        for field in self.search_fields:
+            alias = f"{field}_lower"
+            queryset = queryset.alias(**{alias: UnicodeLower(f"user__{field}")})
+            # все строки, начинающиеся с query, лежат в [query, query + максимальный символ)
+            condition |= Q(**{f"{alias}__gte": lower_query,
+                              f"{alias}__lt": Concat(lower_query, Value("\U0010ffff"))})
+        return queryset.filter(condition)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("q", "")
+        return context
+
+
+class UsersListView(UserDirectoryMixin, ListView):
     template_name = "myauth/users_list.html"
     context_object_name = "profiles"
-    queryset = Profile.objects.select_related("user")
+
+
+class UsersListApiView(UserDirectoryMixin, ListView):
+    """JSON-вариант каталога пользователей: те же поиск и страницы, аватары - маленькие копии"""
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context["page_obj"]
+        return JsonResponse({
+            "count": page.paginator.count,
+            "page": page.number,
+            "num_pages": page.paginator.num_pages,
+            "next": page.next_page_number() if page.has_next() else None,
+            "previous": page.previous_page_number() if page.has_previous() else None,
+            "results": [
+                {
+                    "id": profile.pk,
+                    "username": profile.user.username,
+                    "full_name": profile.user.get_full_name(),
+                    "avatar": self.request.build_absolute_uri(profile.avatar_small_url) if profile.avatar else None,
+                    "url": reverse("myauth:user_detail", kwargs={"pk": profile.pk}),
+                }
+                for profile in context["object_list"]
+            ],
+        })
 
 class RegisterView(CreateView):
     form_class = UserCreationForm
@@ -91,19 +172,10 @@ class RegisterView(CreateView):
     def form_valid(self, form):
         # Сохраняем пользователя
         response = super().form_valid(form)
-        Profile.objects.create(user=self.object)
+        Profile.for_user(self.object)
 
-        # Получаем данные из формы
-        username = form.cleaned_data.get("username")
-        password = form.cleaned_data.get("password1")
-
-        # Аутентифицируем пользователя
-        user = authenticate(
-            request=self.request,
-            username=username,
-            password=password
-        )
-        login(request=self.request, user=user)
+        # Пароль только что проверен формой: входим без authenticate(), чтобы не хэшировать его второй раз
+        login(request=self.request, user=self.object)
 
         return response
 
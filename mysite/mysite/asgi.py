@@ -3,14 +3,23 @@ ASGI config for mysite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Prefork gunicorn with uvicorn workers (persistent DB connections are disabled, see gunicorn.conf.py):
+    GUNICORN_APP=mysite.asgi:application GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker gunicorn -c gunicorn.conf.py
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_asgi_application()
+
+# runserver сам раздает статику, под uvicorn в режиме отладки делаем это здесь
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
@@ -0,0 +1,30 @@
+"""
+Версии для инвалидации кэша проекта (права пользователей, фрагменты статей, фасеты блога).
+
+Ключи закэшированных данных содержат версию, смена версии делает их недоступными.
+Версия - time.time_ns(), то есть новое значение никогда не совпадает с прошлыми:
+если ключ версии вытеснен из кэша (FileBasedCache чистит записи сверх MAX_ENTRIES),
+записи под старыми версиями не становятся снова видны.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def new_version() -> int:
+    return time.time_ns()
+
+
+def get_or_init_version(key: str) -> int:
+    """
+    Текущая версия по ключу, при промахе - новая.
+
+    cache.add записывает только отсутствующий ключ: при гонке процессы получают
+    одну версию - ту, что записана первой.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
@@ -0,0 +1,271 @@
+"""
+Настройка соединений с базой данных (PRAGMA и функции SQLite), маршрутизация
+запросов primary/replica, оценка кол-ва строк больших таблиц по статистике СУБД
+и объединение действий после коммита транзакции.
+"""
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterable, Optional, Set, Type
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, models, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.functions import Lower
+from django.dispatch import receiver
+from django.http import HttpRequest, HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.functional import cached_property
+
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs) -> None:
+    """
+    Применяет SQLITE_PRAGMAS к каждому новому соединению SQLite.
+
+    WAL позволяет читателям не блокироваться писателем, synchronous=NORMAL в режиме WAL
+    убирает fsync на каждый коммит, busy_timeout заставляет ждать блокировку вместо
+    ошибки "database is locked", mmap_size читает базу через отображение в память.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value};")
+
+
+def unicode_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs) -> None:
+    """
+    Регистрирует UNICODE_LOWER в каждом новом соединении SQLite.
+
+    Встроенная LOWER SQLite меняет регистр только ASCII. UNICODE_LOWER - str.lower()
+    Python, объявлена детерминированной, поэтому на ней строятся индексы на выражения
+    (myauth, 0007_user_search_unicode_indexes). Писать в такие таблицы можно только
+    из соединений, где функция зарегистрирована.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    connection.connection.create_function("UNICODE_LOWER", 1, unicode_lower, deterministic=True)
+
+
+class UnicodeLower(Lower):
+    """Lower с учетом Unicode: в SQLite - UNICODE_LOWER, в остальных СУБД - LOWER."""
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function="UNICODE_LOWER", **extra_context)
+
+
+REPLICA_DATABASE = "replica"
+REPLICA_PIN_COOKIE = "pin_primary"
+
+# Приложения, чьи модели всегда читаются с primary: сессии, пользователи и права
+# должны сразу отражать вход, выход и отзыв прав
+PRIMARY_ONLY_APPS = ("auth", "sessions")
+
+# Читать ли в текущем запросе с реплики. Выставляется декоратором read_from_replica
+_use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Роутер БД: запись всегда в default, чтение во view с read_from_replica - с реплики.
+
+    Реплика используется, только если в DATABASES есть алиас "replica" и view
+    разрешила чтение с нее (read_from_replica, GET/HEAD без закрепления за primary).
+    Модели PRIMARY_ONLY_APPS, а также все запросы вне таких view (остальные view,
+    middleware, команды, shell) идут в default.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if (_use_replica.get()
+                and REPLICA_DATABASE in settings.DATABASES
+                and model._meta.app_label not in PRIMARY_ONLY_APPS):
+            return REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints) -> str:
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        # Реплика содержит те же данные, поэтому связи между алиасами допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> bool:
+        # Схема попадает на реплику вместе с данными через репликацию
+        return db != REPLICA_DATABASE
+
+
+def can_use_replica(request: HttpRequest) -> bool:
+    return request.method in SAFE_METHODS and REPLICA_PIN_COOKIE not in request.COOKIES
+
+
+def read_from_replica(view: Callable) -> Callable:
+    """
+    Декоратор view (в urls.py): чтения внутри безопасного запроса к ней идут на реплику.
+
+    Подключается явно для view, которым допустимо отставание реплики: списки,
+    детальные страницы, выгрузки, фиды и sitemap. Асинхронные view ожидаются,
+    пока признак выставлен.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            use_replica = can_use_replica(request)
+            token = _use_replica.set(use_replica)
+            try:
+                return _render_on_replica(await view(request, *args, **kwargs), use_replica)
+            finally:
+                _use_replica.reset(token)
+
+        return markcoroutinefunction(async_wrapper)
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        use_replica = can_use_replica(request)
+        token = _use_replica.set(use_replica)
+        try:
+            return _render_on_replica(view(request, *args, **kwargs), use_replica)
+        finally:
+            _use_replica.reset(token)
+
+    return wrapper
+
+
+def _render_on_replica(response: HttpResponse, use_replica: bool) -> HttpResponse:
+    """
+    TemplateResponse выполняет ленивые queryset'ы при рендеринге, который Django делает
+    уже после выхода из view (после process_template_response). Подменяем render
+    экземпляра: он снимает подмену и рендерит с тем же признаком чтения с реплики.
+    """
+    if not use_replica or not isinstance(response, SimpleTemplateResponse) or response.is_rendered:
+        return response
+
+    def render() -> HttpResponse:
+        del response.render
+        token = _use_replica.set(use_replica)
+        try:
+            return response.render()
+        finally:
+            _use_replica.reset(token)
+
+    response.render = render
+    return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Middleware закрепляет клиента за primary после изменяющего запроса.
+
+    После POST, PUT, PATCH, DELETE ставит cookie, которая на REPLICA_PIN_SECONDS
+    отключает чтение с реплики (read_from_replica): пользователь сразу видит
+    свои изменения, пока реплика догоняет.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin_to_primary(request, self.get_response(request))
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        return self.pin_to_primary(request, await self.get_response(request))
+
+    @staticmethod
+    def pin_to_primary(request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(REPLICA_PIN_COOKIE, "1",
+                                max_age=getattr(settings, "REPLICA_PIN_SECONDS", 5),
+                                httponly=True,
+                                samesite="Lax")
+        return response
+
+
+def estimated_count(model: Type[models.Model], using: str = "default") -> Optional[int]:
+    """
+    Примерное кол-во строк таблицы модели из статистики планировщика, None - если статистики нет.
+
+    PostgreSQL: pg_class.reltuples (обновляется VACUUM/ANALYZE).
+    SQLite: первое число sqlite_stat1.stat - кол-во строк индекса на момент ANALYZE (или
+    PRAGMA optimize). Частичные индексы покрывают не все строки, поэтому берется максимум
+    по всем строкам статистики таблицы.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+
+    if connection.vendor == "postgresql":
+        sql, params = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table]
+    elif connection.vendor == "sqlite":
+        sql, params = "SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s", [table]
+    else:
+        return None
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:  # sqlite_stat1 появляется только после первого ANALYZE
+        return None
+
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None  # reltuples = -1: таблица еще не анализировалась
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор админки для больших таблиц.
+
+    Без фильтров и поиска кол-во берется из статистики СУБД вместо COUNT(*) по всей
+    таблице, если таблица больше ESTIMATED_COUNT_THRESHOLD строк. С фильтрами и для
+    маленьких таблиц считается точно.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate >= getattr(settings, "ESTIMATED_COUNT_THRESHOLD", 10_000):
+                return estimate
+        return super().count
+
+
+def on_commit_collect(key: str, func: Callable[[Set], None], items: Iterable = (), using: Optional[str] = None) -> None:
+    """
+    Один вызов func(элементы) после коммита на все вызовы с тем же key в транзакции.
+
+    Элементы копятся в множестве на соединении (у каждого потока свое). Каждый вызов
+    ставит в on_commit легкий callback, работу делает только первый из них: он забирает
+    множество, остальные его уже не находят. Элементы откаченной транзакции уходят
+    со следующим коммитом - лишний пересчет безопасен.
+    """
+    connection = transaction.get_connection(using)
+    pending = connection.__dict__.setdefault("on_commit_pending", {})
+    pending.setdefault(key, set()).update(items)
+
+    def run() -> None:
+        collected = pending.pop(key, None)
+        if collected is not None:
+            func(collected)
+
+    transaction.on_commit(run, using=using)
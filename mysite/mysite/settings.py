@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import os
 from pathlib import Path
 
 from concurrent_log_handler import ConcurrentRotatingFileHandler
@@ -59,6 +60,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # 'django.middleware.cache.UpdateCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    "mysite.db.ReplicaRoutingMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -110,6 +112,20 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения включается переменной окружения, например DJANGO_DB_REPLICA=db-replica.sqlite3
+# Локально ее наполняет команда sync_replica
+if os.environ.get("DJANGO_DB_REPLICA"):
+    DATABASES["replica"] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ["DJANGO_DB_REPLICA"],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ["mysite.db.PrimaryReplicaRouter"]
+
+# Сколько секунд после изменяющего запроса клиент читает с primary
+REPLICA_PIN_SECONDS = 5
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
@@ -119,9 +135,35 @@ CACHES = {
 
 CACHE_MIDDLEWARE_SECONDS = 2
 
+# Время жизни отрендеренных статей блога (сбрасываются версией при изменениях)
+BLOG_ARTICLE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько похожих статей хранится и выводится на странице статьи (blogapp.related)
+BLOG_RELATED_ARTICLES = 5
+# После изменения тегов похожие статьи пересчитываются в фоновом потоке
+BLOG_RELATED_ASYNC = True
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Основной хэшер паролей: pbkdf2, scrypt или argon2 (нужен argon2-cffi). Хэши остальных
+# проверяются и обновляются до основного при входе. Хэширование - в пуле процессов (myauth.hashers)
+PASSWORD_HASHER_PROFILE = os.environ.get("PASSWORD_HASHER_PROFILE", "pbkdf2")
+_PROFILE_HASHERS = {
+    "pbkdf2": "myauth.hashers.PBKDF2PasswordHasher",
+    "scrypt": "myauth.hashers.ScryptPasswordHasher",
+    "argon2": "myauth.hashers.Argon2PasswordHasher",
+}
+PASSWORD_HASHERS = [
+    _PROFILE_HASHERS[PASSWORD_HASHER_PROFILE],
+    *(hasher for profile, hasher in _PROFILE_HASHERS.items() if profile != PASSWORD_HASHER_PROFILE),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+# Процессов хэширования (0 - в потоке запроса) и хэшей в очереди пула
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 8
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -176,11 +218,51 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = reverse_lazy("myauth:about_me")
 LOGIN_URL = reverse_lazy("myauth:login")
 
+# Права пользователей кэшируются между запросами (myauth.backends), сбрасываются при изменении групп и прав
+AUTHENTICATION_BACKENDS = ["myauth.backends.CachedPermissionsBackend"]
+PERMISSIONS_CACHE_TIMEOUT = 60 * 10
+
+# Сессии читаются из кэша, измененные пишутся в БД фоновым потоком пачками (myauth.sessions)
+SESSION_ENGINE = "myauth.sessions"
+SESSION_WRITE_ASYNC = True
+# Удаление истекших сессий тем же потоком: не чаще раза в интервал, пачками
+SESSION_CLEANUP_INTERVAL = 60 * 60
+SESSION_CLEANUP_BATCH_SIZE = 1000
+
 
 # Настрйоки медиа файлов
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "uploads"
 
+# Миниатюры изображений продуктов строятся в фоновом пуле потоков
+THUMBNAILS_ASYNC = True
+THUMBNAIL_WORKERS = 2
+
+# Копии аватаров фиксированных размеров строятся в фоновом потоке (myauth.avatars)
+AVATARS_ASYNC = True
+
+# Массовые действия над продуктами (shopapp.bulk): размер пачки и фоновое выполнение из админки
+BULK_ACTIONS_ASYNC = True
+BULK_ACTION_CHUNK_SIZE = 500
+
+# Параллельная запись изображений галереи при создании/редактировании продукта
+IMAGE_UPLOAD_WORKERS = 8
+
+# С какого кол-ва строк списки админки больших таблиц берут кол-во из статистики БД (mysite.db.EstimatedCountPaginator)
+ESTIMATED_COUNT_THRESHOLD = 10_000
+
+# "Часто покупают вместе" (shopapp.recommendations): продуктов на товар и строк заказов на пачку при пересчете
+SHOP_RECOMMENDATIONS_COUNT = 5
+SHOP_RECOMMENDATIONS_CHUNK_LINES = 1_000_000
+# Списки продуктов измененных заказов пересчитываются в фоновом потоке
+SHOP_RECOMMENDATIONS_ASYNC = True
+
+# Загрузка больших файлов по частям (requestdataapp.chunked)
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+CHUNKED_UPLOAD_EXPIRE_SECONDS = 24 * 60 * 60  # незавершенная загрузка удаляется через сутки без новых частей
+CHUNKED_UPLOAD_CLEANUP_INTERVAL = 60 * 60
+
 #Настройки REST FRAMEWORK
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -0,0 +1,53 @@
+"""
+Production settings for mysite project.
+
+Usage:
+    DJANGO_SETTINGS_MODULE=mysite.settings_production gunicorn -c gunicorn.conf.py
+
+Отключает отладочные инструменты, включает постоянные соединения с БД
+и настраивает SQLite (WAL, synchronous=NORMAL, busy timeout, mmap).
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, MIDDLEWARE
+
+from . import db  # noqa: F401  регистрирует обработчик connection_created
+
+
+SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY", SECRET_KEY)  # noqa: F405
+
+DEBUG = False
+
+ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "127.0.0.1,0.0.0.0,localhost").split(",")
+
+# Отладочные инструменты в production не нужны
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "debug_toolbar"]
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in ("debug_toolbar.middleware.DebugToolbarMiddleware",
+                          "django.contrib.admindocs.middleware.XViewMiddleware")
+]
+
+# Database
+# Соединение живет между запросами воркера и проверяется перед повторным использованием.
+# Только для WSGI: под ASGI соединения не переиспользуются, gunicorn.conf.py выставляет
+# DJANGO_CONN_MAX_AGE=0 для mysite.asgi
+
+for database in DATABASES.values():
+    database.update({
+        "CONN_MAX_AGE": int(os.environ.get("DJANGO_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": 5,  # секунды ожидания блокировки на уровне драйвера sqlite3
+            "transaction_mode": "IMMEDIATE",
+        },
+    })
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -20000,  # ~20 МБ кэша страниц
+}
@@ -0,0 +1,189 @@
+"""
+Контентно-адресуемое хранилище файлов проекта (изображения продуктов, аватары).
+
+Имя файла - SHA-256 его содержимого: products/preview/ab/cd/abcd...ef.jpg.
+Одинаковые загрузки хранятся один раз, а файл удаляется с диска,
+только когда на него не ссылается ни одна запись в БД.
+
+Модуль общий для приложений: каждое приложение подключает release_files
+(удаление записи) и release_replaced_files (замена файла в поле) к своим
+моделям в AppConfig.ready() через connect_release_files().
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import re
+from contextlib import contextmanager
+from functools import partial
+from pathlib import PurePath
+from typing import Iterator, Optional, Tuple, Type
+
+import portalocker
+
+from django.apps import AppConfig, apps
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models, router, transaction
+from django.db.models.signals import post_delete, post_init, pre_save
+from django.utils.deconstruct import deconstructible
+
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+HASHED_NAME_RE = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+# Каталог файлов блокировок в корне хранилища: по одному на первые два символа хэша
+LOCKS_DIRECTORY = ".locks"
+
+log = logging.getLogger(__name__)
+
+
+def file_digest(content: File) -> str:
+    """SHA-256 содержимого файла, читается потоково по HASH_CHUNK_SIZE байт."""
+    digest = hashlib.sha256()
+    for chunk in content.chunks(chunk_size=HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage, раскладывающий файлы по хэшу содержимого.
+
+    Каталог берется из upload_to поля, имя файла заменяется на хэш.
+    Если такой файл уже есть - повторно не записывается.
+
+    Сохранение и удаление одного имени идут под блокировкой файла (между процессами).
+    Запись, сославшаяся на уже существующий файл, видна подсчету ссылок только после
+    коммита, поэтому после коммита файл проверяется еще раз и при необходимости
+    записывается заново.
+    """
+
+    @contextmanager
+    def locked(self, name: str) -> Iterator[None]:
+        """Исключительная блокировка имени (общая для имен с теми же первыми символами хэша)."""
+        stripe = posixpath.basename(name)[:2]
+        path = os.path.join(self.location, LOCKS_DIRECTORY, f"{stripe}.lock")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as file:  # закрытие файла снимает блокировку
+            portalocker.lock(file, portalocker.LockFlags.EXCLUSIVE)
+            yield
+
+    def _save(self, name: str, content: File) -> str:
+        digest = file_digest(content)
+        extension = PurePath(name).suffix.lower()
+        hashed_name = posixpath.join(posixpath.dirname(name), digest[:2], digest[2:4], digest + extension)
+
+        with self.locked(hashed_name):
+            if not self.exists(hashed_name):
+                return super()._save(hashed_name, content)
+
+        # дубликат: используем уже сохраненный файл
+        transaction.on_commit(partial(self.restore, hashed_name, content))
+        return hashed_name
+
+    def restore(self, name: str, content: File) -> None:
+        """
+        После коммита записи-дубликата: параллельное удаление могло посчитать ссылки
+        до этого коммита и удалить файл - тогда он записывается заново.
+        """
+        with self.locked(name):
+            if self.exists(name):
+                return
+            try:
+                content.seek(0)
+                super()._save(name, content)
+            except (OSError, ValueError):  # загруженный файл уже закрыт
+                log.exception("Could not restore %s deleted by a concurrent request", name)
+
+    def references(self, name: str) -> int:
+        """Количество записей в БД, которые ссылаются на файл (поля с db_index)."""
+        return sum(
+            model._base_manager.filter(**{field.name: name}).count()
+            for model, field in content_addressed_fields()
+        )
+
+    def delete(self, name: str) -> None:
+        """Удаляет файл с диска, только если на него больше никто не ссылается."""
+        if not name:
+            return
+        with self.locked(name):
+            if self.references(name) == 0:
+                super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def content_addressed_fields() -> Iterator[Tuple[Type[models.Model], models.FileField]]:
+    """Все файловые поля проекта, хранящиеся в ContentAddressedStorage."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                yield model, field
+
+
+def release_files(sender: Type[models.Model], instance: models.Model, **kwargs) -> None:
+    """
+    Обработчик post_delete: освобождает файлы удаленной записи.
+
+    Файл удаляется после коммита транзакции: при откате запись остается вместе с файлом,
+    а подсчет ссылок видит уже закоммиченное состояние БД.
+    """
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+            file = getattr(instance, field.attname)
+            if file:
+                transaction.on_commit(partial(field.storage.delete, file.name),
+                                      using=router.db_for_write(sender))
+
+
+def file_name(value) -> Optional[str]:
+    """Имя файла из значения поля: строки из БД, FieldFile или загруженного файла."""
+    return value if isinstance(value, str) else getattr(value, "name", None)
+
+
+def remember_files(sender: Type[models.Model], instance: models.Model, **kwargs) -> None:
+    """Обработчик post_init: запоминает файлы записи, чтобы release_replaced_files нашел замененные."""
+    instance._content_addressed_files = {
+        field.attname: instance.__dict__[field.attname]
+        for field in instance._meta.concrete_fields
+        if isinstance(field, models.FileField)
+        and isinstance(field.storage, ContentAddressedStorage)
+        and field.attname in instance.__dict__  # отложенные (only/defer) поля не загружены
+    }
+
+
+def release_replaced_files(sender: Type[models.Model], instance: models.Model,
+                           raw: bool = False, using: Optional[str] = None, update_fields=None, **kwargs) -> None:
+    """
+    Обработчик pre_save: освобождает прежний файл поля, замененного новым или очищенного.
+
+    Как и в release_files, файл удаляется после коммита и только если на него больше
+    никто не ссылается (в том числе та же запись, если загрузили тот же файл).
+    """
+    files = getattr(instance, "_content_addressed_files", None)
+    if raw or files is None:
+        return
+
+    for field in instance._meta.concrete_fields:
+        if field.attname not in files or (update_fields is not None and field.name not in update_fields):
+            continue
+        current = getattr(instance, field.attname)
+        old_name = file_name(files[field.attname])
+        if not instance._state.adding and old_name and old_name != current.name:
+            transaction.on_commit(partial(field.storage.delete, old_name), using=using)
+        files[field.attname] = current  # после сохранения поля его name - имя в хранилище
+
+
+def connect_release_files(app_config: AppConfig) -> None:
+    """Подключает release_files и release_replaced_files к моделям приложения с полями в ContentAddressedStorage."""
+    for model, _ in content_addressed_fields():
+        if model._meta.app_config is app_config:
+            label = model._meta.label
+            post_delete.connect(release_files, sender=model, dispatch_uid=f"release_files_{label}")
+            post_init.connect(remember_files, sender=model, dispatch_uid=f"remember_files_{label}")
+            pre_save.connect(release_replaced_files, sender=model, dispatch_uid=f"release_replaced_files_{label}")
+
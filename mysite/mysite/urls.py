@@ -21,6 +21,7 @@ from django.contrib.sitemaps.views import sitemap
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
+from .db import read_from_replica
 from .sitemaps import sitemaps
 
 
@@ -35,7 +36,7 @@ urlpatterns = [
     path("myauth/", include("myauth.urls")),
     path("shop/", include("shopapp.urls")),
     path("blog/", include("blogapp.urls")),
-    path("sitemap.xml/", sitemap, {"sitemaps": sitemaps}, name="django.contrib.sitemaps.views.sitemap"),
+    path("sitemap.xml/", read_from_replica(sitemap), {"sitemaps": sitemaps}, name="django.contrib.sitemaps.views.sitemap"),
 ]
 
 
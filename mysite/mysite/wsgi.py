@@ -3,6 +3,9 @@ WSGI config for mysite project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
+Production entry point (prefork gunicorn with gthread workers, see gunicorn.conf.py):
+    gunicorn -c gunicorn.conf.py
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
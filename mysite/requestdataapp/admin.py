@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ChunkedUpload
+
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = "id", "filename", "size", "status", "user", "created_at", "completed_at"
+    list_filter = "status",
+    search_fields = "filename",
+    list_select_related = "user",
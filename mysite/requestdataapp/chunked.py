@@ -0,0 +1,278 @@
+"""
+Возобновляемая загрузка больших файлов по частям.
+
+    1. init      - создается ChunkedUpload, файл <id>.part сразу выделяется нужного размера;
+    2. chunk     - каждая часть потоком пишется в файл по своему смещению,
+                   поэтому части можно отправлять параллельно и в любом порядке;
+    3. finalize  - проверяются части и SHA-256 всего файла, файл переносится на место (os.replace).
+
+Ни одна часть не буферизуется в памяти или во временном файле целиком.
+
+Запись частей и finalize согласуются блокировкой файла <id>.part (portalocker): часть пишется
+под разделяемой блокировкой, finalize проверяет и переносит файл под исключительной,
+поэтому часть не может изменить уже проверенный файл.
+
+Незавершенная загрузка истекает через CHUNKED_UPLOAD_EXPIRE_SECONDS после последней
+принятой части: clear_expired_uploads() (команда clear_chunked_uploads и проход после
+finalize) удаляет такие загрузки вместе с файлами <id>.part.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import portalocker
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import ChunkedUpload, ChunkedUploadPart
+
+
+DEFAULT_CHUNK_SIZE = getattr(settings, "CHUNKED_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+MAX_CHUNK_SIZE = getattr(settings, "CHUNKED_UPLOAD_MAX_CHUNK_SIZE", 64 * 1024 * 1024)
+MAX_UPLOAD_SIZE = getattr(settings, "CHUNKED_UPLOAD_MAX_SIZE", 20 * 1024 ** 3)
+MIN_CHUNK_SIZE = 64 * 1024
+
+# Размер блока, которым часть читается из запроса и пишется на диск
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Проход очистки после finalize - не чаще раза в CHUNKED_UPLOAD_CLEANUP_INTERVAL секунд на все процессы
+CLEANUP_LOCK_KEY = "requestdataapp:chunked:cleanup"
+
+log = logging.getLogger(__name__)
+
+
+class ChunkedUploadError(Exception):
+    """Ошибка загрузки, status - HTTP код ответа."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def part_path(upload: ChunkedUpload) -> Path:
+    """Файл, в который пишутся части до finalize."""
+    return Path(settings.MEDIA_ROOT) / "chunked" / f"{upload.id}.part"
+
+
+def expiry_date():
+    return timezone.now() + timedelta(seconds=getattr(settings, "CHUNKED_UPLOAD_EXPIRE_SECONDS", 24 * 60 * 60))
+
+
+def init_upload(user: User, filename: str, size: int,
+                sha256: str = "", chunk_size: Optional[int] = None) -> ChunkedUpload:
+    """Создает загрузку и файл-заготовку нужного размера."""
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    filename = get_valid_filename(os.path.basename(filename or ""))
+
+    if not filename:
+        raise ChunkedUploadError("filename is required")
+    if size <= 0:
+        raise ChunkedUploadError("size must be positive")
+    if size > MAX_UPLOAD_SIZE:
+        raise ChunkedUploadError(f"size exceeds {MAX_UPLOAD_SIZE} bytes", status=413)
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ChunkedUploadError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE}")
+
+    upload = ChunkedUpload.objects.create(user=user,
+                                          filename=filename,
+                                          size=size,
+                                          chunk_size=chunk_size,
+                                          sha256=(sha256 or "").lower(),
+                                          expires_at=expiry_date())
+
+    path = part_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as file:
+        file.truncate(size)  # разреженный файл, место занимают только записанные части
+
+    return upload
+
+
+def accepts_chunks(upload: ChunkedUpload) -> bool:
+    """Принимает ли загрузка части сейчас (статус в БД, а не в загруженном ранее объекте)."""
+    return ChunkedUpload.objects.filter(pk=upload.pk, status=ChunkedUpload.STATUS_UPLOADING).exists()
+
+
+def save_part(upload: ChunkedUpload, index: int, size: int, sha256: str) -> ChunkedUploadPart:
+    """Записывает принятую часть и продлевает срок загрузки."""
+    part, _ = ChunkedUploadPart.objects.update_or_create(upload=upload, index=index,
+                                                         defaults={"size": size, "sha256": sha256})
+    ChunkedUpload.objects.filter(pk=upload.pk).update(expires_at=expiry_date())
+    return part
+
+
+def write_chunk(upload: ChunkedUpload, offset: int, stream: BinaryIO, length: int,
+                sha256: str = "") -> ChunkedUploadPart:
+    """
+    Потоково пишет часть из stream в файл загрузки по смещению offset.
+
+    Повторная отправка той же части (после обрыва) перезаписывает ее.
+    """
+    if upload.status != ChunkedUpload.STATUS_UPLOADING:
+        raise ChunkedUploadError("upload is already finalized", status=409)
+    if offset < 0 or offset % upload.chunk_size or offset >= upload.size:
+        raise ChunkedUploadError(f"offset must be a multiple of chunk_size ({upload.chunk_size}) within the file")
+
+    index = offset // upload.chunk_size
+    expected = upload.chunk_length(index)
+    if length != expected:
+        raise ChunkedUploadError(f"chunk {index} must be {expected} bytes, got {length}")
+
+    try:
+        file = open(part_path(upload), "r+b")
+    except FileNotFoundError:  # файл уже перенесен finalize или удален очисткой
+        raise ChunkedUploadError("upload is already finalized or expired", status=409)
+
+    with file:  # закрытие файла снимает блокировку
+        # Разделяемая блокировка: части пишутся параллельно, finalize ждет их завершения.
+        # Статус перечитывается под блокировкой - finalize мог начаться после проверки выше
+        portalocker.lock(file, portalocker.LockFlags.SHARED)
+        if not accepts_chunks(upload):
+            raise ChunkedUploadError("upload is already finalized or expired", status=409)
+
+        digest = hashlib.sha256()
+        written = 0
+        file.seek(offset)
+        while written < length:
+            block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            file.write(block)
+            digest.update(block)
+            written += len(block)
+        file.flush()
+
+        checksum = digest.hexdigest()
+        if written != length or (sha256 and sha256.lower() != checksum):
+            # Область файла уже перезаписана: ранее принятая версия части больше не действительна
+            ChunkedUploadPart.objects.filter(upload=upload, index=index).delete()
+            if written != length:
+                raise ChunkedUploadError(f"chunk {index} is incomplete: {written} of {length} bytes received")
+            raise ChunkedUploadError(f"chunk {index} checksum mismatch", status=422)
+
+        part = save_part(upload, index, written, checksum)
+
+    return part
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_upload(upload: ChunkedUpload) -> ChunkedUpload:
+    """
+    Проверяет, что все части приняты и контрольная сумма совпадает,
+    и переносит файл в хранилище под именем files/<id>/<filename>.
+    """
+    # Атомарный переход статуса: параллельный finalize получит 409
+    locked = (ChunkedUpload.objects.
+              filter(pk=upload.pk, status=ChunkedUpload.STATUS_UPLOADING).
+              update(status=ChunkedUpload.STATUS_FINALIZING))
+    if not locked:
+        raise ChunkedUploadError("upload is already finalized", status=409)
+
+    source = part_path(upload)
+    file = None
+    try:
+        try:
+            file = open(source, "rb")
+            # Исключительная блокировка: дожидаемся частей, которые уже пишутся, новые получат 409
+            portalocker.lock(file, portalocker.LockFlags.EXCLUSIVE)
+
+            received = upload.parts.aggregate(count=Count("id"), size=Sum("size"))
+            if received["count"] != upload.chunks_count or received["size"] != upload.size:
+                missing = sorted(set(range(upload.chunks_count)) - set(upload.parts.values_list("index", flat=True)))
+                raise ChunkedUploadError(f"missing chunks: {missing}", status=409)
+
+            checksum = file_sha256(source)
+            if upload.sha256 and upload.sha256 != checksum:
+                raise ChunkedUploadError("file checksum mismatch", status=422)
+        except FileNotFoundError:
+            ChunkedUpload.objects.filter(pk=upload.pk).update(status=ChunkedUpload.STATUS_UPLOADING)
+            raise ChunkedUploadError("upload file is missing, the upload has expired", status=410)
+        except ChunkedUploadError:
+            ChunkedUpload.objects.filter(pk=upload.pk).update(status=ChunkedUpload.STATUS_UPLOADING)
+            raise
+
+        name = default_storage.get_available_name(f"files/{upload.id}/{upload.filename}")
+        target = Path(default_storage.path(name))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+    finally:
+        if file is not None:
+            file.close()
+
+    upload.file = name
+    upload.sha256 = checksum
+    upload.status = ChunkedUpload.STATUS_COMPLETE
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["file", "sha256", "status", "completed_at"])
+    upload.parts.all().delete()
+
+    clear_expired_periodically()
+    return upload
+
+
+def clear_expired_uploads() -> int:
+    """
+    Удаляет истекшие незавершенные загрузки и их файлы <id>.part.
+
+    Загрузка, в которую прямо сейчас пишется часть или которую завершает finalize
+    (файл заблокирован), пропускается до следующего прохода.
+
+    Returns:
+        int: кол-во удаленных загрузок
+    """
+    deleted = 0
+    expired = (ChunkedUpload.objects.
+               filter(expires_at__lt=timezone.now()).
+               exclude(status=ChunkedUpload.STATUS_COMPLETE).
+               values_list("pk", flat=True))
+
+    for upload_id in expired.iterator():
+        upload = ChunkedUpload(pk=upload_id)
+        path = part_path(upload)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            file = None
+
+        try:
+            if file is not None:
+                portalocker.lock(file, portalocker.LockFlags.EXCLUSIVE | portalocker.LockFlags.NON_BLOCKING)
+            # под блокировкой: срок мог продлиться принятой частью
+            removed, _ = (ChunkedUpload.objects.
+                          filter(pk=upload_id, expires_at__lt=timezone.now()).
+                          exclude(status=ChunkedUpload.STATUS_COMPLETE).
+                          delete())
+            if removed:
+                path.unlink(missing_ok=True)
+                deleted += 1
+        except portalocker.AlreadyLocked:
+            continue
+        finally:
+            if file is not None:
+                file.close()
+
+    return deleted
+
+
+def clear_expired_periodically() -> None:
+    """clear_expired_uploads() не чаще раза в CHUNKED_UPLOAD_CLEANUP_INTERVAL секунд на все процессы"""
+    interval = getattr(settings, "CHUNKED_UPLOAD_CLEANUP_INTERVAL", 60 * 60)
+    if cache.add(CLEANUP_LOCK_KEY, 1, timeout=interval):
+        deleted = clear_expired_uploads()
+        log.info("Deleted %s expired chunked uploads", deleted)
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from requestdataapp.chunked import clear_expired_uploads
+
+
+class Command(BaseCommand):
+    """
+    Удаляет истекшие незавершенные загрузки по частям и их файлы <id>.part.
+
+    Срок задает CHUNKED_UPLOAD_EXPIRE_SECONDS (от последней принятой части).
+    Запускается по расписанию, например из cron:
+
+        python manage.py clear_chunked_uploads
+    """
+    help = "Удаляет истекшие незавершенные загрузки по частям"
+
+    def handle(self, *args, **options):
+        deleted = clear_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired uploads"))
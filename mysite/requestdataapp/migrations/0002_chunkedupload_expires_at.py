@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 18:40
+
+from datetime import timedelta
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def extend_existing_uploads(apps, schema_editor):
+    """Незавершенные на момент миграции загрузки получают полный срок, а не истекают сразу"""
+    ChunkedUpload = apps.get_model("requestdataapp", "ChunkedUpload")
+    expires_at = django.utils.timezone.now() + timedelta(
+        seconds=getattr(settings, "CHUNKED_UPLOAD_EXPIRE_SECONDS", 24 * 60 * 60))
+    ChunkedUpload.objects.exclude(status="complete").update(expires_at=expires_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requestdataapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(extend_existing_uploads, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,67 @@
+import uuid
+
+from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
+
+
+class ChunkedUpload(models.Model):
+    """
+    Загрузка большого файла по частям (см. requestdataapp.chunked).
+
+    Части пишутся сразу в файл {MEDIA_ROOT}/chunked/<id>.part по своему смещению,
+    после finalize файл переносится в file без повторного копирования.
+    """
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "chunked upload"
+        verbose_name_plural = "chunked uploads"
+
+    STATUS_UPLOADING = "uploading"
+    STATUS_FINALIZING = "finalizing"
+    STATUS_COMPLETE = "complete"
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, "Uploading"),
+        (STATUS_FINALIZING, "Finalizing"),
+        (STATUS_COMPLETE, "Complete"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chunked_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # ожидаемая контрольная сумма всего файла
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    file = models.FileField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # незавершенная загрузка удаляется после этого момента, каждая принятая часть продлевает срок
+    expires_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"CHUNKED_UPLOAD(id={self.id} filename={self.filename!r} status={self.status})"
+
+    @property
+    def chunks_count(self) -> int:
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index: int) -> int:
+        """Ожидаемый размер части: все, кроме последней, равны chunk_size."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+class ChunkedUploadPart(models.Model):
+    """Принятая часть загрузки. Повторная отправка части перезаписывает строку."""
+
+    class Meta:
+        ordering = ["upload", "index"]
+        constraints = [
+            models.UniqueConstraint(fields=["upload", "index"], name="unique_chunked_upload_part"),
+        ]
 
-# Create your models here.
+    upload = models.ForeignKey(ChunkedUpload, on_delete=models.CASCADE, related_name="parts")
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
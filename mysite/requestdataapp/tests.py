@@ -1,3 +1,183 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import chunked
+from .chunked import MIN_CHUNK_SIZE, part_path, write_chunk
+from .models import ChunkedUpload
+
+
+class ChunkedUploadTestCase(TestCase):
+    """Класс тестирования загрузки файлов по частям"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Временная папка для медиа файлов и пользователь"""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+        cls.user = User.objects.create_user(username="ChunkedUploadUser", password="ChunkedUploadPassword")
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Удаление временной папки"""
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        self.content = os.urandom(MIN_CHUNK_SIZE * 3 + 1000)  # три полные части и хвост
+
+    def init(self, **extra) -> dict:
+        payload = {
+            "filename": "../orders export.csv",
+            "size": len(self.content),
+            "sha256": hashlib.sha256(self.content).hexdigest(),
+            "chunk_size": MIN_CHUNK_SIZE,
+            **extra,
+        }
+        response = self.client.post(reverse("requestdataapp:chunked_upload_init"), payload,
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, upload_id: str, index: int, data: bytes = None, **headers):
+        offset = index * MIN_CHUNK_SIZE
+        if data is None:
+            data = self.content[offset:offset + MIN_CHUNK_SIZE]
+        url = reverse("requestdataapp:chunked_upload_detail", kwargs={"upload_id": upload_id})
+        return self.client.put(f"{url}?offset={offset}", data,
+                               content_type="application/octet-stream", headers=headers)
+
+    def finalize(self, upload_id: str):
+        return self.client.post(reverse("requestdataapp:chunked_upload_finalize", kwargs={"upload_id": upload_id}))
+
+    def test_upload_in_any_order_and_finalize(self) -> None:
+        """Тест: части принимаются в любом порядке, итоговый файл совпадает с исходным"""
+        upload = self.init()
+        self.assertEqual(upload["chunks"], 4)
+        self.assertEqual(upload["filename"], "orders_export.csv")
+
+        for index in (3, 1, 0, 2):
+            chunk = self.content[index * MIN_CHUNK_SIZE:(index + 1) * MIN_CHUNK_SIZE]
+            response = self.put_chunk(upload["id"], index, X_Chunk_SHA256=hashlib.sha256(chunk).hexdigest())
+            self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.finalize(upload["id"])
+
+        self.assertEqual(response.status_code, 200, response.content)
+        saved = ChunkedUpload.objects.get(pk=upload["id"])
+        self.assertEqual(saved.status, ChunkedUpload.STATUS_COMPLETE)
+        with saved.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(part_path(saved).exists())
+        self.assertFalse(saved.parts.exists())
+
+    def test_resume_after_missing_chunk(self) -> None:
+        """Тест: finalize без всех частей возвращает 409, состояние показывает принятые части"""
+        upload = self.init()
+        self.put_chunk(upload["id"], 0)
+        self.put_chunk(upload["id"], 2)
+
+        response = self.finalize(upload["id"])
+        self.assertEqual(response.status_code, 409)
+
+        status = self.client.get(reverse("requestdataapp:chunked_upload_detail", kwargs={"upload_id": upload["id"]}))
+        self.assertEqual(status.json()["received"], [0, 2])
+
+        self.put_chunk(upload["id"], 1)
+        self.put_chunk(upload["id"], 3)
+        self.assertEqual(self.finalize(upload["id"]).status_code, 200)
+
+    def test_concurrent_chunks(self) -> None:
+        """Тест: части пишутся параллельно из разных потоков без порчи файла"""
+        upload = ChunkedUpload.objects.get(pk=self.init()["id"])
+
+        def send(index: int) -> None:
+            offset = index * MIN_CHUNK_SIZE
+            data = self.content[offset:offset + MIN_CHUNK_SIZE]
+            write_chunk(upload, offset, BytesIO(data), len(data))
+
+        # У потоков нет доступа к транзакции теста: запросы к БД из write_chunk подменяются
+        with mock.patch("requestdataapp.chunked.accepts_chunks", return_value=True), \
+                mock.patch("requestdataapp.chunked.save_part"):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(send, range(upload.chunks_count)))
+
+        with open(part_path(upload), "rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_checksum_mismatch(self) -> None:
+        """Тест: неверная контрольная сумма части и всего файла отклоняются"""
+        upload = self.init()
+
+        response = self.put_chunk(upload["id"], 0, X_Chunk_SHA256="0" * 64)
+        self.assertEqual(response.status_code, 422)
+
+        upload = self.init(sha256="f" * 64)
+        for index in range(4):
+            self.put_chunk(upload["id"], index)
+        response = self.finalize(upload["id"])
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload["id"]).status, ChunkedUpload.STATUS_UPLOADING)
+
+    def test_wrong_chunk_length_and_foreign_upload(self) -> None:
+        """Тест: часть неверного размера отклоняется, чужая загрузка недоступна"""
+        upload = self.init()
+
+        response = self.put_chunk(upload["id"], 0, data=b"short")
+        self.assertEqual(response.status_code, 400)
+
+        other = User.objects.create_user(username="ChunkedUploadOther", password="ChunkedUploadOther")
+        self.client.force_login(other)
+        self.assertEqual(self.put_chunk(upload["id"], 0).status_code, 404)
+
+    def test_chunk_rejected_after_finalize_started(self) -> None:
+        """Тест: часть, пришедшая во время finalize, не меняет проверяемый файл"""
+        upload = self.init()
+        for index in range(4):
+            self.put_chunk(upload["id"], index)
+
+        file_sha256 = chunked.file_sha256
+
+        def chunk_during_finalize(path):
+            # finalize держит исключительную блокировку: часть получает 409, а не пишется в файл
+            self.assertEqual(self.put_chunk(upload["id"], 0, data=bytes(MIN_CHUNK_SIZE)).status_code, 409)
+            return file_sha256(path)
+
+        with mock.patch.object(chunked, "file_sha256", chunk_during_finalize):
+            self.assertEqual(self.finalize(upload["id"]).status_code, 200)
+
+        with ChunkedUpload.objects.get(pk=upload["id"]).file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+    def test_clear_expired_uploads(self) -> None:
+        """Тест: истекшие незавершенные загрузки удаляются вместе с файлом .part, принятая часть продлевает срок"""
+        expired = ChunkedUpload.objects.get(pk=self.init()["id"])
+        active = ChunkedUpload.objects.get(pk=self.init()["id"])
+        ChunkedUpload.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.put_chunk(str(active.pk), 0)
+
+        out = StringIO()
+        call_command("clear_chunked_uploads", stdout=out)
+
+        self.assertIn("Deleted 1 expired uploads", out.getvalue())
+        self.assertFalse(ChunkedUpload.objects.filter(pk=expired.pk).exists())
+        self.assertFalse(part_path(expired).exists())
+        self.assertTrue(part_path(active).exists())
+        self.assertEqual(self.put_chunk(str(expired.pk), 0).status_code, 404)
@@ -1,6 +1,13 @@
 from django.urls import path
 
-from .views import request_get_view, user_form, handle_file_upload
+from .views import (
+    request_get_view,
+    user_form,
+    handle_file_upload,
+    chunked_upload_init,
+    chunked_upload_detail,
+    chunked_upload_finalize,
+)
 
 
 app_name = "requestdataapp"
@@ -10,4 +17,7 @@ urlpatterns = [
     path("get/", request_get_view, name="request_get_view"),
     path("bio/", user_form, name="user_form"),
     path("upload/", handle_file_upload, name="file_upload"),
+    path("upload/chunked/", chunked_upload_init, name="chunked_upload_init"),
+    path("upload/chunked/<uuid:upload_id>/", chunked_upload_detail, name="chunked_upload_detail"),
+    path("upload/chunked/<uuid:upload_id>/finalize/", chunked_upload_finalize, name="chunked_upload_finalize"),
 ]
@@ -1,11 +1,16 @@
+import json
+from functools import wraps
 from typing import Any, Dict
 
 from django.core.files.storage import FileSystemStorage
 from django.core.files.uploadedfile import UploadedFile
-from django.shortcuts import render
-from django.http import HttpResponse, HttpRequest
+from django.shortcuts import render, get_object_or_404
+from django.http import HttpResponse, HttpRequest, JsonResponse
+from django.views.decorators.http import require_POST, require_http_methods
 
+from .chunked import ChunkedUploadError, init_upload, write_chunk, finalize_upload
 from .forms import UserBioForm, UploadFileForm
+from .models import ChunkedUpload
 
 
 
@@ -67,4 +72,97 @@ def handle_file_upload(request: HttpRequest) -> HttpResponse:
 
     context["form"] = form if request.method == "POST" else UploadFileForm()
 
-    return render(request=request, template_name="requestdataapp/file-upload.html", context=context)
\ No newline at end of file
+    return render(request=request, template_name="requestdataapp/file-upload.html", context=context)
+
+
+def upload_as_json(upload: ChunkedUpload) -> Dict[str, Any]:
+    data = {
+        "id": str(upload.id),
+        "filename": upload.filename,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "chunks": upload.chunks_count,
+        "status": upload.status,
+        "sha256": upload.sha256,
+    }
+
+    if upload.status == ChunkedUpload.STATUS_COMPLETE:
+        data["url"] = upload.file.url
+    else:
+        data["received"] = list(upload.parts.values_list("index", flat=True))
+
+    return data
+
+
+def chunked_upload_view(view):
+    """Общая обработка для API загрузки по частям: авторизация, ошибки в JSON."""
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "authentication required"}, status=403)
+        try:
+            return view(request, *args, **kwargs)
+        except ChunkedUploadError as error:
+            return JsonResponse({"error": str(error)}, status=error.status)
+    return wrapper
+
+
+@require_POST
+@chunked_upload_view
+def chunked_upload_init(request: HttpRequest) -> HttpResponse:
+    """
+    Начало загрузки: {"filename": ..., "size": ..., "sha256": ..., "chunk_size": ...}.
+
+    sha256 и chunk_size необязательны. Ответ содержит id загрузки и размер части.
+    """
+    try:
+        payload = json.loads(request.body)
+        size = int(payload["size"])
+        chunk_size = int(payload["chunk_size"]) if payload.get("chunk_size") else None
+    except (ValueError, KeyError, TypeError):
+        raise ChunkedUploadError("expected JSON with filename and size")
+
+    upload = init_upload(user=request.user,
+                         filename=payload.get("filename", ""),
+                         size=size,
+                         sha256=payload.get("sha256", ""),
+                         chunk_size=chunk_size)
+
+    return JsonResponse(upload_as_json(upload), status=201)
+
+
+@require_http_methods(["GET", "PUT"])
+@chunked_upload_view
+def chunked_upload_detail(request: HttpRequest, upload_id) -> HttpResponse:
+    """
+    GET - состояние загрузки и список принятых частей (для возобновления).
+    PUT ?offset=N - тело запроса пишется как часть по смещению N,
+    заголовок X-Chunk-SHA256 (необязательный) проверяется после записи.
+    """
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, user=request.user)
+
+    if request.method == "GET":
+        return JsonResponse(upload_as_json(upload))
+
+    try:
+        offset = int(request.GET["offset"])
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except (KeyError, ValueError):
+        raise ChunkedUploadError("offset query parameter and Content-Length are required")
+
+    part = write_chunk(upload=upload,
+                       offset=offset,
+                       stream=request,
+                       length=length,
+                       sha256=request.headers.get("X-Chunk-SHA256", ""))
+
+    return JsonResponse({"index": part.index, "size": part.size, "sha256": part.sha256})
+
+
+@require_POST
+@chunked_upload_view
+def chunked_upload_finalize(request: HttpRequest, upload_id) -> HttpResponse:
+    """Проверка всех частей и контрольной суммы, перенос файла на место."""
+    upload = get_object_or_404(ChunkedUpload, pk=upload_id, user=request.user)
+    upload = finalize_upload(upload)
+    return JsonResponse(upload_as_json(upload))
@@ -1,24 +1,93 @@
+from typing import Optional
+
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ALL_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR
 from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect
 from django.urls import path
 
-from .admin_mixins import ExportAsCSVMixin, ExportAsExcelMixin
-from .common import save_csv_products, save_csv_orders
-from .models import Product, ProductImage, Order
+from mysite.db import EstimatedCountPaginator
+from .admin_mixins import ExportAsCSVMixin, ExportAsExcelMixin, ImportCSVMixin
+from .bulk import BULK_ACTIONS, create_job, schedule_job, unfinished_jobs
+from .common import CSVImportError, save_csv_products, save_csv_orders
+from .models import BulkJob, Product, ProductImage, Order
 from .forms import CSVImportForm, CSVOrdersImportForm
-
-
-@admin.action(description="Archive products")
-def mark_archived(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    """Пометить продукт как архивированный"""
-    queryset.update(archived=True)
-
-@admin.action(description="Unarchive products")
-def mark_unarchived(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    """Пометить продукт как не архивированный"""
-    queryset.update(archived=False)
+from .thumbnails import schedule_thumbnails
+
+
+def select_across_filters(model_admin: admin.ModelAdmin, request: HttpRequest) -> Optional[dict]:
+    """
+    "Выбрать все" в списке админки как BulkJob.filters: поиск списка или все объекты.
+
+    None - в списке есть другие фильтры, тогда выборка сохраняется списком pk.
+    """
+    if any(key not in (SEARCH_VAR, ORDER_VAR, PAGE_VAR, ALL_VAR) for key in request.GET):
+        return None
+
+    term = request.GET.get(SEARCH_VAR, "").strip()
+    if not term:
+        return {}
+    return {"search": {"term": term, "fields": list(model_admin.get_search_fields(request))}}
+
+
+def bulk_admin_action(name: str):
+    """
+    Action админки, запускающий массовое действие shopapp.bulk пачками в фоне.
+
+    Для действий с параметрами сначала показывается промежуточная форма.
+    """
+
+    bulk_action = BULK_ACTIONS[name]
+
+    def start_bulk_action(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
+        form = None
+        if bulk_action.form_class is not None:
+            form = bulk_action.form_class(request.POST if "apply" in request.POST else None)
+            if not form.is_valid():
+                context = {
+                    **model_admin.admin_site.each_context(request),
+                    "title": bulk_action.description,
+                    "form": form,
+                    "action": request.POST["action"],
+                    "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+                    "select_across": request.POST.get("select_across", "0"),
+                    "count": queryset.count(),
+                    "opts": model_admin.model._meta,
+                }
+                return render(request, "admin/bulk_action_form.html", context)
+
+        params = form.cleaned_data if form else None
+        filters = None
+        if request.POST.get("select_across") == "1":
+            filters = select_across_filters(model_admin, request)
+
+        if filters is not None:
+            job = create_job(name, filters=filters, params=params, user=request.user)
+        else:
+            job = create_job(name, queryset=queryset, params=params, user=request.user)
+        schedule_job(job)
+        model_admin.message_user(request, f"{bulk_action.description}: job #{job.pk} started for {job.total} products")
+
+    start_bulk_action.__name__ = f"bulk_{name}"
+    return admin.action(description=bulk_action.description)(start_bulk_action)
+
+
+# Пачками в коротких транзакциях, без одного UPDATE по всей выборке
+mark_archived = bulk_admin_action("archive")
+mark_unarchived = bulk_admin_action("unarchive")
+change_price = bulk_admin_action("change_price")
+set_discount = bulk_admin_action("set_discount")
+
+
+@admin.action(description="Resume jobs")
+def resume_jobs(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
+    """Продолжить прерванные задания с последнего обработанного продукта"""
+    jobs = list(queryset.filter(pk__in=unfinished_jobs().values("pk")))
+    for job in jobs:
+        schedule_job(job)
+    model_admin.message_user(request, f"Resumed {len(jobs)} jobs")
 
 
 class ProductImagesInline(admin.StackedInline):
@@ -31,11 +100,13 @@ class OrderInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(ExportAsCSVMixin, ExportAsExcelMixin, admin.ModelAdmin):
+class ProductAdmin(ExportAsCSVMixin, ExportAsExcelMixin, ImportCSVMixin, admin.ModelAdmin):
     change_list_template = "shopapp/products_changelist.html"
     actions = [
         mark_archived,
         mark_unarchived,
+        change_price,
+        set_discount,
         "export_csv",
         "export_excel"
     ]
@@ -43,8 +114,13 @@ class ProductAdmin(ExportAsCSVMixin, ExportAsExcelMixin, admin.ModelAdmin):
         OrderInline,
         ProductImagesInline
     ]
-    list_display = "pk", "name", "description_short", "price", "discount", "archived", "created_by"
+    list_display = "pk", "name", "description_short", "price", "discount", "final_price", "archived", "created_by"
     list_display_links = "pk", "name"
+    list_select_related = "created_by",
+    # без COUNT(*) всей таблицы на каждой странице
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     ordering = "pk", "name"
     search_fields = "name", "description"
     fieldsets = [
@@ -65,6 +141,11 @@ class ProductAdmin(ExportAsCSVMixin, ExportAsExcelMixin, admin.ModelAdmin):
              "fields": ("preview",)})
     ]
 
+    def save_related(self, request, form, formsets, change):
+        """После сохранения галереи ставим в очередь генерацию миниатюр"""
+        super().save_related(request, form, formsets, change)
+        schedule_thumbnails(form.instance.pk)
+
     def import_csv(self, request: HttpRequest) -> HttpResponse:
         if request.method == "GET":
 
@@ -74,17 +155,21 @@ class ProductAdmin(ExportAsCSVMixin, ExportAsExcelMixin, admin.ModelAdmin):
             }
 
             return render(request=request, template_name="admin/csv_form.html", context=context)
-        form = CSVImportForm(request.POST, request.FILES)
+        form = self.bind_csv_form(CSVImportForm, request)
 
         if not form.is_valid():
             context = {
                 "form" : form
             }
-            return render(request, "admin/csv_form.html", status=400)
+            return render(request, "admin/csv_form.html", context=context, status=400)
 
-        save_csv_products(file=form)
+        try:
+            summary = save_csv_products(file=form)
+        except CSVImportError as e:
+            form.add_error("csv_file", str(e))
+            return render(request, "admin/csv_form.html", context={"form": form}, status=400)
 
-        self.message_user(request, f"Imported products from CSV")
+        self.message_user(request, f"Imported {summary['created']} products from CSV, failed rows: {summary['failed']}")
         return redirect("..")
 
 
@@ -92,7 +177,7 @@ class ProductAdmin(ExportAsCSVMixin, ExportAsExcelMixin, admin.ModelAdmin):
         urls = super().get_urls()
         new_urls = [
             path(
-                "import-products-csv/", self.import_csv, name="import_products_csv"
+                "import-products-csv/", self.csv_import_view(self.import_csv), name="import_products_csv"
             )
         ]
         return new_urls + urls
@@ -111,14 +196,15 @@ class ProductInline(admin.TabularInline):
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ImportCSVMixin, admin.ModelAdmin):
     inlines = [
         ProductInline
     ]
     list_display = "id", "delivery_adress", "promocode", "created_at", "user_verbose"
-
-    def get_queryset(self, request):
-        return Order.objects.select_related("user").prefetch_related("products")
+    list_select_related = "user",  # продукты в списке не выводятся, prefetch не нужен
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
     def user_verbose(self, obj: Order):
         return obj.user.first_name or obj.user.username
@@ -133,14 +219,14 @@ class OrderAdmin(admin.ModelAdmin):
             form = CSVOrdersImportForm()
             return render(request, "admin/csv_orders_form.html", {"form": form})
 
-        form = CSVOrdersImportForm(request.POST, request.FILES)
+        form = self.bind_csv_form(CSVOrdersImportForm, request)
 
         if not form.is_valid():
             return render(request, "admin/csv_orders_form.html", {"form": form}, status=400)
 
         try:
-            orders = save_csv_orders(file=form)
-            self.message_user(request, f"Successfully imported {len(orders)} orders")
+            summary = save_csv_orders(file=form)
+            self.message_user(request, f"Successfully imported {summary['created']} orders")
         except Exception as e:
             self.message_user(request, f"Import failed: {str(e)}", level="error")
 
@@ -151,10 +237,25 @@ class OrderAdmin(admin.ModelAdmin):
         new_urls = [
             path(
                 "import-orders-csv/",
-                self.import_csv,
+                self.csv_import_view(self.import_csv),
                 name="import_orders_csv"
             ),
         ]
         return new_urls + urls
 
 
+@admin.register(BulkJob)
+class BulkJobAdmin(admin.ModelAdmin):
+    actions = [resume_jobs]
+    list_display = "pk", "action", "status", "progress_verbose", "created_by", "created_at", "updated_at"
+    list_filter = "status", "action"
+    list_select_related = "created_by",
+    readonly_fields = [field.name for field in BulkJob._meta.fields if field.name != "ids"]
+    exclude = "ids",  # может содержать миллионы pk
+
+    def has_add_permission(self, request: HttpRequest) -> bool:
+        return False
+
+    def progress_verbose(self, obj: BulkJob) -> str:
+        return f"{obj.processed}/{obj.total} ({obj.progress}%)"
+    progress_verbose.short_description = "Progress"
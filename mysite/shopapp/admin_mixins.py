@@ -1,12 +1,17 @@
 import datetime
 import csv
+from functools import wraps
 
 import openpyxl
 from openpyxl.styles import Font, Alignment
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 from django.db.models import QuerySet
 from django.db.models.options import Options
 from django.http import HttpRequest, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .uploadhandlers import check_csrf_before_body, install_csv_import_handler
 
 
 from django.contrib import admin
@@ -76,3 +81,38 @@ class ExportAsExcelMixin:
 
         workbook.save(response)
         return response
+
+
+class ImportCSVMixin:
+    """
+    Потоковый импорт CSV в админке.
+
+    Строки сохраняются пачками еще во время чтения тела запроса, поэтому
+    право на добавление и CSRF (токен из action формы) проверяются до установки обработчика.
+    """
+
+    def csv_import_view(self: admin.ModelAdmin, view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            if request.method == "POST":
+                if not self.has_add_permission(request):
+                    raise PermissionDenied
+                csrf_failure = check_csrf_before_body(request)
+                if csrf_failure is not None:
+                    return csrf_failure
+                request.csv_import_handler = install_csv_import_handler(request, self.model)
+            return view(request, *args, **kwargs)
+
+        return self.admin_site.admin_view(wrapper)
+
+    @staticmethod
+    def bind_csv_form(form_class, request: HttpRequest):
+        """Форма импорта с ошибкой обработчика загрузки вместо "обязательное поле"."""
+        form = form_class(request.POST, request.FILES)
+        form.is_valid()
+
+        error = request.csv_import_handler.error
+        if error:
+            form.errors["csv_file"] = form.error_class([error])
+        return form
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, pre_delete
 
 
 class ShopappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopapp'
+
+    def ready(self):
+        from .models import Order
+        from .recommendations import order_deleted, order_products_changed
+        from mysite.storage import connect_release_files
+
+        # Файлы в контентно-адресуемом хранилище удаляются вместе с последней ссылкой на них
+        connect_release_files(self)
+
+        # Изменения состава заказов обновляют "часто покупают вместе" для их продуктов
+        m2m_changed.connect(order_products_changed, sender=Order.products.through, dispatch_uid="order_products_changed")
+        pre_delete.connect(order_deleted, sender=Order, dispatch_uid="order_deleted_recommendations")
@@ -0,0 +1,238 @@
+"""
+Массовые действия над продуктами пачками.
+
+Вместо одного UPDATE по всей выборке (на SQLite это блокировка записи всей
+базы на все время) выбранные pk обрабатываются пачками по BULK_ACTION_CHUNK_SIZE,
+каждая пачка - отдельная короткая транзакция вместе с сохранением прогресса
+в BulkJob. Между пачками другие запросы успевают записать свои данные.
+
+Явно отмеченные pk хранятся в задании списком, а "выбрать все" из админки и
+--filter команды - условием выборки (filters), без списка из миллионов pk.
+
+Прерванное задание (рестарт процесса, ошибка) продолжается с последнего
+обработанного pk: из админки действием "Resume" или командой bulk_actions resume.
+"""
+import logging
+import operator
+from bisect import bisect_right
+from functools import reduce
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Type
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.db.models import DecimalField, F, Q, QuerySet, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+from django.utils.text import smart_split, unescape_string_literal
+
+from .forms import DiscountForm, PriceChangeForm
+from .models import BulkJob, Product
+
+log = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = getattr(settings, "BULK_ACTION_CHUNK_SIZE", 500)
+
+# Задание в статусе running без прогресса дольше этого считается прерванным
+STALE_AFTER = timedelta(seconds=getattr(settings, "BULK_ACTION_STALE_SECONDS", 60))
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-actions")
+
+
+class BulkAction:
+    """Действие над пачкой: apply(queryset, **params) для queryset из pk пачки."""
+
+    def __init__(self, name: str, description: str, model: Type[models.Model],
+                 apply: Callable[..., int], form_class: Optional[Type[forms.Form]] = None):
+        self.name = name
+        self.description = description
+        self.model = model
+        self.apply = apply
+        self.form_class = form_class
+
+    def clean_params(self, data: Optional[dict]) -> dict:
+        """Проверка параметров формой действия, значения приводятся к JSON (Decimal -> str)"""
+        if self.form_class is None:
+            return {}
+
+        form = self.form_class(data or {})
+        if not form.is_valid():
+            raise forms.ValidationError(form.errors.as_text())
+        return {name: str(value) if isinstance(value, Decimal) else value
+                for name, value in form.cleaned_data.items()}
+
+
+BULK_ACTIONS: Dict[str, BulkAction] = {}
+
+
+def register_bulk_action(name: str, description: str, model: Type[models.Model],
+                         form_class: Optional[Type[forms.Form]] = None):
+    """Декоратор: регистрирует функцию apply(queryset, **params) как массовое действие name"""
+
+    def decorator(apply: Callable[..., int]) -> Callable[..., int]:
+        BULK_ACTIONS[name] = BulkAction(name, description, model, apply, form_class)
+        return apply
+
+    return decorator
+
+
+@register_bulk_action("archive", "Archive products", Product)
+def archive_products(queryset: QuerySet) -> int:
+    return queryset.update(archived=True)
+
+
+@register_bulk_action("unarchive", "Unarchive products", Product)
+def unarchive_products(queryset: QuerySet) -> int:
+    return queryset.update(archived=False)
+
+
+@register_bulk_action("change_price", "Change prices by percent", Product, form_class=PriceChangeForm)
+def change_prices(queryset: QuerySet, percent: str) -> int:
+    factor = Value(1 + Decimal(percent) / 100, output_field=DecimalField(max_digits=12, decimal_places=6))
+    return queryset.update(price=Round(F("price") * factor, 2))
+
+
+@register_bulk_action("set_discount", "Set discount", Product, form_class=DiscountForm)
+def set_discount(queryset: QuerySet, discount: int) -> int:
+    return queryset.update(discount=discount)
+
+
+def filtered_queryset(model: Type[models.Model], filters: dict) -> QuerySet:
+    """
+    Выборка по filters: lookups модели и необязательный search - поиск как в списке админки.
+
+    search = {"term": строка поиска, "fields": поля}: каждое слово должно встретиться
+    (icontains) хотя бы в одном из полей.
+    """
+    filters = dict(filters)
+    search = filters.pop("search", None)
+    queryset = model._default_manager.filter(**filters)
+    if search:
+        for word in smart_split(search["term"]):
+            if word[0] in "\"'" and word[0] == word[-1]:
+                word = unescape_string_literal(word)
+            queryset = queryset.filter(reduce(operator.or_, (Q(**{f"{field}__icontains": word})
+                                                             for field in search["fields"])))
+    return queryset
+
+
+def create_job(action_name: str, queryset: Optional[QuerySet] = None, filters: Optional[dict] = None,
+               params: Optional[dict] = None, user: Optional[User] = None) -> BulkJob:
+    """
+    Задание для выборки: queryset явно выбранных объектов (pk сохраняются списком)
+    или filters модели действия (см. filtered_queryset, pk не сохраняются).
+
+    Params проверяются формой действия (forms.ValidationError).
+    """
+    action = BULK_ACTIONS[action_name]
+    params = action.clean_params(params)
+
+    if queryset is not None:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+        total, filters = len(ids), {}
+    else:
+        ids, filters = None, filters or {}
+        total = filtered_queryset(action.model, filters).count()
+
+    return BulkJob.objects.create(action=action_name, params=params, ids=ids, filters=filters,
+                                  total=total, created_by=user)
+
+
+def next_chunk(job: BulkJob, action: BulkAction, size: int) -> List[int]:
+    """Следующие size pk после job.last_id"""
+    if job.ids is not None:
+        start = bisect_right(job.ids, job.last_id)
+        return job.ids[start:start + size]
+
+    return list(filtered_queryset(action.model, job.filters).
+                filter(pk__gt=job.last_id).
+                order_by("pk").
+                values_list("pk", flat=True)[:size])
+
+
+def claim_job(job: BulkJob) -> bool:
+    """Переводит задание в running, если его не выполняет другой процесс"""
+    now = timezone.now()
+    claimed = (BulkJob.objects.
+               filter(pk=job.pk).
+               exclude(status=BulkJob.STATUS_DONE).
+               filter(~Q(status=BulkJob.STATUS_RUNNING) | Q(updated_at__lt=now - STALE_AFTER)).
+               update(status=BulkJob.STATUS_RUNNING, error="", updated_at=now))
+    if claimed:
+        job.status = BulkJob.STATUS_RUNNING
+    return bool(claimed)
+
+
+def run_job(job: BulkJob, chunk_size: int = CHUNK_SIZE,
+            progress: Optional[Callable[[BulkJob], None]] = None) -> BulkJob:
+    """
+    Выполняет (или продолжает) задание пачками.
+
+    Каждая пачка и прогресс сохраняются в одной транзакции, так что после
+    прерывания ни одна пачка не выполнится дважды. progress вызывается после каждой пачки.
+    """
+    if not claim_job(job):
+        log.info("Bulk job %s is already running or done", job.pk)
+        return job
+
+    action = BULK_ACTIONS[job.action]
+    try:
+        while True:
+            ids = next_chunk(job, action, chunk_size)
+            if not ids:
+                break
+
+            with transaction.atomic():
+                action.apply(action.model._default_manager.filter(pk__in=ids), **job.params)
+                BulkJob.objects.filter(pk=job.pk).update(processed=F("processed") + len(ids),
+                                                         last_id=ids[-1],
+                                                         updated_at=timezone.now())
+            job.processed += len(ids)
+            job.last_id = ids[-1]
+            if progress is not None:
+                progress(job)
+    except Exception as e:
+        BulkJob.objects.filter(pk=job.pk).update(status=BulkJob.STATUS_FAILED, error=str(e))
+        job.status, job.error = BulkJob.STATUS_FAILED, str(e)
+        raise
+
+    BulkJob.objects.filter(pk=job.pk).update(status=BulkJob.STATUS_DONE, updated_at=timezone.now())
+    job.status = BulkJob.STATUS_DONE
+    return job
+
+
+def _run_in_background(job_id: int) -> None:
+    """Задача пула: у потока свое соединение с БД, закрываем его по завершении."""
+    try:
+        job = run_job(BulkJob.objects.get(pk=job_id))
+        log.info("Bulk job %s finished: %s/%s", job_id, job.processed, job.total)
+    except Exception:
+        log.exception("Bulk job %s failed", job_id)
+    finally:
+        connection.close()
+
+
+def schedule_job(job: BulkJob) -> None:
+    """
+    Запускает задание в фоновом потоке после коммита текущей транзакции.
+
+    При BULK_ACTIONS_ASYNC = False выполняет сразу (тесты, команды).
+    """
+    if not getattr(settings, "BULK_ACTIONS_ASYNC", True):
+        run_job(job)
+        return
+
+    transaction.on_commit(lambda: _executor.submit(_run_in_background, job.pk))
+
+
+def unfinished_jobs() -> QuerySet:
+    """Задания, которые можно продолжить: ожидающие, упавшие и зависшие в running"""
+    return (BulkJob.objects.
+            exclude(status=BulkJob.STATUS_DONE).
+            filter(~Q(status=BulkJob.STATUS_RUNNING) | Q(updated_at__lt=timezone.now() - STALE_AFTER)).
+            order_by("pk"))
@@ -1,55 +1,175 @@
-from csv import DictReader
-from io import TextIOWrapper
+import codecs
+import logging
+from csv import reader as csv_reader
+from typing import Dict, List, Optional, Type
+
+from django.core.files.uploadedfile import UploadedFile
+from django.db import models, transaction
 
 from shopapp.models import Product, Order
 
+log = logging.getLogger(__name__)
 
-def save_csv_products(file):
-    csv_file = TextIOWrapper(
-        file.cleaned_data["csv_file"].file,
-        encoding="utf-8"  #  Фиксированная кодировка
-    )
-    reader = DictReader(csv_file)
-    # Собираем продукты
-    products = []
-    for row in reader:
-        # Пропускаем пустые строки
-        if row and any(row.values()):
-            products.append(Product(**row))
 
-    imported_count = 0
-    for product in products:
-        try:
-            product.save()  # Сохраняем по одному
-            imported_count += 1
-        except Exception as e:
-            print(f"Error saving product: {e}")
-            continue
+class CSVImportError(Exception):
+    """CSV файл не подходит для импорта (кодировка, заголовки)."""
 
-    return products
 
-def save_csv_orders(file):
-    csv_file = TextIOWrapper(
-        file.cleaned_data["csv_file"].file,
-        encoding="utf-8"  #  Фиксированная кодировка
-    )
-    reader = DictReader(csv_file)
-    # Собираем продукты
-    orders = []
-    for row in reader:
+class CSVImporter:
+    """
+    Инкрементальный импорт CSV в модель.
+
+    Текст подается кусками через feed() по мере получения файла: первая строка
+    проверяется как заголовок, дальше строки сохраняются пачками по batch_size,
+    каждая пачка - в своей короткой транзакции. Сохраненные объекты не копятся:
+    считаются только созданные и ошибочные строки и первые max_errors ошибок.
+    Колонки - поля модели (для внешних ключей - user_id или user), колонка id игнорируется.
+    """
+    batch_size = 500
+    max_errors = 10
+    max_header_length = 64 * 1024
+
+    def __init__(self, model: Type[models.Model]):
+        self.model = model
+        self.columns = self.model_columns(model)
+        self.required = {
+            field.attname for field in model._meta.concrete_fields
+            if not (field.primary_key or field.has_default() or field.null or field.blank)
+        }
+        self.header: Optional[List[str]] = None
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self._buffer = ""
+        self._record = ""
+        self._batch: List[models.Model] = []
+
+    @staticmethod
+    def model_columns(model: Type[models.Model]) -> Dict[str, Optional[str]]:
+        """Допустимые колонки CSV -> атрибут модели (None - колонка пропускается)."""
+        columns: Dict[str, Optional[str]] = {}
+        for field in model._meta.concrete_fields:
+            columns[field.name] = columns[field.attname] = None if field.primary_key else field.attname
+        return columns
+
+    def set_header(self, header: List[str]) -> None:
+        header = [column.strip() for column in header]
+        unknown = [column for column in header if column not in self.columns]
+        if unknown:
+            raise CSVImportError(f"Unknown columns for {self.model.__name__}: {', '.join(unknown)}")
+
+        attnames = [self.columns[column] for column in header]
+        missing = self.required - set(attnames)
+        if missing:
+            raise CSVImportError(f"Missing required columns: {', '.join(sorted(missing))}")
+
+        self.header = attnames
+
+    def feed(self, text: str) -> None:
+        """Принимает очередной кусок текста и обрабатывает все полные строки."""
+        self._buffer += text
+        if self.header is None and "\n" not in self._buffer and len(self._buffer) > self.max_header_length:
+            raise CSVImportError("CSV header line is too long")
+
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._add_line(line + "\n")
+
+    def close(self) -> Dict[str, object]:
+        """Дописывает последнюю строку и оставшуюся пачку, возвращает итог импорта."""
+        if self._buffer:
+            self._add_line(self._buffer)
+            self._buffer = ""
+        if self._record:
+            self._add_record(self._record)  # незакрытая кавычка в конце файла
+            self._record = ""
+        if self.header is None:
+            raise CSVImportError("CSV file is empty")
+
+        self.flush()
+        return self.summary()
+
+    def summary(self) -> Dict[str, object]:
+        """Итог импорта: счетчики и первые ошибки."""
+        return {"created": self.created, "failed": self.failed, "errors": self.errors}
+
+    def _add_line(self, line: str) -> None:
+        # Строка в кавычках может содержать переводы строк: копим, пока кавычки не сбалансированы
+        self._record += line
+        if self._record.count('"') % 2 == 0:
+            record, self._record = self._record, ""
+            self._add_record(record)
+
+    def _add_record(self, record: str) -> None:
+        values = next(csv_reader([record]), [])
+
+        if self.header is None:
+            self.set_header(values)
+            return
+
         # Пропускаем пустые строки
-        if row and any(row.values()):
-            orders.append(Order(**row))
+        if not any(values):
+            return
+
+        row = {attname: value for attname, value in zip(self.header, values) if attname}
+        self.rows += 1
+        self._batch.append(self.model(**row))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Сохраняет накопленную пачку одним INSERT, при ошибке - построчно."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
 
-    imported_count = 0
-    for order in orders:
         try:
-            order.save()  # Сохраняем по одному
-            imported_count += 1
+            with transaction.atomic():
+                self.model.objects.bulk_create(batch)
+            self.created += len(batch)
+            return
         except Exception as e:
-            print(f"Error saving product: {e}")
-            continue
+            log.warning("Bulk import of %s failed, saving rows one by one: %s", self.model.__name__, e)
+
+        first_row = self.rows - len(batch) + 1
+        for row, obj in enumerate(batch, first_row):
+            try:
+                with transaction.atomic():
+                    obj.save()  # Сохраняем по одному
+                self.created += 1
+            except Exception as e:
+                self.failed += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append(f"Row {row}: {e}")
+                log.warning("Error saving %s: %s", self.model.__name__, e)
 
-    return orders
 
+def import_csv_file(uploaded_file: UploadedFile, model: Type[models.Model]) -> Dict[str, object]:
+    """
+    Импорт уже полученного файла, возвращает итог импорта (см. CSVImporter.summary).
 
+    Если файл принят CSVImportUploadHandler, строки уже сохранены во время загрузки.
+    """
+    importer = getattr(uploaded_file, "importer", None)
+    if importer is not None:
+        return importer.summary()
+
+    importer = CSVImporter(model)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()  # Фиксированная кодировка
+    try:
+        for chunk in uploaded_file.chunks():
+            importer.feed(decoder.decode(chunk))
+        importer.feed(decoder.decode(b"", final=True))
+    except UnicodeDecodeError:
+        raise CSVImportError("CSV file must be UTF-8 encoded")
+
+    return importer.close()
+
+
+def save_csv_products(file):
+    return import_csv_file(file.cleaned_data["csv_file"], Product)
+
+
+def save_csv_orders(file):
+    return import_csv_file(file.cleaned_data["csv_file"], Order)
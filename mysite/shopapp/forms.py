@@ -14,10 +14,24 @@ class MultipleImageField(forms.ImageField):
 
     def clean(self, data, initial=None):
         single_file_clean = super().clean
-        if isinstance(data, (list, tuple)):
-            result = [single_file_clean(d, initial) for d in data]
-        else:
-            result = single_file_clean(data, initial)
+        if not isinstance(data, (list, tuple)):
+            return single_file_clean(data, initial)
+
+        # Проверяем все файлы и возвращаем ошибки по каждому, а не только по первому
+        result, errors = [], []
+        for file in data:
+            try:
+                result.append(single_file_clean(file, initial))
+            except forms.ValidationError as error:
+                errors.extend(
+                    forms.ValidationError("%(name)s: %(error)s",
+                                          code=getattr(error, "code", None),
+                                          params={"name": getattr(file, "name", file), "error": message})
+                    for message in error.messages
+                )
+
+        if errors:
+            raise forms.ValidationError(errors)
         return result
 
 
@@ -180,4 +194,15 @@ class CSVImportForm(forms.Form):
 # forms.py - добавь новую форму
 class CSVOrdersImportForm(forms.Form):
     """Форма загрузки данных заказов через CSV"""
-    csv_file = forms.FileField(label="CSV файл с заказами")
\ No newline at end of file
+    csv_file = forms.FileField(label="CSV файл с заказами")
+
+
+class PriceChangeForm(forms.Form):
+    """Параметры массового изменения цен (shopapp.bulk)"""
+    percent = forms.DecimalField(min_value=-99, max_value=1000, max_digits=6, decimal_places=2,
+                                 help_text="Изменение цены в процентах, например 10 или -15")
+
+
+class DiscountForm(forms.Form):
+    """Параметры массовой установки скидки (shopapp.bulk)"""
+    discount = forms.IntegerField(min_value=0, max_value=100)
@@ -0,0 +1,88 @@
+"""
+Пакетная загрузка изображений галереи продукта.
+
+Файлы пишутся в хранилище параллельно в пуле потоков,
+после чего все строки ProductImage вставляются одним bulk_create.
+Если транзакция со строками откатилась, вызывающий код освобождает
+записанные файлы через release_images и новое превью через release_preview.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+
+from .models import Product, ProductImage
+
+log = logging.getLogger(__name__)
+
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, "IMAGE_UPLOAD_WORKERS", 8),
+                               thread_name_prefix="image-upload")
+
+
+def store_image(product: Product, upload: UploadedFile) -> str:
+    """Сохраняет один файл в хранилище поля ProductImage.image и возвращает имя файла."""
+    field = ProductImage._meta.get_field("image")
+    instance = ProductImage(product=product)
+    name = field.generate_filename(instance, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length)
+
+
+def ingest_product_images(product: Product,
+                          uploads: Sequence[UploadedFile]) -> Tuple[List[ProductImage], List[ValidationError]]:
+    """
+    Сохраняет загруженные изображения галереи продукта.
+
+    Запись файлов идет параллельно, строки в БД вставляются одним запросом.
+    Ошибка записи одного файла не прерывает остальные.
+
+    Returns:
+        Tuple: созданные ProductImage и ошибки по отдельным файлам
+    """
+    if not uploads:
+        return [], []
+
+    futures = [(upload, _executor.submit(store_image, product, upload)) for upload in uploads]
+
+    images, errors = [], []
+    for upload, future in futures:
+        try:
+            name = future.result()
+        except OSError as exc:
+            log.exception("Failed to store image %s for product %s", upload.name, product.pk)
+            errors.append(ValidationError("%(name)s: не удалось сохранить файл (%(error)s)",
+                                          code="storage",
+                                          params={"name": upload.name, "error": exc.strerror or exc}))
+            continue
+
+        images.append(ProductImage(product=product, image=name))
+
+    ProductImage.objects.bulk_create(images)
+
+    return images, errors
+
+
+def release_images(images: Sequence[ProductImage]) -> None:
+    """
+    Освобождает файлы изображений, строки которых не сохранились (транзакция откатилась).
+
+    Вызывается после выхода из транзакции: ContentAddressedStorage удаляет файл,
+    только если на него не ссылается ни одна запись, поэтому файл, загруженный
+    также для другого продукта, останется.
+    """
+    for image in images:
+        image.image.storage.delete(image.image.name)
+
+
+def release_preview(product: Product) -> None:
+    """
+    Освобождает превью, записанное в хранилище в откатившейся транзакции.
+
+    Прежнее превью продукта остается: на него по-прежнему ссылается строка в БД.
+    """
+    preview = product.preview
+    if preview and preview._committed:  # незаписанный файл освобождать не нужно
+        preview.storage.delete(preview.name)
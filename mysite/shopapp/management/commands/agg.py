@@ -16,8 +16,9 @@ class Command(BaseCommand):
 
         print(result)
 
+        # Выручка по хранимой цене со скидкой, без вычисления price * (1 - discount / 100) в запросе
         orders = Order.objects.annotate(
-            total=Sum("products__price", default=0),
+            total=Sum("products__final_price", default=0),
             products_count=Count('products')
         )
 
@@ -26,5 +27,7 @@ class Command(BaseCommand):
             print(f"with {order.products_count}")
             print(f"products worth {order.total}")
 
+        revenue = Order.objects.aggregate(revenue=Sum("products__final_price", default=0))["revenue"]
+        self.stdout.write(f"Revenue: {revenue}")
 
         self.stdout.write("Done")
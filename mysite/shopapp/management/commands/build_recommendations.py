@@ -0,0 +1,64 @@
+from timeit import default_timer
+from typing import Iterator
+
+import numpy as np
+from django.core.management import BaseCommand
+
+from shopapp.recommendations import CHUNK_LINES, RECOMMENDATIONS_COUNT, OrderLines, build_matrix, rebuild_recommendations
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает "часто покупают вместе" по всей истории заказов.
+
+    Новые заказы обновляют рекомендации сами, полный пересчет нужен после
+    импорта заказов в обход ORM и для первоначального заполнения.
+
+    Замер пересчета на синтетических данных без БД:
+        python manage.py build_recommendations --benchmark 10000000
+    """
+    help = "Пересчитывает рекомендации продуктов по истории заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=RECOMMENDATIONS_COUNT, help="Соседей на продукт")
+        parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES, help="Строк заказов на пачку")
+        parser.add_argument("--benchmark", type=int, metavar="LINES",
+                            help="Только замер расчета матрицы на LINES случайных строках заказов")
+        parser.add_argument("--products", type=int, default=50_000, help="Кол-во продуктов для --benchmark")
+
+    def handle(self, *args, **options):
+        if options["benchmark"]:
+            self.benchmark(options["benchmark"], options["products"], options["count"], options["chunk_lines"])
+            return
+
+        self.stdout.write("Build recommendations")
+        started = default_timer()
+        rows = rebuild_recommendations(count=options["count"], chunk_lines=options["chunk_lines"])
+        self.stdout.write(self.style.SUCCESS(f"Done, {rows} recommendations saved in {default_timer() - started:.1f}s"))
+
+    def benchmark(self, lines: int, products: int, count: int, chunk_lines: int) -> None:
+        self.stdout.write(f"Benchmark: {lines} order lines, {products} products, chunks of {chunk_lines} lines")
+
+        started = default_timer()
+        matrix = build_matrix(synthetic_lines(lines, products, chunk_lines))
+        built = default_timer()
+        top = matrix.top(count)
+        finished = default_timer()
+
+        self.stdout.write(f"Pairs: {len(matrix.keys)}, recommendations: {len(top[0])}")
+        self.stdout.write(self.style.SUCCESS(f"Matrix {built - started:.1f}s, top-{count} {finished - built:.1f}s, "
+                                             f"total {finished - started:.1f}s"))
+
+
+def synthetic_lines(lines: int, products: int, chunk_lines: int, seed: int = 0) -> Iterator[OrderLines]:
+    """Заказы по 1-8 продуктов, популярность продуктов по закону Ципфа."""
+    rng = np.random.default_rng(seed)
+    first_order = 0
+    while lines > 0:
+        sizes = rng.integers(1, 9, size=max(chunk_lines // 4, 1))
+        sizes = sizes[np.cumsum(sizes) <= min(chunk_lines, lines)] if sizes[0] <= lines else sizes[:1]
+        order_ids = first_order + np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+        product_ids = (rng.zipf(1.3, size=len(order_ids)) - 1) % products + 1
+        first_order += len(sizes)
+        lines -= len(order_ids)
+        yield order_ids, product_ids.astype(np.int64)
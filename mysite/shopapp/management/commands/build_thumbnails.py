@@ -0,0 +1,30 @@
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from shopapp.models import Product
+from shopapp.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    """
+    Генерирует недостающие миниатюры для уже загруженных изображений продуктов.
+    """
+    help = "Строит миниатюры для превью и галерей продуктов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("product_ids", nargs="*", type=int, help="ID продуктов (по умолчанию все)")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Build thumbnails")
+
+        products = Product.all_objects.filter(Q(preview__gt="") | Q(images__isnull=False)).distinct()
+        if options["product_ids"]:
+            products = products.filter(pk__in=options["product_ids"])
+
+        total = 0
+        for product_id in products.values_list("pk", flat=True).order_by("pk"):
+            created = generate_thumbnails(product_id)
+            total += created
+            self.stdout.write(f"Product #{product_id}: {created} thumbnails")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {total} thumbnails created"))
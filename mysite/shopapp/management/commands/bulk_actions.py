@@ -1,15 +1,74 @@
-from django.core.management import BaseCommand
-from shopapp.models import Product
+from django import forms
+from django.core.management import BaseCommand, CommandError
+
+from shopapp.bulk import BULK_ACTIONS, CHUNK_SIZE, create_job, run_job, unfinished_jobs
+from shopapp.models import BulkJob
+
+
+def key_value(value: str):
+    """Аргумент вида key=value"""
+    if "=" not in value:
+        raise ValueError(value)
+    return tuple(value.split("=", 1))
 
 
 class Command(BaseCommand):
+    """
+    Массовые действия над продуктами пачками с сохранением прогресса (shopapp.bulk).
+
+        python manage.py bulk_actions run set_discount --filter name__contains=TEST --param discount=10
+        python manage.py bulk_actions run change_price --ids 1 2 3 --param percent=-5
+        python manage.py bulk_actions resume          # все прерванные задания
+        python manage.py bulk_actions list
+    """
+    help = "Запускает и продолжает массовые действия над продуктами"
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest="operation", required=True)
+
+        run = subparsers.add_parser("run", help="Новое задание")
+        run.add_argument("action", choices=sorted(BULK_ACTIONS))
+        run.add_argument("--ids", nargs="+", type=int, help="pk продуктов")
+        run.add_argument("--filter", action="append", type=key_value, default=[], dest="filters",
+                         help="Условие выборки lookup=value (можно несколько)")
+        run.add_argument("--param", action="append", type=key_value, default=[], dest="params",
+                         help="Параметр действия name=value")
+        run.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+        resume = subparsers.add_parser("resume", help="Продолжить прерванные задания")
+        resume.add_argument("job_ids", nargs="*", type=int, help="ID заданий (по умолчанию все прерванные)")
+        resume.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+        subparsers.add_parser("list", help="Незавершенные задания")
+
     def handle(self, *args, **options):
-        self.stdout.write("Bulk actions")
+        operation = options["operation"]
+
+        if operation == "list":
+            for job in unfinished_jobs():
+                self.stdout.write(str(job))
+            return
 
-        result = Product.objects.filter(
-            name__contains="TEST"
-        ).update(discount=10)
+        if operation == "run":
+            action = BULK_ACTIONS[options["action"]]
+            try:
+                if options["ids"]:
+                    queryset = action.model._default_manager.filter(pk__in=options["ids"])
+                    job = create_job(action.name, queryset=queryset, params=dict(options["params"]))
+                else:
+                    job = create_job(action.name, filters=dict(options["filters"]), params=dict(options["params"]))
+            except forms.ValidationError as e:
+                raise CommandError("; ".join(e.messages))
+            jobs = [job]
+        else:
+            jobs = unfinished_jobs()
+            if options["job_ids"]:
+                jobs = jobs.filter(pk__in=options["job_ids"])
 
+        for job in jobs:
+            self.stdout.write(f"Job #{job.pk} {job.action}: {job.processed}/{job.total}")
+            run_job(job, chunk_size=options["chunk_size"], progress=self.progress)
+            self.stdout.write(self.style.SUCCESS(f"Job #{job.pk} {job.status}"))
 
-        print(result)
-        self.stdout.write("Done")
\ No newline at end of file
+    def progress(self, job: BulkJob) -> None:
+        self.stdout.write(f"  {job.processed}/{job.total} ({job.progress}%), last pk {job.last_id}")
@@ -21,7 +21,7 @@ class Command(BaseCommand):
 
 
         for product_name in priducts_names:
-            product, created = Product.objects.get_or_create(name=product_name)
+            product, created = Product.all_objects.get_or_create(name=product_name)
             if created:
                 self.stdout.write(f"Created product {product.name}")
                 self.stdout.write(self.style.SUCCESS("Products creates"))
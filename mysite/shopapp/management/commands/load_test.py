@@ -0,0 +1,113 @@
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+from typing import List, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management import BaseCommand
+
+
+DEFAULT_PATHS = [
+    "/shop/products/export",
+    "/shop/users/1/orders_export/",
+    "/api/hello/",
+    "/shop/api/products/",
+    "/blog/api/article/",
+]
+
+WRITE_PATH = "/shop/api/products/"
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный тест запущенного сервера.
+
+    Позволяет сравнить ASGI (uvicorn) и WSGI воркеры на одних и тех же эндпоинтах:
+        python manage.py load_test --base-url http://127.0.0.1:8000 --concurrency 50
+
+    Смешанная нагрузка чтение/запись (каждый 5-й запрос создает продукт через API):
+        python manage.py load_test --write-ratio 0.2
+    """
+    help = "Параллельно отправляет запросы и выводит RPS и перцентили задержки"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--path", action="append", dest="paths",
+                            help="Путь для нагрузки (можно указать несколько раз)")
+        parser.add_argument("--requests", type=int, default=500, help="Запросов на каждый путь")
+        parser.add_argument("--concurrency", type=int, default=20, help="Число одновременных клиентов")
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--write-ratio", type=float, default=0.0,
+                            help="Доля POST запросов на создание продукта (0..1)")
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        paths = options["paths"] or DEFAULT_PATHS
+
+        self.stdout.write(f"Load test {base_url}: {options['requests']} requests, "
+                          f"concurrency {options['concurrency']}")
+
+        for path in paths:
+            url = base_url + path
+            results = self.run(url=url,
+                               total=options["requests"],
+                               concurrency=options["concurrency"],
+                               timeout=options["timeout"],
+                               write_url=base_url + WRITE_PATH,
+                               write_ratio=options["write_ratio"])
+            self.report(path, *results)
+
+        self.stdout.write("Done")
+
+    @staticmethod
+    def fetch(url: str, timeout: float, data: Optional[dict] = None) -> Tuple[float, bool]:
+        """Один запрос (POST, если передан data). Возвращает время ответа и признак успеха."""
+        request = Request(url)
+        if data is not None:
+            request = Request(url, data=json.dumps(data).encode(), method="POST",
+                              headers={"Content-Type": "application/json"})
+
+        started = default_timer()
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                response.read()
+                ok = response.status < 400
+        except (HTTPError, URLError, OSError):
+            ok = False
+        return default_timer() - started, ok
+
+    def run(self, url: str, total: int, concurrency: int, timeout: float,
+            write_url: str, write_ratio: float) -> Tuple[List[float], int, float]:
+        """Прогоняет total запросов в concurrency потоков, часть из них - записи."""
+        write_every = round(1 / write_ratio) if write_ratio > 0 else 0
+
+        def task(number: int) -> Tuple[float, bool]:
+            if write_every and number % write_every == 0:
+                return self.fetch(write_url, timeout, data={"name": f"load-test-{number}", "price": "1.00"})
+            return self.fetch(url, timeout)
+
+        started = default_timer()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(task, range(total)))
+        elapsed = default_timer() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        return latencies, errors, elapsed
+
+    def report(self, path: str, latencies: List[float], errors: int, elapsed: float) -> None:
+        """Выводит RPS и перцентили задержки в миллисекундах."""
+        def percentile(value: float) -> float:
+            index = min(len(latencies) - 1, int(len(latencies) * value))
+            return latencies[index] * 1000
+
+        rps = len(latencies) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{path}: {rps:.1f} req/s, "
+            f"p50 {percentile(0.50):.1f} ms, p95 {percentile(0.95):.1f} ms, p99 {percentile(0.99):.1f} ms, "
+            f"mean {statistics.mean(latencies) * 1000:.1f} ms, errors {errors}"
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{errors} requests failed"))
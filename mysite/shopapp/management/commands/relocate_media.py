@@ -0,0 +1,78 @@
+import os
+from pathlib import PurePath
+
+from django.core.management import BaseCommand
+
+from mysite.storage import HASHED_NAME_RE, content_addressed_fields
+
+
+class Command(BaseCommand):
+    """
+    Переносит уже загруженные изображения продуктов и аватары в контентно-адресуемое хранилище.
+
+    Файл читается потоково, сохраняется под именем-хэшем (дубликаты схлопываются),
+    ссылка в БД обновляется, старый файл удаляется. С --prune дополнительно удаляет
+    файлы хранилища, на которые не ссылается ни одна запись.
+    """
+    help = "Переносит медиа файлы в хранилище с именами по хэшу содержимого"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет перенесено")
+        parser.add_argument("--prune", action="store_true", help="Удалить файлы без ссылок из БД")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Relocate media")
+
+        relocated = 0
+        for model, field in content_addressed_fields():
+            storage = field.storage
+            rows = (model._base_manager.
+                    exclude(**{field.name: ""}).
+                    exclude(**{f"{field.name}__isnull": True}).
+                    values_list("pk", field.attname))
+
+            for pk, old_name in rows.iterator():
+                if HASHED_NAME_RE.search(old_name):
+                    continue
+
+                if not storage.exists(old_name):
+                    self.stdout.write(self.style.WARNING(f"{model.__name__}#{pk}: {old_name} is missing"))
+                    continue
+
+                if options["dry_run"]:
+                    self.stdout.write(f"{model.__name__}#{pk}: {old_name} would be relocated")
+                    continue
+
+                instance = model._base_manager.get(pk=pk)
+                with storage.open(old_name, "rb") as old_file:
+                    new_name = storage.save(field.generate_filename(instance, PurePath(old_name).name), old_file)
+
+                model._base_manager.filter(pk=pk).update(**{field.attname: new_name})
+                storage.delete(old_name)  # удалится, если других ссылок не осталось
+
+                relocated += 1
+                self.stdout.write(f"{model.__name__}#{pk}: {old_name} -> {new_name}")
+
+        if options["prune"]:
+            self.prune(dry_run=options["dry_run"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {relocated} files relocated"))
+
+    def prune(self, dry_run: bool) -> None:
+        """Удаляет хэшированные файлы, на которые не ссылается ни одна запись."""
+        checked = set()
+        for _, field in content_addressed_fields():
+            storage = field.storage
+            root = storage.path("")
+
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    name = PurePath(os.path.relpath(os.path.join(directory, filename), root)).as_posix()
+                    if name in checked or not HASHED_NAME_RE.search(name):
+                        continue
+                    checked.add(name)
+
+                    if storage.references(name) == 0:
+                        self.stdout.write(f"Orphan {name}" + (" would be removed" if dry_run else " removed"))
+                        if not dry_run:
+                            storage.delete(name)
@@ -0,0 +1,47 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from mysite.db import REPLICA_DATABASE
+
+
+class Command(BaseCommand):
+    """
+    Заглушка репликации для локальной разработки.
+
+    Копирует SQLite базу default в базу реплики через backup API sqlite3
+    (консистентный снимок без остановки записи):
+        DJANGO_DB_REPLICA=db-replica.sqlite3 python manage.py sync_replica --interval 2
+    """
+    help = "Синхронизирует SQLite реплику с primary базой"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Повторять синхронизацию каждые N секунд (0 - один раз)")
+
+    def handle(self, *args, **options):
+        if REPLICA_DATABASE not in settings.DATABASES:
+            raise CommandError("Replica is not configured, set DJANGO_DB_REPLICA")
+
+        primary_name = settings.DATABASES["default"]["NAME"]
+        replica_name = settings.DATABASES[REPLICA_DATABASE]["NAME"]
+
+        while True:
+            self.sync(primary_name, replica_name)
+            self.stdout.write(self.style.SUCCESS(f"Replica {replica_name} synced"))
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def sync(primary_name: str, replica_name: str) -> None:
+        primary = sqlite3.connect(primary_name)
+        replica = sqlite3.connect(replica_name)
+        try:
+            primary.backup(replica)
+        finally:
+            replica.close()
+            primary.close()
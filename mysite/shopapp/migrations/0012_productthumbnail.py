@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-19 02:37
+
+import django.db.models.deletion
+import shopapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0011_alter_product_options_alter_product_description_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductThumbnail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(choices=[('small', 'Small'), ('medium', 'Medium'), ('large', 'Large')], max_length=10)),
+                ('format', models.CharField(choices=[('jpeg', 'JPEG'), ('webp', 'WebP')], max_length=10)),
+                ('image', models.ImageField(height_field='height', upload_to=shopapp.models.product_thumbnail_directory_path, width_field='width')),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('source_name', models.CharField(help_text='Имя оригинала, из которого построена миниатюра', max_length=255)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnails', to='shopapp.product')),
+                ('product_image', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thumbnails', to='shopapp.productimage')),
+            ],
+            options={
+                'verbose_name': 'product thumbnail',
+                'verbose_name_plural': 'product thumbnails',
+                'ordering': ['product', 'product_image', 'size', 'format'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-19 03:05
+
+import shopapp.models
+import mysite.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0012_productthumbnail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='preview',
+            field=models.ImageField(blank=True, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=shopapp.models.product_preview_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=mysite.storage.ContentAddressedStorage(), upload_to=shopapp.models.product_images_directory_path),
+        ),
+    ]
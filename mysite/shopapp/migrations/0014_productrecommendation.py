@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 12:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0013_alter_product_preview_alter_productimage_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(help_text='Кол-во заказов, в которых продукты были вместе')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='shopapp.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shopapp.product')),
+            ],
+            options={
+                'verbose_name': 'product recommendation',
+                'verbose_name_plural': 'product recommendations',
+                'ordering': ['product', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'recommended'), name='unique_product_recommendation')],
+            },
+        ),
+    ]
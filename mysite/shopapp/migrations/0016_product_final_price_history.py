@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-19 14:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Round
+from django.utils import timezone
+
+
+def fill_final_prices(apps, schema_editor):
+    """final_price существующих продуктов и начальная запись истории цен"""
+    Product = apps.get_model("shopapp", "Product")
+    ProductPriceHistory = apps.get_model("shopapp", "ProductPriceHistory")
+
+    Product.objects.update(final_price=ExpressionWrapper(
+        Round(F("price") * (Value(100) - F("discount")) * Value(Decimal("0.01")), 2),
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    ))
+
+    changed_at = timezone.now()
+    prices = Product.objects.order_by("pk").values_list("pk", "price", "discount", "final_price")
+    batch = []
+    for pk, price, discount, final_price in prices.iterator(chunk_size=500):
+        batch.append(ProductPriceHistory(product_id=pk, price=price, discount=discount,
+                                         final_price=final_price, changed_at=changed_at))
+        if len(batch) >= 500:
+            ProductPriceHistory.objects.bulk_create(batch)
+            batch = []
+    ProductPriceHistory.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0015_bulkjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='final_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, help_text='Цена со скидкой, пересчитывается при сохранении', max_digits=8),
+        ),
+        migrations.CreateModel(
+            name='ProductPriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('discount', models.SmallIntegerField()),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='shopapp.product')),
+            ],
+            options={
+                'verbose_name': 'product price history',
+                'verbose_name_plural': 'product price history',
+                'ordering': ['product', 'changed_at', 'pk'],
+                'indexes': [models.Index(fields=['product', 'changed_at'], name='shopapp_pro_product_3acccb_idx')],
+            },
+        ),
+        migrations.RunPython(fill_final_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 15:20
+
+import django.db.models.manager
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0018_drop_redundant_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='product',
+            options={'default_manager_name': 'all_objects', 'ordering': ['name', 'price'], 'verbose_name': 'Product', 'verbose_name_plural': 'products'},
+        ),
+        migrations.AlterModelManagers(
+            name='product',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('archived', False)), fields=['-created_at'], name='product_active_created_at'),
+        ),
+    ]
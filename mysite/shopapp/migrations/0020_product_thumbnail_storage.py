@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 18:05
+
+import mysite.storage
+import shopapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0019_product_active_manager'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productthumbnail',
+            name='image',
+            field=models.ImageField(height_field='height', storage=mysite.storage.ContentAddressedStorage(), upload_to=shopapp.models.product_thumbnail_directory_path, width_field='width'),
+        ),
+    ]
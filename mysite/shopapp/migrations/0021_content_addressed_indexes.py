@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 19:20
+
+import mysite.storage
+import shopapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0020_product_thumbnail_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='preview',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=shopapp.models.product_preview_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=mysite.storage.ContentAddressedStorage(), upload_to=shopapp.models.product_images_directory_path),
+        ),
+        migrations.AlterField(
+            model_name='productthumbnail',
+            name='image',
+            field=models.ImageField(db_index=True, height_field='height', storage=mysite.storage.ContentAddressedStorage(), upload_to=shopapp.models.product_thumbnail_directory_path, width_field='width'),
+        ),
+    ]
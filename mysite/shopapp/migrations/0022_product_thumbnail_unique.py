@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-19 20:10
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def delete_duplicate_thumbnails(apps, schema_editor):
+    """Дубликаты миниатюр (параллельная генерация) - остается последняя построенная"""
+    ProductThumbnail = apps.get_model("shopapp", "ProductThumbnail")
+
+    duplicates = (ProductThumbnail.objects.
+                  values("product", "product_image", "size", "format").
+                  annotate(last=Max("pk")).
+                  values_list("last", flat=True))
+    # Файлы удаленных записей без ссылок убирает relocate_media --prune
+    ProductThumbnail.objects.exclude(pk__in=list(duplicates)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopapp', '0021_content_addressed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_thumbnails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productthumbnail',
+            constraint=models.UniqueConstraint(condition=models.Q(('product_image__isnull', True)), fields=('product', 'size', 'format'), name='unique_product_preview_thumbnail'),
+        ),
+        migrations.AddConstraint(
+            model_name='productthumbnail',
+            constraint=models.UniqueConstraint(condition=models.Q(('product_image__isnull', False)), fields=('product', 'product_image', 'size', 'format'), name='unique_product_image_thumbnail'),
+        ),
+    ]
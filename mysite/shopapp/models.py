@@ -1,32 +1,134 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, List
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Round
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from mysite.storage import content_addressed_storage
+
 
 def product_preview_directory_path(instance: "Product", filename: str) -> str:
-    directory_path = "products/product_{pk}/preview/{filename}".format(pk=instance.pk, filename=filename)
+    """
+    Каталог превью продукта.
+
+    Не зависит от pk: при создании продукта pk еще нет. Имя файла заменяется
+    хэшем содержимого в ContentAddressedStorage.
+    """
+    directory_path = "products/preview/{filename}".format(filename=filename)
     return directory_path
 
 
+PRICE_FIELDS = {"price", "discount"}
+
+PRICE_HISTORY_BATCH_SIZE = 500
+
+
+def final_price_expression(price=F("price"), discount=F("discount")) -> ExpressionWrapper:
+    """
+    price * (100 - discount) / 100 с округлением до копеек в SQL.
+
+    Умножение на 0.01, а не деление на 100: на SQLite целая цена и целая скидка
+    иначе дали бы целочисленное деление.
+    """
+    return ExpressionWrapper(Round(price * (Value(100) - discount) * Value(Decimal("0.01")), 2),
+                             output_field=DecimalField(max_digits=8, decimal_places=2))
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet продуктов, поддерживающий final_price и историю цен в массовых операциях.
+
+    bulk_create() и update() с price/discount пересчитывают final_price и пишут
+    ProductPriceHistory пачками, как и Product.save() для одного продукта.
+    """
+
+    def active(self) -> "ProductQuerySet":
+        """Продукты, не удаленные в архив (условие частичных индексов product_active_*)"""
+        return self.filter(archived=False)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.final_price = obj.compute_final_price()
+
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            ProductPriceHistory.objects.using(self.db).bulk_create(
+                [ProductPriceHistory.for_product(obj) for obj in created if obj.pk is not None],
+                batch_size=PRICE_HISTORY_BATCH_SIZE,
+            )
+        return created
+
+    def update(self, **kwargs):
+        if not PRICE_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+
+        # выражения в SET вычисляются по старым значениям: подставляем в формулу новые
+        kwargs["final_price"] = final_price_expression(price=kwargs.get("price", F("price")),
+                                                       discount=kwargs.get("discount", F("discount")))
+        with transaction.atomic(using=self.db):
+            product_ids = list(self.order_by().values_list("pk", flat=True))  # выборка может зависеть от цены
+            rows = super().update(**kwargs)
+            ProductPriceHistory.record(product_ids, using=self.db)
+        return rows
+
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
+    """Все продукты, включая архивные. Менеджер по умолчанию: админка, формы, связи заказов, dumpdata."""
+
+    def with_archived(self) -> ProductQuerySet:
+        return self._queryset_class(model=self.model, using=self._db, hints=self._hints)
+
+
+class ActiveProductManager(ProductManager):
+    """Product.objects: только активные продукты, архивные - через with_archived()"""
+
+    def get_queryset(self) -> ProductQuerySet:
+        return super().get_queryset().active()
+
+
 class Product(models.Model):
     """
     Модель Product описывает продукт для продажи в магазине
 
     Заказы тут: :model:`shopapp.Order`
+    Удаление - перенос в архив (archived): Product.objects возвращает только активные
+    продукты, Product.all_objects и Product.objects.with_archived() - все.
+    Цена со скидкой хранится в final_price (индекс для фильтров и отчетов),
+    изменения цен - в :model:`shopapp.ProductPriceHistory`
     """
 
     class Meta:
         ordering = ["name", "price"]
         verbose_name = _("Product")
         verbose_name_plural = "products"
+        default_manager_name = "all_objects"
+        indexes = [
+            # список активных продуктов в сортировке по умолчанию (name, price) без сортировки в памяти.
+            # Частичный, а не (archived, name, price): filter(archived=False) в SQL - это NOT "archived",
+            # по такому условию ведущий столбец индекса не используется
+            models.Index(fields=["name", "price"], condition=models.Q(archived=False), name="product_active_name_price"),
+            # новые активные продукты: лента и карта сайта
+            models.Index(fields=["-created_at"], condition=models.Q(archived=False), name="product_active_created_at"),
+        ]
 
 
     name = models.CharField(max_length=100, db_index=True)
-    description = models.TextField(null=False, blank=True, db_index=True)
-    preview = models.ImageField(null=True, blank=True, upload_to=product_preview_directory_path)
+    description = models.TextField(null=False, blank=True)  # B-tree по длинному тексту не помогает поиску icontains
+    preview = models.ImageField(null=True,
+                                blank=True,
+                                upload_to=product_preview_directory_path,
+                                storage=content_addressed_storage,
+                                db_index=True)  # подсчет ссылок на файл (ContentAddressedStorage.references)
     price = models.DecimalField(default=0, max_digits=8, decimal_places=2)
     discount = models.SmallIntegerField(default=0)
+    final_price = models.DecimalField(default=0, max_digits=8, decimal_places=2, db_index=True, editable=False,
+                                      help_text="Цена со скидкой, пересчитывается при сохранении")
     created_at = models.DateTimeField(auto_now_add=True)
     archived = models.BooleanField(default=False)
 
@@ -40,23 +142,108 @@ class Product(models.Model):
                                    )
 
 
+    objects = ActiveProductManager()
+    all_objects = ProductManager()
+
     def __str__(self) -> str:
         admin_panel_info = f"PRODUCT(pk={self.pk} name={self.name!r})"
         return admin_panel_info
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминаем загруженные цену и скидку, чтобы писать историю только при изменении"""
+        instance = super().from_db(db, field_names, values)
+        instance._saved_prices = (instance.__dict__.get("price"), instance.__dict__.get("discount"))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Пересчитывает final_price и добавляет запись в историю цен, если цена или скидка изменились"""
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and PRICE_FIELDS & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "final_price"}
+        elif update_fields is not None:
+            super().save(*args, **kwargs)
+            return
+
+        self.final_price = self.compute_final_price()
+        prices_changed = getattr(self, "_saved_prices", None) != (self.price, self.discount)
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+            if prices_changed:
+                ProductPriceHistory.for_product(self).save(using=self._state.db)
+        self._saved_prices = (self.price, self.discount)
+
+    def compute_final_price(self) -> Decimal:
+        price = Decimal(str(self.price or 0))
+        return (price * (100 - int(self.discount or 0)) / 100).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    def get_discounted_price(self) -> Decimal:
+        """Цена со скидкой (хранимая)"""
+        return self.final_price
+
+    def get_discount_amount(self) -> Decimal:
+        """Размер скидки в деньгах"""
+        return Decimal(str(self.price or 0)) - self.final_price
+
     def get_absolute_url(self):
         """Возвращает канонический URL для статьи."""
         return reverse("shopapp:product_details", kwargs={"pk": self.pk})
 
 
+class ProductPriceHistory(models.Model):
+    """
+    История цен продукта, только добавление записей.
+
+    Пишется при сохранении продукта с новой ценой или скидкой и пачками
+    при массовых изменениях (ProductQuerySet.update / bulk_create).
+    """
+
+    class Meta:
+        ordering = ["product", "changed_at", "pk"]
+        verbose_name = "product price history"
+        verbose_name_plural = "product price history"
+        indexes = [models.Index(fields=["product", "changed_at"])]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="price_history")
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    discount = models.SmallIntegerField()
+    final_price = models.DecimalField(max_digits=8, decimal_places=2)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"PRICE(product={self.product_id} final_price={self.final_price} at {self.changed_at:%Y-%m-%d %H:%M})"
+
+    @classmethod
+    def for_product(cls, product: Product) -> "ProductPriceHistory":
+        return cls(product_id=product.pk, price=product.price, discount=product.discount,
+                   final_price=product.final_price)
+
+    @classmethod
+    def record(cls, product_ids: Iterable[int], using: str = "default") -> None:
+        """Текущие цены продуктов в историю: чтение и вставка пачками"""
+        product_ids: List[int] = list(product_ids)
+        changed_at = timezone.now()
+        for start in range(0, len(product_ids), PRICE_HISTORY_BATCH_SIZE):
+            chunk = product_ids[start:start + PRICE_HISTORY_BATCH_SIZE]
+            prices = (Product._base_manager.using(using).
+                      filter(pk__in=chunk).
+                      order_by().
+                      values_list("pk", "price", "discount", "final_price"))
+            cls.objects.using(using).bulk_create([
+                cls(product_id=pk, price=price, discount=discount, final_price=final_price, changed_at=changed_at)
+                for pk, price, discount, final_price in prices
+            ])
+
+
 def product_images_directory_path(instance: "ProductImage", filename: str) -> str:
-    directory_path ="products/product_{pk}/preview/{filename}".format(pk=instance.product.pk, filename=filename)
+    """Каталог изображений галереи, имя файла заменяется хэшем содержимого."""
+    directory_path = "products/images/{filename}".format(filename=filename)
     return directory_path
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="images")
-    image = models.ImageField(upload_to=product_images_directory_path)
+    image = models.ImageField(upload_to=product_images_directory_path, storage=content_addressed_storage, db_index=True)
     description = models.CharField(max_length=200, null=False, blank=True)
 
 
@@ -66,11 +253,149 @@ class Order(models.Model):
         ordering = ["-created_at"]
         verbose_name = "order"
         verbose_name_plural = "orders"
+        indexes = [
+            # заказы пользователя от новых к старым; заменяет индекс внешнего ключа user
+            models.Index(fields=["user", "-created_at"], name="order_user_created_at"),
+            # все заказы в порядке по умолчанию
+            models.Index(fields=["-created_at"], name="order_created_at"),
+        ]
 
     delivery_adress = models.TextField(null=True, blank=True)
     promocode = models.CharField(max_length=20, null=False, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     receipt = models.FileField(null=True, upload_to="orders/receipts")
 
-    user: User = models.ForeignKey(User, on_delete=models.PROTECT)
+    user: User = models.ForeignKey(User, on_delete=models.PROTECT, db_index=False)  # см. order_user_created_at
     products: Product = models.ManyToManyField(Product, related_name="orders")
+
+
+def product_thumbnail_directory_path(instance: "ProductThumbnail", filename: str) -> str:
+    directory_path = "products/product_{pk}/thumbnails/{filename}".format(pk=instance.product_id, filename=filename)
+    return directory_path
+
+
+class ProductThumbnail(models.Model):
+    """
+    Уменьшенная копия превью продукта или изображения из галереи.
+
+    Если product_image пустой - миниатюра построена из Product.preview.
+    Генерируются в фоне, см. shopapp.thumbnails. Файл в ContentAddressedStorage
+    освобождается при удалении записи, в т.ч. каскадном вместе с изображением или продуктом.
+    """
+
+    class Meta:
+        ordering = ["product", "product_image", "size", "format"]
+        verbose_name = "product thumbnail"
+        verbose_name_plural = "product thumbnails"
+        # Одна миниатюра на оригинал, размер и формат. NULL в UNIQUE не совпадают между собой,
+        # поэтому для превью (product_image пустой) - отдельное условное ограничение
+        constraints = [
+            models.UniqueConstraint(fields=["product", "size", "format"],
+                                    condition=models.Q(product_image__isnull=True),
+                                    name="unique_product_preview_thumbnail"),
+            models.UniqueConstraint(fields=["product", "product_image", "size", "format"],
+                                    condition=models.Q(product_image__isnull=False),
+                                    name="unique_product_image_thumbnail"),
+        ]
+
+    SIZE_CHOICES = [
+        ("small", "Small"),
+        ("medium", "Medium"),
+        ("large", "Large"),
+    ]
+    FORMAT_CHOICES = [
+        ("jpeg", "JPEG"),
+        ("webp", "WebP"),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="thumbnails")
+    product_image = models.ForeignKey(ProductImage,
+                                      on_delete=models.CASCADE,
+                                      null=True,
+                                      blank=True,
+                                      related_name="thumbnails")
+    size = models.CharField(max_length=10, choices=SIZE_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    image = models.ImageField(upload_to=product_thumbnail_directory_path,
+                              storage=content_addressed_storage,
+                              db_index=True,
+                              width_field="width",
+                              height_field="height")
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    source_name = models.CharField(max_length=255, help_text="Имя оригинала, из которого построена миниатюра")
+
+    def __str__(self) -> str:
+        return f"THUMBNAIL(product={self.product_id} size={self.size} format={self.format})"
+
+
+class ProductRecommendation(models.Model):
+    """
+    "Часто покупают вместе": top-K продуктов, чаще всего встречавшихся в заказах вместе с product.
+
+    Заполняется из истории заказов (shopapp.recommendations).
+    """
+
+    class Meta:
+        ordering = ["product", "rank"]
+        verbose_name = "product recommendation"
+        verbose_name_plural = "product recommendations"
+        constraints = [
+            models.UniqueConstraint(fields=["product", "recommended"], name="unique_product_recommendation"),
+        ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommendations")
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(help_text="Кол-во заказов, в которых продукты были вместе")
+    rank = models.PositiveSmallIntegerField()
+
+    def __str__(self) -> str:
+        return f"RECOMMENDATION(product={self.product_id} recommended={self.recommended_id} count={self.count})"
+
+
+class BulkJob(models.Model):
+    """
+    Массовое действие над продуктами, выполняемое пачками (shopapp.bulk).
+
+    Выбранные pk хранятся отсортированными в ids (или условие выборки в filters),
+    last_id - последний обработанный pk: прерванное задание продолжается с него.
+    """
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "bulk job"
+        verbose_name_plural = "bulk jobs"
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    action = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    ids = models.JSONField(null=True, blank=True, help_text="Отсортированные pk выбранных объектов")
+    filters = models.JSONField(default=dict, blank=True, help_text="Условие выборки, если ids не заданы")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    last_id = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"BULK JOB(pk={self.pk} action={self.action} {self.processed}/{self.total} {self.status})"
+
+    @property
+    def progress(self) -> int:
+        """Процент выполнения"""
+        if not self.total:
+            return 100 if self.status == self.STATUS_DONE else 0
+        return min(100, self.processed * 100 // self.total)
@@ -0,0 +1,227 @@
+"""
+"Часто покупают вместе" по истории заказов.
+
+Полный пересчет читает таблицу связей Order.products пачками строк (заказы
+целиком), для каждой пачки в NumPy строит пары продуктов внутри заказов и
+сворачивает их в разреженную матрицу совместных покупок (ключ пары -> кол-во).
+Память ограничена пачкой строк и кол-вом различных пар, плотная матрица
+продукт x продукт не создается. Top-K соседей каждого продукта сохраняется
+в таблицу ProductRecommendation.
+
+Новые и измененные заказы меняют кол-ва только для пар своих продуктов, поэтому
+после коммита пересчитываются списки только этих продуктов: продукты всех
+изменений транзакции - одной задачей в фоновом потоке, одним агрегирующим запросом.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+
+from mysite.db import on_commit_collect
+from .models import Order, ProductRecommendation
+
+log = logging.getLogger(__name__)
+
+
+RECOMMENDATIONS_COUNT = getattr(settings, "SHOP_RECOMMENDATIONS_COUNT", 5)
+CHUNK_LINES = getattr(settings, "SHOP_RECOMMENDATIONS_CHUNK_LINES", 1_000_000)
+
+_PAIR_SHIFT = 32  # ключ пары: (продукт << 32) | продукт
+_PAIR_MASK = (1 << _PAIR_SHIFT) - 1
+
+OrderLines = Tuple[np.ndarray, np.ndarray]
+
+# Один поток: пересчеты пересекающихся наборов продуктов не перемешивают удаление и вставку строк
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommendations")
+
+
+def order_pairs(order_ids: np.ndarray, product_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Все упорядоченные пары (продукт, другой продукт того же заказа).
+
+    Строки должны быть отсортированы по заказу. Для строки заказа размера s
+    берутся все s строк этого заказа, затем пары продукта с самим собой отбрасываются.
+    """
+    if not len(order_ids):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    starts = np.flatnonzero(np.r_[True, order_ids[1:] != order_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(order_ids)])
+    line_sizes = np.repeat(sizes, sizes)
+    line_starts = np.repeat(starts, sizes)
+
+    left = np.repeat(product_ids, line_sizes)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(line_sizes) - line_sizes, line_sizes)
+    right = product_ids[np.repeat(line_starts, line_sizes) + offsets]
+
+    different = left != right
+    return left[different], right[different]
+
+
+class CooccurrenceMatrix:
+    """Разреженная матрица совместных покупок: отсортированные ключи пар и их кол-ва."""
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def add(self, order_ids: np.ndarray, product_ids: np.ndarray) -> None:
+        """
+        Добавляет пачку строк заказов (заказы целиком, отсортированы по заказу).
+
+        Ключи пачки сливаются с уже накопленными через searchsorted: известные пары
+        увеличивают кол-во, новые вставляются на свои места - без повторной сортировки всех ключей.
+        """
+        left, right = order_pairs(order_ids, product_ids)
+        keys, counts = np.unique((left << _PAIR_SHIFT) | right, return_counts=True)
+
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        self.counts[positions[found]] += counts[found]
+
+        new = ~found
+        if new.any():
+            self.keys = np.insert(self.keys, positions[new], keys[new])
+            self.counts = np.insert(self.counts, positions[new], counts[new])
+
+    def top(self, count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """top-count соседей каждого продукта: (продукт, сосед, кол-во, место с 1)."""
+        products = self.keys >> _PAIR_SHIFT
+        others = self.keys & _PAIR_MASK
+        if not len(products):
+            return products, others, self.counts, self.counts
+
+        order = np.lexsort((others, -self.counts, products))
+        products, others, counts = products[order], others[order], self.counts[order]
+
+        starts = np.flatnonzero(np.r_[True, products[1:] != products[:-1]])
+        ranks = np.arange(len(products)) - np.repeat(starts, np.diff(np.r_[starts, len(products)]))
+        best = ranks < count
+        return products[best], others[best], counts[best], ranks[best] + 1
+
+
+def read_order_lines(chunk_lines: int = CHUNK_LINES) -> Iterator[OrderLines]:
+    """Строки Order.products пачками примерно по chunk_lines, заказ не разрывается между пачками."""
+    lines = (Order.products.through.objects.
+             order_by("order_id", "product_id").
+             values_list("order_id", "product_id").
+             iterator(chunk_size=10000))
+
+    order_ids: List[int] = []
+    product_ids: List[int] = []
+    for order_id, product_id in lines:
+        if len(order_ids) >= chunk_lines and order_id != order_ids[-1]:
+            yield np.array(order_ids, dtype=np.int64), np.array(product_ids, dtype=np.int64)
+            order_ids, product_ids = [], []
+        order_ids.append(order_id)
+        product_ids.append(product_id)
+
+    if order_ids:
+        yield np.array(order_ids, dtype=np.int64), np.array(product_ids, dtype=np.int64)
+
+
+def build_matrix(chunks: Iterable[OrderLines]) -> CooccurrenceMatrix:
+    matrix = CooccurrenceMatrix()
+    for order_ids, product_ids in chunks:
+        matrix.add(order_ids, product_ids)
+    return matrix
+
+
+def rebuild_recommendations(count: int = RECOMMENDATIONS_COUNT, chunk_lines: int = CHUNK_LINES) -> int:
+    """Полный пересчет таблицы рекомендаций. Возвращает кол-во сохраненных строк."""
+    products, others, counts, ranks = build_matrix(read_order_lines(chunk_lines)).top(count)
+    rows = [ProductRecommendation(product_id=int(product_id),
+                                  recommended_id=int(other_id),
+                                  count=int(pair_count),
+                                  rank=int(rank))
+            for product_id, other_id, pair_count, rank in zip(products, others, counts, ranks)]
+
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def update_recommendations(product_ids: Iterable[int], count: int = RECOMMENDATIONS_COUNT) -> None:
+    """Пересчет списков product_ids по таблице связей одним агрегирующим запросом."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    together = (Order.products.through.objects.
+                filter(product_id__in=product_ids).
+                values("product_id", other_id=F("order__products")).
+                exclude(other_id=F("product_id")).
+                annotate(count=Count("order_id")).
+                order_by("product_id", "-count", "other_id").
+                values_list("product_id", "other_id", "count"))
+
+    rows = []
+    rank = 0
+    previous = None
+    for product_id, other_id, pair_count in together.iterator():
+        rank = rank + 1 if product_id == previous else 1
+        previous = product_id
+        if rank <= count:
+            rows.append(ProductRecommendation(product_id=product_id, recommended_id=other_id,
+                                              count=pair_count, rank=rank))
+
+    with transaction.atomic():
+        ProductRecommendation.objects.filter(product_id__in=product_ids).delete()
+        ProductRecommendation.objects.bulk_create(rows)
+
+
+def _update_in_background(product_ids: Set[int]) -> None:
+    """Задача пула: у потока свое соединение с БД, закрываем его по завершении."""
+    try:
+        update_recommendations(product_ids)
+    except Exception:
+        log.exception("Recommendations update failed for products %s", sorted(product_ids))
+    finally:
+        connection.close()
+
+
+def _submit_update(product_ids: Set[int]) -> None:
+    if not getattr(settings, "SHOP_RECOMMENDATIONS_ASYNC", True):
+        update_recommendations(product_ids)
+        return
+    _executor.submit(_update_in_background, product_ids)
+
+
+def schedule_update(product_ids: Iterable[int]) -> None:
+    """
+    Пересчет после коммита транзакции, когда связи заказа уже видны.
+
+    Продукты всех изменений транзакции пересчитываются одной задачей в фоновом потоке,
+    при SHOP_RECOMMENDATIONS_ASYNC = False - сразу после коммита (тесты, команды).
+    """
+    product_ids: Set[int] = set(product_ids)
+    if product_ids:
+        on_commit_collect("shopapp:recommendations", _submit_update, product_ids)
+
+
+def order_products_changed(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    """m2m_changed Order.products: меняются пары всех продуктов затронутых заказов."""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if not reverse:
+        order_ids = [instance.pk]
+        product_ids = set(pk_set or ())
+    else:
+        order_ids = pk_set if action != "pre_clear" else instance.orders.values_list("pk", flat=True)
+        product_ids = {instance.pk}
+
+    through = Order.products.through.objects
+    schedule_update(product_ids | set(through.filter(order_id__in=order_ids).values_list("product_id", flat=True)))
+
+
+def order_deleted(sender, instance: Order, **kwargs) -> None:
+    """Продукты заказа запоминаются до удаления связей."""
+    schedule_update(instance.products.values_list("pk", flat=True))
@@ -1,15 +1,35 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from rest_framework import serializers
 
 from .models import Product, Order
+from .thumbnails import THUMBNAIL_FORMATS, THUMBNAIL_SIZES, get_thumbnail
 
 
 class ProductSerializer(serializers.ModelSerializer):
     """Сериализатор продуктов."""
+
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = ('pk', 'name', 'price', 'description', 'discount', 'preview', 'archived', "created_at")
+        fields = ('pk', 'name', 'price', 'description', 'discount', 'final_price', 'preview', 'thumbnails', 'archived',
+                  "created_at")
+
+    def get_thumbnails(self, obj: Product) -> Dict[str, Dict[str, str]]:
+        """Получить URL миниатюр превью: {размер: {формат: url}}"""
+        request = self.context.get("request")
+        thumbnails: Dict[str, Dict[str, str]] = {}
+
+        for size in THUMBNAIL_SIZES:
+            for image_format in THUMBNAIL_FORMATS:
+                thumbnail = get_thumbnail(obj, size, image_format)
+                if thumbnail is None:
+                    continue
+                url = thumbnail.image.url
+                thumbnails.setdefault(size, {})[image_format] = request.build_absolute_uri(url) if request else url
+
+        return thumbnails
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -16,7 +16,7 @@ class ShopSiteMap(Sitemap):
     priority = 0.5
 
     def items(self) -> List[Product]:
-        """Возвращает список объектов для включения в sitemap."""
+        """Возвращает список активных продуктов для включения в sitemap."""
         products = Product.objects.order_by("-created_at")
         return products
 
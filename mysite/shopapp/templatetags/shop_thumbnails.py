@@ -0,0 +1,49 @@
+from typing import Any, Dict, Union
+
+from django import template
+
+from shopapp.models import Product, ProductImage
+from shopapp.thumbnails import get_thumbnail
+
+
+register = template.Library()
+
+
+def original_file(obj: Union[Product, ProductImage]):
+    """Оригинальный файл: превью продукта или изображение галереи."""
+    return obj.preview if isinstance(obj, Product) else obj.image
+
+
+@register.simple_tag
+def thumbnail_url(obj: Union[Product, ProductImage], size: str = "medium", image_format: str = "jpeg") -> str:
+    """
+    URL миниатюры нужного размера.
+
+    Пока миниатюра не сгенерирована - возвращает URL оригинала.
+    Пример: {% thumbnail_url product "small" %}
+    """
+    thumbnail = get_thumbnail(obj, size, image_format)
+    if thumbnail:
+        return thumbnail.image.url
+
+    original = original_file(obj)
+    return original.url if original else ""
+
+
+@register.inclusion_tag("shopapp/includes/product_picture.html")
+def product_picture(obj: Union[Product, ProductImage], size: str = "medium",
+                    alt: str = "", css_class: str = "") -> Dict[str, Any]:
+    """
+    Тег <picture> с WebP источником и JPEG запасным вариантом.
+
+    Пример: {% product_picture product "large" alt=product.name %}
+    """
+    original = original_file(obj)
+
+    return {
+        "jpeg": get_thumbnail(obj, size, "jpeg"),
+        "webp": get_thumbnail(obj, size, "webp"),
+        "original_url": original.url if original else "",
+        "alt": alt,
+        "css_class": css_class,
+    }
@@ -1,12 +1,43 @@
+import hashlib
+import html
+import json
+import os
 import random
+import re
+import shutil
+import tempfile
+from io import BytesIO, StringIO
 from string import ascii_letters
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import numpy as np
 
 from django.conf import settings
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User, Permission
 from django.urls import reverse
 
-from shopapp.models import Order, Product
+from mysite.db import (EstimatedCountPaginator, PrimaryReplicaRouter, REPLICA_DATABASE, REPLICA_PIN_COOKIE,
+                       estimated_count)
+from mysite.storage import content_addressed_storage
+from PIL import Image
+
+from shopapp.bulk import BULK_ACTIONS, create_job, run_job
+from shopapp.models import BulkJob, Order, Product, ProductPriceHistory, ProductImage, ProductRecommendation, ProductThumbnail
+from shopapp.recommendations import CooccurrenceMatrix, rebuild_recommendations, update_recommendations
+from shopapp.serializers import OrderSerializer
+from shopapp.thumbnails import THUMBNAIL_FORMATS, THUMBNAIL_SIZES, generate_thumbnails
+from shopapp.uploadhandlers import CSVImportUploadHandler
+from shopapp.views import LatestProductsFeed, OrdersListView, ProductsListView, ProductViewSet, UserOrdersListView
 
 
 class ProductCreateViewTest(TestCase):
@@ -103,7 +134,7 @@ class ProductExportViewTestCase(TestCase):
     def test_get_product_view(self):
         """Тест: проверка статус кода на соответствие коду 200 и соответствие фикстуре продуктов json ответу страницы"""
         response = self.client.get(reverse("shopapp:products-export"))
-        products = Product.objects.order_by("pk").all()
+        products = Product.all_objects.order_by("pk").all()
         expected_data = [
             {
                 "pk": product.pk,
@@ -242,3 +273,1011 @@ class OrdersExportTestCase(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(orders_data["orders"], expected_data)
+
+
+class UserOrderExportViewTestCase(TestCase):
+    """Класс тестирования асинхронного экспорта заказов пользователя"""
+
+    fixtures = ["orders-fixture.json",
+                "users-fixture.json",
+                "product-fixtures.json"]
+
+    def setUp(self) -> None:
+        """Сброс кэша экспорта"""
+        cache.delete("orders_data_export_for_user_1")
+
+    def test_export_user_orders(self) -> None:
+        """Тест: экспорт совпадает с сериализованными заказами, повторный запрос берется из кэша"""
+        url = reverse("shopapp:user_ordes_export", kwargs={"user_id": 1})
+        expected_data = OrderSerializer(Order.objects.filter(user=1).order_by("pk"), many=True).data
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user_order"], json.loads(json.dumps(expected_data, cls=DjangoJSONEncoder)))
+
+        with self.assertNumQueries(1):  # только проверка существования пользователя
+            cached_response = self.client.get(url)
+        self.assertEqual(cached_response.json(), response.json())
+
+    def test_export_unknown_user(self) -> None:
+        """Тест: 404 для несуществующего пользователя"""
+        response = self.client.get(reverse("shopapp:user_ordes_export", kwargs={"user_id": 100500}))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ReplicaRoutingTestCase(TestCase):
+    """Класс тестирования маршрутизации чтения на реплику"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="ReplicaReader", password="ReplicaPassword")
+        Product.objects.create(name="Replica product", price=10)
+
+    def setUp(self) -> None:
+        """Роутер записывает, куда отправил бы чтение, но читает из default (реплики в тестах нет)"""
+        self.client.force_login(self.user)
+        self.routes = []
+        route = PrimaryReplicaRouter.db_for_read
+
+        self.replica = {REPLICA_DATABASE: {}}
+
+        def record_route(router, model, **hints):
+            with mock.patch.dict(settings.DATABASES, self.replica):
+                self.routes.append((model._meta.app_label, route(router, model, **hints)))
+            return None
+
+        patcher = mock.patch.object(PrimaryReplicaRouter, "db_for_read", record_route)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def routed(self, app_label: str) -> set:
+        return {alias for label, alias in self.routes if label == app_label}
+
+    def test_list_view_reads_from_replica(self) -> None:
+        """Тест: список продуктов читает продукты с реплики, пользователя и права - с primary"""
+        response = self.client.get(reverse("shopapp:products_list"))
+
+        self.assertContains(response, "Replica product")
+        self.assertEqual(self.routed("shopapp"), {REPLICA_DATABASE})
+        self.assertEqual(self.routed("auth"), {None})
+        self.assertEqual(PrimaryReplicaRouter().db_for_write(Product), "default")
+
+    def test_async_export_reads_from_replica(self) -> None:
+        """Тест: асинхронная выгрузка продуктов читает с реплики"""
+        cache.delete("products_data_export")
+        self.addCleanup(cache.delete, "products_data_export")
+        response = self.client.get(reverse("shopapp:products-export"))
+
+        self.assertContains(response, "Replica product")
+        self.assertEqual(self.routed("shopapp"), {REPLICA_DATABASE})
+
+    def test_other_views_read_from_primary(self) -> None:
+        """Тест: view без read_from_replica читают с primary"""
+        self.client.get(reverse("shopapp:index"))
+        self.client.get(reverse("shopapp:create_product"))
+
+        self.assertEqual({alias for _, alias in self.routes}, {None})
+
+    def test_pin_to_primary_after_write(self) -> None:
+        """Тест: после POST клиент закрепляется за primary на REPLICA_PIN_SECONDS"""
+        post_response = self.client.post(reverse("shopapp:create_product"), {})
+        self.assertEqual(post_response.cookies[REPLICA_PIN_COOKIE]["max-age"], settings.REPLICA_PIN_SECONDS)
+
+        self.routes.clear()
+        self.client.get(reverse("shopapp:products_list"))
+        self.assertEqual(self.routed("shopapp"), {None})
+
+    def test_without_replica(self) -> None:
+        """Тест: без настроенной реплики все чтения идут в default"""
+        self.replica = {}
+        self.client.get(reverse("shopapp:products_list"))
+
+        self.assertEqual(self.routed("shopapp"), {None})
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class ProductThumbnailsTestCase(TestCase):
+    """Класс тестирования генерации миниатюр"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Временная папка для медиа файлов и пользователь"""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+        cls.user = User.objects.create_user(username="ThumbnailsUser", password="ThumbnailsPassword")
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Удаление временной папки"""
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @staticmethod
+    def make_image(name: str, size=(1200, 800)) -> SimpleUploadedFile:
+        """Генерирует PNG изображение"""
+        buffer = BytesIO()
+        Image.new("RGB", size, color=(200, 30, 30)).save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def test_generate_thumbnails(self) -> None:
+        """Тест: для превью и галереи строятся все размеры и форматы с сохранением пропорций"""
+        product = Product.objects.create(name="Thumbnail product", preview=self.make_image("preview.png"))
+        ProductImage.objects.create(product=product, image=self.make_image("gallery.png", size=(300, 600)))
+
+        created = generate_thumbnails(product.pk)
+
+        expected = 2 * len(THUMBNAIL_SIZES) * len(THUMBNAIL_FORMATS)
+        self.assertEqual(created, expected)
+        small = ProductThumbnail.objects.get(product=product, product_image=None, size="small", format="webp")
+        self.assertEqual((small.width, small.height), (160, 107))
+        self.assertTrue(small.image.name.startswith(f"products/product_{product.pk}/thumbnails/"))
+
+        self.assertEqual(generate_thumbnails(product.pk), 0)  # повторный запуск ничего не строит
+
+    def test_thumbnail_unique_per_source(self) -> None:
+        """Тест: одна миниатюра на оригинал, размер и формат, в том числе для превью (product_image пустой)"""
+        product = Product.objects.create(name="Unique thumbnail", preview=self.make_image("unique.png"))
+        generate_thumbnails(product.pk)
+        small = ProductThumbnail.objects.get(product=product, product_image=None, size="small", format="webp")
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ProductThumbnail.objects.create(product=product, size="small", format="webp", image=small.image.name)
+
+    def test_detail_page_uses_thumbnails(self) -> None:
+        """Тест: страница продукта отдает миниатюру вместо оригинала"""
+        product = Product.objects.create(name="Thumbnail page", preview=self.make_image("page.png"))
+        generate_thumbnails(product.pk)
+        large = ProductThumbnail.objects.get(product=product, product_image=None, size="large", format="jpeg")
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("shopapp:product_details", kwargs={"pk": product.pk}))
+
+        self.assertContains(response, large.image.url)
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_thumbnail_files_released(self) -> None:
+        """Тест: файлы миниатюр удаляются вместе с изображением галереи и при замене превью"""
+        product = Product.objects.create(name="Thumbnail files", preview=self.make_image("first.png", size=(640, 480)))
+        image = ProductImage.objects.create(product=product, image=self.make_image("gallery.png", size=(500, 500)))
+        generate_thumbnails(product.pk)
+
+        gallery_paths = [thumbnail.image.path for thumbnail in ProductThumbnail.objects.filter(product_image=image)]
+        preview_paths = [thumbnail.image.path for thumbnail in ProductThumbnail.objects.filter(product=product,
+                                                                                               product_image=None)]
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(any(os.path.exists(path) for path in gallery_paths))
+
+        product.preview = self.make_image("second.png", size=(480, 640))
+        product.save()
+        with self.captureOnCommitCallbacks(execute=True):  # замененные файлы освобождаются после коммита
+            generate_thumbnails(product.pk)
+        self.assertFalse(any(os.path.exists(path) for path in preview_paths))
+
+        product.preview = None
+        product.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_thumbnails(product.pk)
+        self.assertFalse(ProductThumbnail.objects.filter(product=product).exists())
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    """Класс тестирования хранения изображений по хэшу содержимого"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Временная папка для медиа файлов"""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Удаление временной папки"""
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_preview_path_does_not_depend_on_pk(self) -> None:
+        """Тест: превью нового продукта не попадает в products/product_None/"""
+        content = b"preview-content"
+        product = Product.objects.create(name="Preview path", preview=SimpleUploadedFile("photo.JPG", content))
+        digest = hashlib.sha256(content).hexdigest()
+
+        self.assertEqual(product.preview.name, f"products/preview/{digest[:2]}/{digest[2:4]}/{digest}.jpg")
+        self.assertTrue(os.path.exists(product.preview.path))
+
+    def test_duplicates_stored_once(self) -> None:
+        """Тест: одинаковые файлы хранятся один раз и удаляются вместе с последней ссылкой"""
+        product = Product.objects.create(name="Duplicate images")
+        first = ProductImage.objects.create(product=product, image=SimpleUploadedFile("a.png", b"same-bytes"))
+        second = ProductImage.objects.create(product=product, image=SimpleUploadedFile("b.png", b"same-bytes"))
+        path = first.image.path
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(content_addressed_storage.references(first.image.name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+
+    def test_file_kept_on_rollback(self) -> None:
+        """Тест: файл удаляется только после коммита, при откате остается вместе с записью"""
+        product = Product.objects.create(name="Rollback image")
+        image = ProductImage.objects.create(product=product, image=SimpleUploadedFile("a.png", b"rollback-bytes"))
+        pk, path = image.pk, image.image.path
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    image.delete()
+                    raise DatabaseError("rollback")
+            except DatabaseError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertTrue(ProductImage.objects.filter(pk=pk).exists())
+        self.assertTrue(os.path.exists(path))
+
+    def test_replaced_file_released(self) -> None:
+        """Тест: замененное превью удаляется после коммита, если на него больше никто не ссылается"""
+        product = Product.objects.create(name="Replaced preview", preview=SimpleUploadedFile("a.png", b"old-preview"))
+        old_path = product.preview.path
+
+        product = Product.objects.get(pk=product.pk)
+        product.preview = SimpleUploadedFile("b.png", b"new-preview")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(product.preview.path))
+
+    def test_duplicate_restored_after_concurrent_delete(self) -> None:
+        """Тест: файл дубликата, удаленный параллельным запросом до коммита, записывается заново"""
+        product = Product.objects.create(name="Concurrent delete")
+        first = ProductImage.objects.create(product=product, image=SimpleUploadedFile("a.png", b"shared-bytes"))
+        path = first.image.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second = ProductImage.objects.create(product=product, image=SimpleUploadedFile("b.png", b"shared-bytes"))
+            os.remove(path)  # другой запрос не видел second и удалил файл
+
+        self.assertEqual(second.image.path, path)
+        with open(path, "rb") as file:
+            self.assertEqual(file.read(), b"shared-bytes")
+
+    def test_relocate_media(self) -> None:
+        """Тест: relocate_media переносит старые файлы под имена-хэши и удаляет файлы без ссылок"""
+        product = Product.objects.create(name="Legacy images")
+        legacy = [ProductImage.objects.create(product=product, image=SimpleUploadedFile(f"{name}.png", b"x"))
+                  for name in ("first", "second")]
+        for image, name in zip(legacy, ("products/legacy/first.png", "products/legacy/second.png")):
+            FileSystemStorage(location=settings.MEDIA_ROOT).save(name, ContentFile(b"legacy-bytes"))
+            ProductImage.objects.filter(pk=image.pk).update(image=name)
+        orphan = content_addressed_storage.save("products/orphan.png", ContentFile(b"orphan-bytes"))
+
+        call_command("relocate_media", "--prune", stdout=StringIO())
+
+        names = set(ProductImage.objects.filter(product=product).values_list("image", flat=True))
+        digest = hashlib.sha256(b"legacy-bytes").hexdigest()
+        self.assertEqual(names, {f"products/images/{digest[:2]}/{digest[2:4]}/{digest}.png"})
+        self.assertTrue(content_addressed_storage.exists(names.pop()))
+        self.assertFalse(content_addressed_storage.exists("products/legacy/first.png"))
+        self.assertFalse(content_addressed_storage.exists("products/legacy/second.png"))
+        self.assertFalse(content_addressed_storage.exists(orphan))
+
+
+class ProductImagesUploadTestCase(TestCase):
+    """Класс тестирования пакетной загрузки изображений галереи"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Временная папка для медиа файлов и суперпользователь"""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+        cls.user = User.objects.create_superuser(username="ImagesUploadUser", password="ImagesUploadPassword")
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Удаление временной папки"""
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        self.url = reverse("shopapp:create_product")
+
+    @staticmethod
+    def make_image(name: str, color=(10, 120, 200)) -> SimpleUploadedFile:
+        """Генерирует PNG изображение"""
+        buffer = BytesIO()
+        Image.new("RGB", (40, 40), color=color).save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def product_data(self, name: str, images) -> dict:
+        return {
+            "name": name,
+            "price": 100,
+            "description": "A great product",
+            "discount": 0,
+            "images": images,
+        }
+
+    def test_images_inserted_in_one_query(self) -> None:
+        """Тест: все изображения галереи сохраняются одним bulk_create"""
+        images = [self.make_image(f"gallery_{number}.png", color=(number, 0, 0)) for number in range(5)]
+
+        bulk_create = ProductImage.objects.bulk_create
+        with mock.patch.object(ProductImage.objects, "bulk_create", wraps=bulk_create) as bulk_create_mock, \
+                mock.patch.object(ProductImage, "save") as save_mock:
+            response = self.client.post(self.url, self.product_data("Bulk images", images))
+
+        self.assertRedirects(response, reverse("shopapp:products_list"))
+        product = Product.objects.get(name="Bulk images")
+        self.assertEqual(product.images.count(), 5)
+        bulk_create_mock.assert_called_once()
+        save_mock.assert_not_called()  # построчных INSERT нет
+
+    def test_invalid_files_reported_per_file(self) -> None:
+        """Тест: ошибка выводится по каждому невалидному файлу, продукт не создается"""
+        images = [
+            self.make_image("good.png"),
+            SimpleUploadedFile("broken.png", b"not an image", content_type="image/png"),
+            SimpleUploadedFile("notes.png", b"still not an image", content_type="image/png"),
+        ]
+
+        response = self.client.post(self.url, self.product_data("Broken images", images))
+
+        self.assertEqual(response.status_code, 200)
+        errors = response.context["form"].errors["images"]
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(errors[0].startswith("broken.png: "))
+        self.assertTrue(errors[1].startswith("notes.png: "))
+        self.assertFalse(Product.objects.filter(name="Broken images").exists())
+
+    def test_storage_error_rolls_back_product(self) -> None:
+        """Тест: если файл не удалось записать, продукт и изображения откатываются"""
+        from shopapp import images as images_module
+
+        store_image = images_module.store_image
+
+        def failing_store(product, upload):
+            if upload.name == "fail.png":
+                raise OSError(28, "No space left on device")
+            return store_image(product, upload)
+
+        images = [self.make_image("ok.png", color=(4, 5, 6)), self.make_image("fail.png", color=(1, 2, 3))]
+        digest = hashlib.sha256(images[0].read()).hexdigest()
+        images[0].seek(0)
+        with mock.patch.object(images_module, "store_image", failing_store):
+            response = self.client.post(self.url, self.product_data("Storage error", images))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("fail.png", response.context["form"].errors["images"][0])
+        self.assertFalse(Product.objects.filter(name="Storage error").exists())
+        self.assertFalse(ProductImage.objects.exists())
+        # записанный до отката ok.png освобожден
+        self.assertFalse(content_addressed_storage.exists(f"products/images/{digest[:2]}/{digest[2:4]}/{digest}.png"))
+
+
+    def test_storage_error_releases_new_preview(self) -> None:
+        """Тест: при откате новое превью освобождается, прежнее превью продукта остается"""
+        product = Product.objects.create(name="Preview rollback", preview=self.make_image("old.png", color=(7, 7, 7)))
+        old_path = product.preview.path
+        preview = self.make_image("new.png", color=(8, 8, 8))
+        digest = hashlib.sha256(preview.read()).hexdigest()
+        preview.seek(0)
+
+        data = self.product_data("Preview rollback", [self.make_image("gallery.png", color=(9, 9, 9))])
+        data["preview"] = preview
+        with mock.patch("shopapp.images.store_image", side_effect=OSError(28, "No space left on device")):
+            response = self.client.post(reverse("shopapp:product_update", kwargs={"pk": product.pk}), data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(content_addressed_storage.exists(f"products/preview/{digest[:2]}/{digest[2:4]}/{digest}.png"))
+        self.assertTrue(os.path.exists(old_path))
+        self.assertEqual(Product.objects.get(pk=product.pk).preview.path, old_path)
+
+class CSVImportUploadTestCase(TestCase):
+    """Класс тестирования потокового импорта CSV"""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(username="CSVImportAdmin", password="CSVImportPassword")
+
+    def setUp(self) -> None:
+        self.client.force_login(self.admin)
+
+    @staticmethod
+    def csv_file(content: str, encoding: str = "utf-8") -> SimpleUploadedFile:
+        return SimpleUploadedFile("import.csv", content.encode(encoding), content_type="text/csv")
+
+    def test_api_imports_products_in_batches(self) -> None:
+        """Тест: строки (в том числе многострочные) сохраняются пачками во время загрузки"""
+        rows = "".join(f'"Product {number}","great\nline {number}",{number + 1},0\r\n' for number in range(5))
+        content = "name,description,price,discount\r\n" + rows
+
+        bulk_create = Product.objects.bulk_create
+        with mock.patch("shopapp.common.CSVImporter.batch_size", 2), \
+                mock.patch.object(Product.objects, "bulk_create", wraps=bulk_create) as bulk_create_mock:
+            response = self.client.post(reverse("shopapp:product-upload-csv"), {"csv_file": self.csv_file(content)})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {"created": 5, "failed": 0, "errors": []})
+        self.assertEqual(bulk_create_mock.call_count, 3)
+        self.assertEqual(Product.objects.get(name="Product 3").description, "great\nline 3")
+
+    def test_invalid_header_aborts_upload_early(self) -> None:
+        """Тест: неизвестная колонка прерывает загрузку на первом куске файла"""
+        content = "name,colour\r\n" + "Product,red\r\n" * 20000  # несколько кусков по 64 КБ
+
+        receive = CSVImportUploadHandler.receive_data_chunk
+        with mock.patch.object(CSVImportUploadHandler, "receive_data_chunk",
+                               autospec=True, side_effect=receive) as receive_mock:
+            response = self.client.post(reverse("shopapp:product-upload-csv"), {"csv_file": self.csv_file(content)})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("colour", response.json()["details"]["csv_file"][0])
+        self.assertEqual(receive_mock.call_count, 1)
+        self.assertFalse(Product.objects.exists())
+
+    def test_non_utf8_file_rejected(self) -> None:
+        """Тест: файл не в UTF-8 отклоняется"""
+        content = "name,description\r\nТовар,Описание\r\n"
+
+        response = self.client.post(reverse("shopapp:product-upload-csv"),
+                                    {"csv_file": self.csv_file(content, encoding="cp1251")})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("UTF-8", response.json()["details"]["csv_file"][0])
+
+    def test_admin_order_import(self) -> None:
+        """Тест: импорт заказов из админки, колонка user_id обязательна"""
+        url = reverse("admin:import_orders_csv")
+
+        response = self.client.post(url, {"csv_file": self.csv_file("delivery_adress,promocode\r\nStreet,\r\n")})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("user_id", response.context["form"].errors["csv_file"][0])
+
+        content = f'delivery_adress,promocode,user_id\r\n"Street, 1",SUMMER,{self.admin.pk}\r\n'
+        response = self.client.post(url, {"csv_file": self.csv_file(content)})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.get().delivery_adress, "Street, 1")
+
+    def test_api_reports_failed_rows(self) -> None:
+        """Тест: в ответе счетчики и пример ошибки, а не сохраненные объекты"""
+        content = "name,price\r\nGood,1\r\nBad,not a price\r\nAlso good,2\r\n"
+
+        response = self.client.post(reverse("shopapp:product-upload-csv"), {"csv_file": self.csv_file(content)})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        summary = response.json()
+        self.assertEqual((summary["created"], summary["failed"]), (2, 1))
+        self.assertTrue(summary["errors"][0].startswith("Row 2:"))
+        self.assertEqual(Product.objects.filter(name__in=["Good", "Also good"]).count(), 2)
+
+    def test_api_error_reports_imported_rows(self) -> None:
+        """Тест: при ошибке посреди файла в ответе кол-во уже сохраненных строк"""
+        content = ("name,description\r\n" + "Product,great\r\n" * 10000).encode() + b"Broken,\xff\xfe\r\n"
+
+        with mock.patch("shopapp.common.CSVImporter.batch_size", 100):
+            response = self.client.post(reverse("shopapp:product-upload-csv"),
+                                        {"csv_file": SimpleUploadedFile("import.csv", content, content_type="text/csv")})
+
+        self.assertEqual(response.status_code, 400)
+        created = response.json()["created"]
+        self.assertEqual(Product.objects.count(), created)
+        self.assertGreater(created, 0)
+        self.assertIn(f"rows imported before the error: {created}", response.json()["details"]["csv_file"][0])
+
+    def test_admin_import_checks_csrf_before_reading_body(self) -> None:
+        """Тест: токен только в теле не принимается и файл не читается, форма админки передает его в URL"""
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.admin)
+        page = client.get(reverse("admin:import_products_csv"))  # получаем CSRF cookie и форму
+        token = client.cookies[settings.CSRF_COOKIE_NAME].value
+
+        receive = CSVImportUploadHandler.receive_data_chunk
+        with mock.patch.object(CSVImportUploadHandler, "receive_data_chunk",
+                               autospec=True, side_effect=receive) as receive_mock:
+            response = client.post(reverse("admin:import_products_csv"),
+                                   {"csrfmiddlewaretoken": token,
+                                    "csv_file": self.csv_file("name,description\r\nCSRF product,great\r\n")})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(receive_mock.called)
+        self.assertFalse(Product.objects.filter(name="CSRF product").exists())
+
+        action = re.search(r'<form action="([^"]+)"', page.content.decode()).group(1)
+        response = client.post(reverse("admin:import_products_csv") + html.unescape(action)[1:],
+                               {"csv_file": self.csv_file("name,description\r\nCSRF product,great\r\n")})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Product.objects.filter(name="CSRF product").exists())
+
+        response = client.post(reverse("admin:import_products_csv"),
+                               {"csv_file": self.csv_file("name,description\r\nHeader product,great\r\n")},
+                               headers={"X-CSRFToken": token})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Product.objects.filter(name="Header product").exists())
+
+    def test_admin_import_requires_add_permission(self) -> None:
+        """Тест: сотрудник без права добавления получает 403 до чтения файла"""
+        staff = User.objects.create_user(username="CSVImportStaff", password="CSVImportPassword", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename="view_product"))
+        self.client.force_login(staff)
+
+        response = self.client.post(reverse("admin:import_products_csv"),
+                                    {"csv_file": self.csv_file("name,description\r\nStaff product,great\r\n")})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Product.objects.filter(name="Staff product").exists())
+
+
+@override_settings(SHOP_RECOMMENDATIONS_ASYNC=False)
+class ProductRecommendationsTestCase(TestCase):
+    """Класс тестирования рекомендаций «часто покупают вместе»"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="RecommendationsUser", password="RecommendationsPassword")
+        cls.phone, cls.case, cls.charger, cls.cable, cls.old = (
+            Product.objects.create(name=name, price=10) for name in ("Phone", "Case", "Charger", "Cable", "Old case")
+        )
+        Product.objects.filter(pk=cls.old.pk).update(archived=True)
+
+        for products in ([cls.phone, cls.case, cls.charger],
+                         [cls.phone, cls.case],
+                         [cls.phone, cls.charger, cls.old],
+                         [cls.phone, cls.case, cls.old],
+                         [cls.cable]):
+            order = Order.objects.create(user=cls.user)
+            order.products.set(products)
+
+    def setUp(self) -> None:
+        rebuild_recommendations(chunk_lines=2)  # маленькие пачки: заказы не должны разрываться
+
+    def recommended(self, product: Product) -> list:
+        return list(ProductRecommendation.objects.filter(product=product).values_list("recommended__name", "count"))
+
+    def test_rebuild_counts_pairs(self) -> None:
+        """Тест: соседи отсортированы по кол-ву общих заказов, продукт без пар без рекомендаций"""
+        self.assertEqual(self.recommended(self.phone), [("Case", 3), ("Charger", 2), ("Old case", 2)])
+        self.assertEqual(self.recommended(self.charger), [("Phone", 2), ("Case", 1), ("Old case", 1)])
+        self.assertEqual(self.recommended(self.cable), [])
+
+    def test_matrix_matches_brute_force(self) -> None:
+        """Тест: матрица по пачкам совпадает с подсчетом пар в лоб"""
+        rng = random.Random(1)
+        orders = [rng.sample(range(1, 30), rng.randint(1, 6)) for _ in range(200)]
+
+        expected = {}
+        for products in orders:
+            for left in products:
+                for right in products:
+                    if left != right:
+                        expected[(left, right)] = expected.get((left, right), 0) + 1
+
+        matrix = CooccurrenceMatrix()
+        for start in range(0, len(orders), 37):
+            chunk = orders[start:start + 37]
+            order_ids = np.array([start + index for index, products in enumerate(chunk) for _ in products])
+            matrix.add(order_ids, np.array([product for products in chunk for product in products]))
+
+        pairs = {(int(key) >> 32, int(key) & 0xFFFFFFFF): int(count) for key, count in zip(matrix.keys, matrix.counts)}
+        self.assertEqual(pairs, expected)
+
+        products, others, counts, ranks = matrix.top(3)
+        best = sorted(((other, count) for (left, other), count in expected.items() if left == products[0]),
+                      key=lambda item: (-item[1], item[0]))[:3]
+        self.assertEqual(list(zip(others[:3].tolist(), counts[:3].tolist())), best)
+        self.assertEqual(ranks[:3].tolist(), [1, 2, 3])
+
+    def test_new_order_updates_incrementally(self) -> None:
+        """Тест: после коммита нового заказа пересчитываются только его продукты"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                order = Order.objects.create(user=self.user)
+                order.products.set([self.cable, self.charger])
+
+        self.assertEqual(self.recommended(self.cable), [("Charger", 3)])
+        self.assertEqual(self.recommended(self.charger)[0], ("Cable", 3))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self.recommended(self.cable), [("Charger", 2)])
+
+    def test_update_matches_rebuild(self) -> None:
+        """Тест: пересчет списков продуктов одним запросом совпадает с полным пересчетом"""
+        products = [self.phone, self.case, self.charger, self.cable, self.old]
+        expected = {product.pk: self.recommended(product) for product in products}
+        ProductRecommendation.objects.all().delete()
+
+        with self.assertNumQueries(5):  # пары, savepoint, удаление, вставка, release
+            update_recommendations([product.pk for product in products], count=2)
+        self.assertEqual({product.pk: self.recommended(product) for product in products},
+                         {pk: rows[:2] for pk, rows in expected.items()})
+
+    def test_one_update_per_transaction(self) -> None:
+        """Тест: несколько заказов в транзакции - одна задача в фоновом потоке после коммита"""
+        with self.settings(SHOP_RECOMMENDATIONS_ASYNC=True), \
+                mock.patch("shopapp.recommendations._executor") as executor_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                for products in ([self.cable, self.charger], [self.cable, self.case]):
+                    Order.objects.create(user=self.user).products.set(products)
+            self.assertEqual(self.recommended(self.cable), [])  # запрос не ждет пересчета
+
+        executor_mock.submit.assert_called_once()
+        self.assertLessEqual({self.cable.pk, self.charger.pk, self.case.pk}, executor_mock.submit.call_args.args[1])
+
+    def test_detail_page_and_api(self) -> None:
+        """Тест: страница продукта и API отдают рекомендации без архивных продуктов"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("shopapp:product_details", kwargs={"pk": self.phone.pk}))
+        self.assertContains(response, "Frequently Bought Together")
+        self.assertContains(response, "Charger")
+        self.assertNotContains(response, "Old case")
+
+        data = self.client.get(reverse("shopapp:product-bought-together", kwargs={"pk": self.phone.pk})).json()
+        self.assertEqual([(item["product"]["name"], item["count"]) for item in data], [("Case", 3), ("Charger", 2)])
+
+    def test_command_benchmark(self) -> None:
+        """Тест: замер на синтетических строках не трогает БД"""
+        out = StringIO()
+        call_command("build_recommendations", benchmark=5000, products=100, chunk_lines=1000, stdout=out)
+        self.assertIn("Pairs:", out.getvalue())
+        self.assertEqual(ProductRecommendation.objects.filter(product=self.phone).count(), 3)
+
+
+class AdminChangelistQueriesTestCase(TestCase):
+    """Класс тестирования кол-ва запросов списков продуктов и заказов в админке"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(username="ChangelistAdmin", password="ChangelistPassword")
+
+    def setUp(self) -> None:
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count: int) -> None:
+        for number in range(count):
+            user = User.objects.create_user(username=f"changelist-user-{Product.objects.count()}")
+            product = Product.objects.create(name=f"Changelist product {number}", created_by=user)
+            order = Order.objects.create(user=user, delivery_adress="Street")
+            order.products.add(product)
+
+    def assert_queries_per_page(self, url: str) -> None:
+        """Кол-во запросов не зависит от кол-ва строк на странице"""
+        self.create_rows(2)
+        self.client.get(url)
+        # пользователь (сессия из кэша), статистика таблицы, COUNT, строки страницы с JOIN пользователя
+        with self.assertNumQueries(4):
+            self.client.get(url)
+        self.create_rows(10)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_changelist(self) -> None:
+        """Тест: создатель продукта подгружается JOIN'ом, полный COUNT(*) не выполняется"""
+        self.assert_queries_per_page(reverse("admin:shopapp_product_changelist"))
+
+    def test_order_changelist(self) -> None:
+        """Тест: пользователь заказа подгружается JOIN'ом, продукты не загружаются"""
+        self.assert_queries_per_page(reverse("admin:shopapp_order_changelist"))
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+    def test_estimated_count_from_statistics(self) -> None:
+        """Тест: без фильтров кол-во из статистики ANALYZE, с фильтром - точное"""
+        self.create_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Product.objects.filter(name="Changelist product 0").delete()
+
+        self.assertEqual(EstimatedCountPaginator(Product.all_objects.all(), 10).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Product.all_objects.filter(archived=False), 10).count, 2)
+
+        with override_settings(ESTIMATED_COUNT_THRESHOLD=100):
+            self.assertEqual(EstimatedCountPaginator(Product.all_objects.all(), 10).count, 2)
+
+
+    def test_estimated_count_ignores_partial_indexes(self) -> None:
+        """Тест: статистика частичных индексов product_active_* не занижает оценку"""
+        self.create_rows(4)
+        Product.all_objects.exclude(name="Changelist product 3").update(archived=True)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = %s", [Product._meta.db_table])
+            stats = dict(cursor.fetchall())
+
+        self.assertEqual(stats["product_active_created_at"].split()[0], "1")
+        self.assertEqual(estimated_count(Product), 4)
+
+
+@override_settings(BULK_ACTIONS_ASYNC=False)
+class BulkActionsTestCase(TestCase):
+    """Класс тестирования массовых действий пачками"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(username="BulkAdmin", password="BulkPassword")
+        cls.products = [Product.objects.create(name=f"Bulk product {number}", price=100) for number in range(5)]
+
+    def prices(self) -> list:
+        return [float(price) for price in Product.all_objects.order_by("pk").values_list("price", flat=True)]
+
+    def test_chunks_and_progress(self) -> None:
+        """Тест: выборка обрабатывается пачками, прогресс сохраняется после каждой"""
+        job = create_job("archive", queryset=Product.objects.all())
+        progress = []
+        run_job(job, chunk_size=2, progress=lambda current: progress.append(current.processed))
+
+        self.assertEqual(progress, [2, 4, 5])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.progress), (BulkJob.STATUS_DONE, 5, 100))
+        self.assertFalse(Product.objects.filter(archived=False).exists())
+
+    def test_resume_after_failure_applies_each_chunk_once(self) -> None:
+        """Тест: после ошибки задание продолжается с последнего pk, цены не меняются дважды"""
+        job = create_job("change_price", queryset=Product.objects.all(), params={"percent": "10"})
+        action = BULK_ACTIONS["change_price"]
+        apply = action.apply
+        calls = []
+
+        def failing_apply(queryset, **params):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("interrupted")
+            return apply(queryset, **params)
+
+        with mock.patch.object(action, "apply", failing_apply):
+            with self.assertRaises(RuntimeError):
+                run_job(job, chunk_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.error), (BulkJob.STATUS_FAILED, 2, "interrupted"))
+        self.assertEqual(self.prices(), [110, 110, 100, 100, 100])
+
+        run_job(job, chunk_size=2)
+        self.assertEqual(self.prices(), [110] * 5)
+        self.assertEqual(BulkJob.objects.get(pk=job.pk).status, BulkJob.STATUS_DONE)
+
+    def test_running_job_not_claimed_twice(self) -> None:
+        """Тест: задание, которое выполняет другой процесс, не запускается повторно"""
+        job = create_job("archive", queryset=Product.objects.all())
+        BulkJob.objects.filter(pk=job.pk).update(status=BulkJob.STATUS_RUNNING)
+
+        run_job(job)
+        self.assertEqual(BulkJob.objects.get(pk=job.pk).processed, 0)
+
+    def test_admin_actions(self) -> None:
+        """Тест: архивирование сразу, изменение цены через промежуточную форму"""
+        self.client.force_login(self.admin)
+        url = reverse("admin:shopapp_product_changelist")
+        selected = [product.pk for product in self.products[:2]]
+
+        self.client.post(url, {"action": "bulk_archive", "_selected_action": selected})
+        self.assertEqual(Product.all_objects.filter(archived=True).count(), 2)
+
+        response = self.client.post(url, {"action": "bulk_change_price", "_selected_action": selected})
+        self.assertContains(response, 'name="percent"')
+        self.assertEqual(self.prices()[0], 100)
+
+        self.client.post(url, {"action": "bulk_change_price", "_selected_action": selected,
+                               "percent": "-15", "apply": "Apply"})
+        self.assertEqual(self.prices(), [85, 85, 100, 100, 100])
+
+    def test_admin_select_across_stores_filters(self) -> None:
+        """Тест: "выбрать все" сохраняет условие поиска списка вместо pk, отмеченные вручную - списком pk"""
+        self.client.force_login(self.admin)
+        url = reverse("admin:shopapp_product_changelist")
+
+        self.client.post(f"{url}?q=product+3", {"action": "bulk_archive", "select_across": "1",
+                                                "_selected_action": [self.products[3].pk]})
+        job = BulkJob.objects.get()
+        self.assertIsNone(job.ids)
+        self.assertEqual(job.filters, {"search": {"term": "product 3", "fields": ["name", "description"]}})
+        self.assertEqual(list(Product.all_objects.filter(archived=True).values_list("name", flat=True)),
+                         ["Bulk product 3"])
+
+        self.client.post(url, {"action": "bulk_unarchive", "select_across": "1",
+                               "_selected_action": [self.products[0].pk]})
+        job = BulkJob.objects.get(action="unarchive")
+        self.assertEqual((job.ids, job.filters, job.total), (None, {}, 5))
+        self.assertFalse(Product.all_objects.filter(archived=True).exists())
+
+        self.client.post(url, {"action": "bulk_archive", "_selected_action": [self.products[1].pk]})
+        self.assertEqual(BulkJob.objects.filter(action="archive").latest("pk").ids, [self.products[1].pk])
+
+    def test_command_run_and_resume(self) -> None:
+        """Тест: команда запускает задание по фильтру и продолжает прерванные"""
+        out = StringIO()
+        call_command("bulk_actions", "run", "set_discount", "--filter", "name__endswith=3",
+                     "--param", "discount=10", stdout=out)
+        self.assertEqual(list(Product.objects.filter(discount=10).values_list("name", flat=True)), ["Bulk product 3"])
+
+        job = create_job("set_discount", queryset=Product.objects.all(), params={"discount": 5})
+        BulkJob.objects.filter(pk=job.pk).update(processed=1, last_id=self.products[0].pk)
+        call_command("bulk_actions", "resume", stdout=out)
+        self.assertEqual(Product.objects.filter(discount=5).count(), 4)
+        self.assertIn(f"Job #{job.pk} done", out.getvalue())
+
+
+class ProductFinalPriceTestCase(TestCase):
+    """Класс тестирования хранимой цены со скидкой и истории цен"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="PriceUser", password="PricePassword")
+
+    def history(self, product: Product) -> list:
+        return [(float(price), discount, float(final_price)) for price, discount, final_price in
+                product.price_history.values_list("price", "discount", "final_price")]
+
+    def test_save_maintains_final_price_and_history(self) -> None:
+        """Тест: цена со скидкой считается при сохранении, история пишется только при изменении цены"""
+        product = Product.objects.create(name="Priced", price=99, discount=15)
+        self.assertEqual(product.final_price, Decimal("84.15"))
+        self.assertEqual(product.get_discount_amount(), Decimal("14.85"))
+
+        product = Product.objects.get(pk=product.pk)
+        product.name = "Renamed"
+        product.save()
+        product.discount = 50
+        product.save(update_fields=["discount"])
+
+        product.refresh_from_db()
+        self.assertEqual(product.final_price, Decimal("49.50"))
+        self.assertEqual(self.history(product), [(99, 15, 84.15), (99, 50, 49.5)])
+
+    def test_bulk_update_and_create(self) -> None:
+        """Тест: update() и bulk_create() пересчитывают final_price в SQL и пишут историю пачкой"""
+        products = Product.objects.bulk_create([Product(name=f"Bulk price {number}", price="99", discount=number * 10)
+                                                for number in range(3)])
+        self.assertEqual([product.final_price for product in products],
+                         [Decimal("99.00"), Decimal("89.10"), Decimal("79.20")])
+
+        with self.assertNumQueries(6):  # savepoint, pk, UPDATE, новые цены, INSERT истории, release
+            Product.objects.filter(name__startswith="Bulk price").update(discount=15)
+
+        self.assertEqual(set(Product.objects.filter(name__startswith="Bulk price").values_list("final_price", flat=True)),
+                         {Decimal("84.15")})
+        self.assertEqual(ProductPriceHistory.objects.filter(product__in=products).count(), 6)
+
+    def test_price_range_filter_uses_column(self) -> None:
+        """Тест: фильтр API по диапазону цены со скидкой"""
+        Product.objects.create(name="Cheap", price=10)
+        Product.objects.create(name="Discounted", price=100, discount=60)
+        Product.objects.create(name="Expensive", price=100)
+
+        response = self.client.get(reverse("shopapp:product-list"),
+                                   {"final_price__gte": 20, "final_price__lte": 50, "ordering": "final_price"})
+        self.assertEqual([item["name"] for item in response.json()["results"]], ["Discounted"])
+        self.assertEqual(response.json()["results"][0]["final_price"], "40.00")
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProductUpdateViewQueriesTestCase(TestCase):
+    """Класс тестирования запросов редактирования продукта: объект один раз, права из кэша"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="UpdateQueriesUser", password="UpdateQueriesPassword")
+        cls.user.user_permissions.add(Permission.objects.get(codename="change_product"))
+        cls.product = Product.objects.create(name="Update queries product", created_by=cls.user)
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_object_loaded_once(self) -> None:
+        """Тест: test_func и UpdateView используют один объект, права повторно не загружаются"""
+        url = reverse("shopapp:product_update", kwargs={"pk": self.product.pk})
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        queries = [query["sql"] for query in context.captured_queries]
+        self.assertEqual(len([sql for sql in queries if sql.startswith('SELECT "shopapp_product"."id"')]), 1)
+        self.assertFalse([sql for sql in queries if "auth_permission" in sql])
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProductSoftDeleteTestCase(TestCase):
+    """Класс тестирования менеджеров продуктов: архивные продукты скрыты везде, кроме явного запроса"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="SoftDeleteUser", password="SoftDeletePassword")
+        cls.live = Product.objects.create(name="Live product", price=10)
+        cls.gone = Product.objects.create(name="Gone product", price=20)
+        cls.order = Order.objects.create(user=cls.user)
+        cls.order.products.set([cls.live, cls.gone])
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        self.client.post(reverse("shopapp:product_delete", kwargs={"pk": self.gone.pk}))
+
+    def test_managers(self) -> None:
+        """Тест: удаление переносит в архив, objects - активные, with_archived()/all_objects - все, связи заказа - все"""
+        self.assertTrue(Product.all_objects.get(pk=self.gone.pk).archived)
+        self.assertEqual(list(Product.objects.all()), [self.live])
+        self.assertEqual(set(Product.objects.with_archived()), {self.live, self.gone})
+        self.assertEqual(Product.all_objects.active().get(), self.live)
+        self.assertEqual(set(self.order.products.all()), {self.live, self.gone})
+
+    def test_views_hide_archived(self) -> None:
+        """Тест: детальная страница, API, лента и карта сайта не показывают архивный продукт"""
+        response = self.client.get(reverse("shopapp:product_details", kwargs={"pk": self.gone.pk}))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(reverse("shopapp:product-list"), {"search": "product"})
+        self.assertEqual([item["name"] for item in response.json()["results"]], ["Live product"])
+
+        response = self.client.get(reverse("shopapp:product-list"), {"archived": "true"})
+        self.assertEqual([item["name"] for item in response.json()["results"]], ["Gone product"])
+
+        for url in reverse("shopapp:products-feed"), reverse("django.contrib.sitemaps.views.sitemap"):
+            response = self.client.get(url)
+            self.assertContains(response, reverse("shopapp:product_details", kwargs={"pk": self.live.pk}))
+            self.assertNotContains(response, reverse("shopapp:product_details", kwargs={"pk": self.gone.pk}))
+
+
+@skipUnless(connection.vendor == "sqlite", "Планы запросов в формате EXPLAIN QUERY PLAN SQLite")
+class QueryPlanTestCase(TestCase):
+    """Класс тестирования планов горячих запросов магазина: индексы вместо полного просмотра и сортировки"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create_user(username="PlanUser", password="PlanPassword")
+        products = Product.objects.bulk_create([Product(name=f"Plan product {number}", price=number + 1,
+                                                        archived=number % 5 == 0) for number in range(50)])
+        for number in range(20):
+            Order.objects.create(user=cls.user, delivery_adress=f"Plan street {number}").products.add(*products[:3])
+
+    def assertUsesIndex(self, queryset, index: str) -> None:
+        """План использует index, без полного просмотра таблиц магазина и временного B-дерева для сортировки"""
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn("USE TEMP B-TREE", plan)
+        for line in plan.splitlines():
+            if "SCAN shopapp_" in line:
+                self.assertRegex(line, "USING (COVERING )?INDEX", plan)
+
+    def test_products_list(self) -> None:
+        """Тест: активные продукты в порядке (name, price) - индекс product_active_name_price"""
+        self.assertUsesIndex(ProductsListView.queryset, "product_active_name_price")
+
+    def test_latest_products_feed(self) -> None:
+        """Тест: новые активные продукты для ленты и карты сайта - индекс product_active_created_at"""
+        self.assertUsesIndex(LatestProductsFeed().items(), "product_active_created_at")
+
+    def test_user_orders(self) -> None:
+        """Тест: заказы пользователя от новых к старым - индекс order_user_created_at"""
+        view = UserOrdersListView()
+        view.owner = self.user
+        self.assertUsesIndex(view.get_queryset(), "order_user_created_at")
+
+    def test_orders_list(self) -> None:
+        """Тест: все заказы с пользователями в порядке по умолчанию - индекс order_created_at"""
+        self.assertUsesIndex(OrdersListView.queryset, "order_created_at")
+
+    def test_final_price_range(self) -> None:
+        """Тест: фильтр API по диапазону цены со скидкой с сортировкой по ней"""
+        self.assertUsesIndex(ProductViewSet.queryset.filter(final_price__gte=10, final_price__lte=20).order_by("final_price"),
+                             "shopapp_product_final_price")
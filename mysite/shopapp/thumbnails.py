@@ -0,0 +1,161 @@
+"""
+Генерация миниатюр для Product.preview и ProductImage.image.
+
+Миниатюры строятся в пуле фоновых потоков после коммита транзакции
+и описываются моделью ProductThumbnail (размеры хранятся в БД, одна запись на
+оригинал, размер и формат). Файлы миниатюр хранятся в ContentAddressedStorage
+под products/product_<pk>/thumbnails/<ab>/<cd>/<sha256>.<ext>: удаление записи
+(и каскадное вместе с изображением галереи) освобождает файл через
+mysite.storage.release_files, замена файла - через release_replaced_files.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePath
+from typing import Dict, Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+from .models import Product, ProductImage, ProductThumbnail
+
+log = logging.getLogger(__name__)
+
+
+# Максимальная сторона миниатюры в пикселях
+THUMBNAIL_SIZES: Dict[str, int] = {
+    "small": 160,
+    "medium": 480,
+    "large": 960,
+}
+
+# Формат -> (формат Pillow, расширение файла)
+THUMBNAIL_FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, "THUMBNAIL_WORKERS", 2),
+                               thread_name_prefix="thumbnails")
+
+
+def render_thumbnail(source: FieldFile, max_side: int, image_format: str) -> Tuple[ContentFile, Tuple[int, int]]:
+    """
+    Строит миниатюру с сохранением пропорций, не увеличивая маленькие изображения.
+
+    Returns:
+        Tuple: содержимое файла и размеры миниатюры (ширина, высота)
+    """
+    pillow_format, _ = THUMBNAIL_FORMATS[image_format]
+
+    with source.open("rb"):
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+            if image.mode not in ("RGB", "RGBA") or (pillow_format == "JPEG" and image.mode == "RGBA"):
+                image = image.convert("RGB")
+
+            buffer = BytesIO()
+            image.save(buffer, format=pillow_format, quality=82, optimize=True)
+
+    return ContentFile(buffer.getvalue()), image.size
+
+
+def generate_thumbnails(product_id: int) -> int:
+    """
+    Создает недостающие и устаревшие миниатюры для превью и галереи продукта.
+
+    Returns:
+        int: количество построенных миниатюр
+    """
+    product = Product.all_objects.prefetch_related("images", "thumbnails").get(pk=product_id)
+
+    sources = [(None, product.preview)]
+    sources.extend((image, image.image) for image in product.images.all())
+
+    existing = {
+        (thumbnail.product_image_id, thumbnail.size, thumbnail.format): thumbnail
+        for thumbnail in product.thumbnails.all()
+    }
+
+    created = 0
+    for product_image, source in sources:
+        if not source:
+            # превью убрали: его миниатюры удаляются, файлы освобождает release_files
+            image_id = product_image.pk if product_image else None
+            for key, thumbnail in existing.items():
+                if key[0] == image_id:
+                    thumbnail.delete()
+            continue
+
+        stem = PurePath(source.name).stem
+        for size, max_side in THUMBNAIL_SIZES.items():
+            for image_format, (_, extension) in THUMBNAIL_FORMATS.items():
+                image_id = product_image.pk if product_image else None
+                thumbnail = existing.get((image_id, size, image_format))
+
+                if thumbnail and thumbnail.source_name == source.name:
+                    continue  # миниатюра актуальна
+
+                # Параллельная генерация того же продукта обновит ту же запись (уникальность
+                # в Meta.constraints), прежний файл освобождает release_replaced_files
+                content, (width, height) = render_thumbnail(source, max_side, image_format)
+                content.name = f"{stem}_{size}{extension}"
+                ProductThumbnail.objects.update_or_create(product=product,
+                                                          product_image=product_image,
+                                                          size=size,
+                                                          format=image_format,
+                                                          defaults={"image": content,
+                                                                    "width": width,
+                                                                    "height": height,
+                                                                    "source_name": source.name})
+                created += 1
+
+    return created
+
+
+def _generate_in_background(product_id: int) -> None:
+    """Задача пула: у потока свое соединение с БД, закрываем его по завершении."""
+    try:
+        created = generate_thumbnails(product_id)
+        log.info("Generated %s thumbnails for product %s", created, product_id)
+    except Exception:
+        log.exception("Thumbnail generation failed for product %s", product_id)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnails(product_id: int) -> None:
+    """
+    Ставит генерацию миниатюр в фоновый пул после коммита текущей транзакции.
+
+    При THUMBNAILS_ASYNC = False генерирует сразу (тесты, команды).
+    """
+    if not getattr(settings, "THUMBNAILS_ASYNC", True):
+        generate_thumbnails(product_id)
+        return
+
+    transaction.on_commit(lambda: _executor.submit(_generate_in_background, product_id))
+
+
+def get_thumbnail(obj: Union[Product, ProductImage], size: str,
+                  image_format: str = "jpeg") -> Optional[ProductThumbnail]:
+    """
+    Ищет миниатюру продукта (превью) или изображения галереи.
+
+    Перебирает obj.thumbnails.all(), поэтому использует prefetch_related("thumbnails").
+    """
+    is_preview = isinstance(obj, Product)
+    source = obj.preview if is_preview else obj.image
+
+    for thumbnail in obj.thumbnails.all():
+        if is_preview and thumbnail.product_image_id is not None:
+            continue
+        if thumbnail.size == size and thumbnail.format == image_format and thumbnail.source_name == source.name:
+            return thumbnail
+
+    return None
@@ -0,0 +1,168 @@
+"""
+Обработчик загрузки CSV для импорта продуктов и заказов.
+
+Файл не складывается в память или во временный файл: кодировка и заголовки
+проверяются по первому куску, строки импортируются по мере поступления
+пачками в коротких транзакциях. При ошибке загрузка прерывается сразу,
+остаток тела запроса не читается, уже сохраненные пачки остаются - их кол-во
+сообщается в ответе с ошибкой.
+
+Поэтому права и CSRF проверяются до чтения тела: токен принимается из заголовка
+X-CSRFToken или из параметра csrfmiddlewaretoken в URL (форма в админке
+передает его в action), но не из самого тела.
+"""
+import codecs
+from io import BytesIO
+from typing import Optional, Type
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import models
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.views.decorators.csrf import csrf_protect
+from rest_framework import exceptions
+
+from .common import CSVImporter, CSVImportError
+
+
+class ImportedCSVFile(UploadedFile):
+    """Файл, строки которого уже импортированы. Содержимое не хранится."""
+
+    def __init__(self, name: str, content_type: str, size: int, importer: CSVImporter):
+        super().__init__(BytesIO(), name=name, content_type=content_type, size=size)
+        self.importer = importer
+
+
+class CSVImportUploadHandler(FileUploadHandler):
+    """
+    Потоковый импорт поля csv_file.
+
+    Ставится первым в request.upload_handlers до чтения request.POST / request.FILES,
+    остальные поля формы обрабатываются стандартными обработчиками.
+    """
+    field_name = "csv_file"
+
+    def __init__(self, request: HttpRequest, model: Type[models.Model]):
+        super().__init__(request)
+        self.importer = CSVImporter(model)
+        self.error: Optional[str] = None
+        self.active = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name == self.field_name
+        if self.active:
+            self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.feed(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+
+        self.feed(b"", final=True)
+        try:
+            self.importer.close()
+        except CSVImportError as e:
+            self.abort(str(e))
+
+        return ImportedCSVFile(name=self.file_name,
+                               content_type=self.content_type,
+                               size=file_size,
+                               importer=self.importer)
+
+    def feed(self, raw_data: bytes, final: bool = False) -> None:
+        try:
+            self.importer.feed(self.decoder.decode(raw_data, final=final))
+        except UnicodeDecodeError:
+            self.abort("CSV file must be UTF-8 encoded")
+        except CSVImportError as e:
+            self.abort(str(e))
+
+    def abort(self, error: str) -> None:
+        """Прерывает разбор запроса без чтения оставшихся данных."""
+        if self.importer.created:
+            error = f"{error} (rows imported before the error: {self.importer.created})"
+        self.error = error
+        raise StopUpload(connection_reset=True)
+
+
+class CSRFProbe(HttpRequest):
+    """
+    Запрос без тела для проверки CSRF: заголовки, cookie и сессия исходного запроса,
+    а вместо тела - токен из URL. Стандартная проверка ищет токен POST запроса
+    в request.POST и поэтому разобрала бы тело исходного запроса.
+    """
+
+    def __init__(self, request: HttpRequest):
+        super().__init__()
+        self.method = request.method
+        self.path = request.path
+        self.META = request.META
+        self.COOKIES = request.COOKIES
+        self.POST = QueryDict(mutable=True)
+        self.POST["csrfmiddlewaretoken"] = request.GET.get("csrfmiddlewaretoken", "")
+        self.request_scheme = request.scheme
+        if hasattr(request, "session"):
+            self.session = request.session
+        # Тестовый клиент отключает проверку CSRF этим флагом
+        self._dont_enforce_csrf_checks = getattr(request, "_dont_enforce_csrf_checks", False)
+
+    @property
+    def scheme(self) -> str:
+        return self.request_scheme
+
+
+@csrf_protect
+def csrf_passed(request: HttpRequest) -> HttpResponse:
+    """Вызывается csrf_protect только для запроса с верным токеном."""
+    return HttpResponse(status=204)
+
+
+def check_csrf_before_body(request: HttpRequest) -> Optional[HttpResponse]:
+    """
+    Проверяет CSRF токен (заголовок X-CSRFToken или параметр URL), не читая тело запроса.
+
+    Возвращает None, если токен верный, иначе ответ 403 CsrfViewMiddleware. После
+    проверки запрос помечается как проверенный, повторно тело для CSRF не разбирается.
+    """
+    response = csrf_passed(CSRFProbe(request))
+    if response.status_code != 204:
+        return response
+
+    request.csrf_processing_done = True
+    return None
+
+
+def install_csv_import_handler(request: HttpRequest, model: Type[models.Model]) -> CSVImportUploadHandler:
+    """Добавляет обработчик в начало цепочки upload_handlers запроса."""
+    handler = CSVImportUploadHandler(request, model)
+    request.upload_handlers.insert(0, handler)
+    return handler
+
+
+class CSVImportViewMixin:
+    """
+    Потоковый импорт CSV в action upload_csv ViewSet'а.
+
+    CSRF для сессии проверяется без чтения тела (check_csrf_before_body), затем
+    аутентификация и права DRF (SessionAuthentication видит, что CSRF уже проверен,
+    и не читает request.POST), и только после этого ставится обработчик: тело
+    запроса читает сам action.
+    """
+    csv_import_model: Type[models.Model]
+    csv_import_handler: Optional[CSVImportUploadHandler] = None
+
+    def initial(self, request, *args, **kwargs):
+        if self.action != "upload_csv":
+            return super().initial(request, *args, **kwargs)
+
+        if request._request.user.is_authenticated and check_csrf_before_body(request._request) is not None:
+            raise exceptions.PermissionDenied("CSRF Failed: CSRF token missing or incorrect.")
+        super().initial(request, *args, **kwargs)
+        self.csv_import_handler = install_csv_import_handler(request, self.csv_import_model)
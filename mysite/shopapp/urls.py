@@ -2,6 +2,8 @@ from django.urls import path, include
 from django.views.decorators.cache import cache_page
 from rest_framework.routers import DefaultRouter
 
+from mysite.db import read_from_replica
+
 from .views import (ShopIndexView,
                     GroupsListView,
 
@@ -39,20 +41,21 @@ urlpatterns = [
 
     path("groups/", GroupsListView.as_view(), name="groups_list"),
 
-    path("products/", ProductsListView.as_view(), name="products_list"),
-    path("products/export", ProductsDataExportView.as_view(), name="products-export"),
+    # списки, детальные страницы, выгрузки и фид читают с реплики (mysite.db.read_from_replica)
+    path("products/", read_from_replica(ProductsListView.as_view()), name="products_list"),
+    path("products/export", read_from_replica(ProductsDataExportView.as_view()), name="products-export"),
     path("products/create", ProductCreateView.as_view(), name="create_product"),
-    path("products/latest/feed", LatestProductsFeed(), name="products-feed"),
-    path("products/<int:pk>", ProductDetailView.as_view(), name="product_details"),
+    path("products/latest/feed", read_from_replica(LatestProductsFeed()), name="products-feed"),
+    path("products/<int:pk>", read_from_replica(ProductDetailView.as_view()), name="product_details"),
     path("products/<int:pk>/update", ProductUpdateView.as_view(), name="product_update"),
     path("products/<int:pk>/confirm_delete", ProductDeleteView.as_view(), name="product_delete"),
 
-    path("orders/", OrdersListView.as_view(), name="orders_list"),
+    path("orders/", read_from_replica(OrdersListView.as_view()), name="orders_list"),
     path("orders/сreate", OrdersCreateView.as_view(), name="create_order"),
-    path("orders/export", OrdersExportView.as_view(), name="order-export"),
-    path("orders/<int:pk>", OrdersDetailView.as_view(), name="order_details"),
+    path("orders/export", read_from_replica(OrdersExportView.as_view()), name="order-export"),
+    path("orders/<int:pk>", read_from_replica(OrdersDetailView.as_view()), name="order_details"),
     path("orders/<int:pk>/update", OrdersUpdateView.as_view(), name="order_update"),
     path("orders/<int:pk>/delete", OrdersDeleteView.as_view(), name="order_delete"),
-    path("users/<int:user_id>/orders/", UserOrdersListView.as_view(), name="user_ordes_list"),
-    path("users/<int:user_id>/orders_export/", UserOrderExportView.as_view(), name="user_ordes_export"),
+    path("users/<int:user_id>/orders/", read_from_replica(UserOrdersListView.as_view()), name="user_ordes_list"),
+    path("users/<int:user_id>/orders_export/", read_from_replica(UserOrderExportView.as_view()), name="user_ordes_export"),
 ]
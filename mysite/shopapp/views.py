@@ -8,9 +8,10 @@ from django.contrib.auth.models import Group, User
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.contrib.syndication.views import Feed
 from django.core.cache import cache
-from django.db.models import QuerySet
+from django.db import transaction
+from django.db.models import Prefetch, QuerySet
 from django.http import HttpResponse, HttpRequest, HttpResponseRedirect, JsonResponse
-from django.shortcuts import render, redirect, reverse, get_object_or_404
+from django.shortcuts import render, redirect, reverse, get_object_or_404, aget_object_or_404
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views import View
@@ -25,16 +26,19 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from .common import save_csv_products, save_csv_orders
+from .common import CSVImportError, save_csv_products, save_csv_orders
 from .forms import CSVImportForm, ProductForm, OrderForm, GroupForm, CSVOrdersImportForm
-from .models import Product, Order, ProductImage
+from .images import ingest_product_images, release_images, release_preview
+from .models import Product, Order, ProductRecommendation, ProductThumbnail
 from .serializers import ProductSerializer, OrderSerializer
+from .thumbnails import schedule_thumbnails
+from .uploadhandlers import CSVImportViewMixin
 
 log = logging.getLogger(__name__)
 
 
 @extend_schema(description="Product API endpoints")
-class ProductViewSet(ModelViewSet):
+class ProductViewSet(CSVImportViewMixin, ModelViewSet):
     """
     ViewSet для полного цикла работы с продуктами через API.
 
@@ -43,14 +47,29 @@ class ProductViewSet(ModelViewSet):
     """
 
     # 🔹 Базовая конфигурация
-    queryset = Product.objects.all()  # Все продукты из БД
+    queryset = Product.all_objects.prefetch_related("thumbnails").all()  # Продукты вместе с миниатюрами, см. get_queryset
     serializer_class = ProductSerializer  # Как сериализовать/десериализовать
+    csv_import_model = Product  # upload_csv импортирует строки по мере загрузки файла
 
     # 🔹 Фильтрация и поиск
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
     search_fields = ["name", "description"]  # Поиск по этим полям
-    filterset_fields = ["name", "description", "price", "discount", "archived"]  # Фильтрация
-    ordering_fields = ["name", "price"]  # Сортировка по клику
+    filterset_fields = {  # Фильтрация, диапазон цены со скидкой - по индексу final_price
+        "name": ["exact"],
+        "description": ["exact"],
+        "price": ["exact"],
+        "discount": ["exact"],
+        "archived": ["exact"],
+        "final_price": ["exact", "gte", "lte"],
+    }
+    ordering_fields = ["name", "price", "final_price"]  # Сортировка по клику
+
+    def get_queryset(self):
+        """Только активные продукты; с фильтром archived - все, чтобы архивные можно было найти и изменить"""
+        queryset = super().get_queryset()
+        if "archived" in getattr(self.request, "query_params", {}):
+            return queryset
+        return queryset.active()
 
     @method_decorator(cache_page(60 * 2))
     def list(self, *args, **kwargs):
@@ -70,6 +89,20 @@ class ProductViewSet(ModelViewSet):
         """Получение детальной информации о продукте"""
         return super().retrieve(*args, **kwargs)
 
+    # 🔹 Часто покупают вместе
+    @extend_schema(summary="Часто покупают вместе",
+                   description="Продукты, чаще всего встречающиеся в заказах вместе с этим, и кол-во таких заказов")
+    @action(methods=["get"], detail=True)
+    def bought_together(self, request: Request, pk=None) -> Response:
+        product = self.get_object()
+        recommendations = (ProductRecommendation.objects.
+                           filter(product=product, recommended__archived=False).
+                           select_related("recommended").
+                           prefetch_related("recommended__thumbnails"))
+
+        return Response([{"count": recommendation.count, "product": self.get_serializer(recommendation.recommended).data}
+                         for recommendation in recommendations])
+
     # 🔹 CSV экспорт продуктов
     @action(methods=["get"], detail=False)
     def download_csv(self, request: HttpRequest) -> HttpResponse:
@@ -87,8 +120,8 @@ class ProductViewSet(ModelViewSet):
         response = HttpResponse(content_type="text/csv")
         response["Content-Disposition"] = 'attachment; filename="products-export.csv"'
 
-        # Оптимизация: грузим только нужные поля
-        queryset = self.filter_queryset(self.queryset)
+        # Оптимизация: грузим только нужные поля, миниатюры для CSV не нужны
+        queryset = self.filter_queryset(self.get_queryset().prefetch_related(None))
         fields = ["name", "description", "price", "discount"]
         queryset = queryset.only(*fields)
 
@@ -125,26 +158,36 @@ class ProductViewSet(ModelViewSet):
             request: Запрос с файлом в form-data (поле 'csv_file')
 
         Returns:
-            Response: JSON с созданными продуктами или ошибкой
+            Response: JSON с итогом импорта (created, failed, errors) или ошибкой
         """
         form = CSVImportForm(request.POST, request.FILES)
 
+        if self.csv_import_handler.error:
+            # Пачки до ошибки уже сохранены: сообщаем, сколько строк импортировано
+            return Response(
+                {"error": "Неверные данные",
+                 "details": {"csv_file": [self.csv_import_handler.error]},
+                 **self.csv_import_handler.importer.summary()},
+                status=400
+            )
+
         if not form.is_valid():
             return Response(
                 {"error": "Неверные данные", "details": form.errors},
                 status=400
             )
 
-        # Импортируем продукты
-        products = save_csv_products(file=form)
+        # Продукты уже сохранены обработчиком загрузки
+        try:
+            summary = save_csv_products(file=form)
+        except CSVImportError as e:
+            return Response({"error": "Неверные данные", "details": {"csv_file": [str(e)]}}, status=400)
 
-        # Возвращаем результат
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return Response(summary)
 
 
 @extend_schema(description="Order API endpoints")
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(CSVImportViewMixin, ModelViewSet):
     """
     ViewSet для полного цикла работы с заказами через API.
 
@@ -154,6 +197,7 @@ class OrderViewSet(ModelViewSet):
     # 🔹 Базовая конфигурация
     queryset = Order.objects.select_related("user").prefetch_related("products").all()
     serializer_class = OrderSerializer
+    csv_import_model = Order
 
     # 🔹 Фильтрация и поиск
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
@@ -215,10 +259,19 @@ class OrderViewSet(ModelViewSet):
             request: Запрос с файлом в form-data (поле 'csv_file')
 
         Returns:
-            Response: JSON с созданными заказами или ошибкой
+            Response: JSON с итогом импорта (created, failed, errors) или ошибкой
         """
         form = CSVOrdersImportForm(request.POST, request.FILES)
 
+        if self.csv_import_handler.error:
+            # Пачки до ошибки уже сохранены: сообщаем, сколько строк импортировано
+            return Response(
+                {"error": "Неверные данные",
+                 "details": {"csv_file": [self.csv_import_handler.error]},
+                 **self.csv_import_handler.importer.summary()},
+                status=400
+            )
+
         if not form.is_valid():
             return Response(
                 {"error": "Неверные данные", "details": form.errors},
@@ -226,11 +279,10 @@ class OrderViewSet(ModelViewSet):
             )
 
         try:
-            orders = save_csv_orders(file=form)
-            serializer = self.get_serializer(orders, many=True)
+            summary = save_csv_orders(file=form)
             return Response({
-                "message": f"Успешно импортировано {len(orders)} заказов",
-                "orders": serializer.data
+                "message": f"Успешно импортировано {summary['created']} заказов",
+                **summary
             })
         except Exception as e:
             return Response(
@@ -272,9 +324,9 @@ class LatestProductsFeed(Feed):
     link = reverse_lazy("shopapp:products_list")
 
     def items(self) -> List[Product]:
-        """Возвращает 5 последних опубликованных статей."""
+        """Возвращает 5 последних активных продуктов (индекс product_active_created_at)."""
         return (
-            Product.objects.filter(created_at__isnull=False)[:5]
+            Product.objects.order_by("-created_at")[:5]
         )
 
     def item_title(self, item: Product) -> str:
@@ -293,7 +345,7 @@ class LatestProductsFeed(Feed):
         return reverse("shopapp:product_details", kwargs={"pk": item.pk})
 
 
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(CSVImportViewMixin, ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
@@ -444,25 +496,28 @@ class UserOrdersListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 class UserOrderExportView(View):
     """Экспорт заказов конкретного пользователя"""
 
-    def get(self, request: HttpRequest, **kwargs) -> JsonResponse:
+    async def get(self, request: HttpRequest, **kwargs) -> JsonResponse:
         """Получения json страницы с заказми пользоватля"""
         user_id = self.kwargs["user_id"]
 
-        get_object_or_404(User, id=user_id)  # Если пользователя нет 404
+        await aget_object_or_404(User, id=user_id)  # Если пользователя нет 404
         cache_key = f"orders_data_export_for_user_{user_id}"
-        orders_data = cache.get(cache_key)
+        orders_data = await cache.aget(cache_key)
         if orders_data is None:
-            user_order = (Order.objects.
-                          filter(user=user_id).
-                          select_related("user").
-                          prefetch_related("products").
-                          order_by("pk"))
+            user_orders = (Order.objects.
+                           filter(user=user_id).
+                           select_related("user").
+                           prefetch_related("products").
+                           order_by("pk"))
 
-            user_order_data_sereilized = OrderSerializer(user_order, many=True).data
+            # Заказы, пользователь и продукты загружаются заранее,
+            # поэтому сериализатор уже не обращается к БД
+            orders = [order async for order in user_orders]
+            orders_data = list(OrderSerializer(orders, many=True).data)
 
-            cache.set(cache_key, orders_data, timeout=120)
+            await cache.aset(cache_key, orders_data, timeout=120)
 
-            return JsonResponse({"user_order": user_order_data_sereilized})
+        return JsonResponse({"user_order": orders_data})
 
 
 class OrdersExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
@@ -491,19 +546,81 @@ class OrdersExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
         return JsonResponse({"orders": orders_data})
 
 
+def bought_together_prefetch() -> Prefetch:
+    """Готовые рекомендации продукта (shopapp.recommendations) без архивных продуктов."""
+    return Prefetch("recommendations",
+                    queryset=(ProductRecommendation.objects.
+                              filter(recommended__archived=False).
+                              select_related("recommended")),
+                    to_attr="bought_together")
+
+
 class ProductDetailView(LoginRequiredMixin, DetailView):
     template_name = "shopapp/product-details.html"
-    queryset = Product.objects.prefetch_related("images")
+    queryset = Product.objects.prefetch_related("images__thumbnails", "thumbnails", bought_together_prefetch())
     context_object_name = "product"
 
 
 class ProductsListView(ListView):
     template_name = "shopapp/products_list.html"
     context_object_name = "products"
-    queryset = Product.objects.filter(archived=False)
+    queryset = Product.objects.prefetch_related(
+        Prefetch("thumbnails", queryset=ProductThumbnail.objects.filter(product_image__isnull=True))
+    )
+
+
+class CachedObjectMixin:
+    """
+    get_object() загружает объект один раз за запрос.
+
+    UserPassesTestMixin.test_func получает объект для проверки прав до dispatch,
+    а UpdateView/DeleteView затем загружают его снова - второй запрос не нужен.
+    """
 
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
 
-class ProductCreateView(UserPassesTestMixin, CreateView):
+
+class ProductImagesMixin:
+    """
+    Сохранение продукта вместе с изображениями галереи из поля images.
+
+    Файлы пишутся в хранилище параллельно, строки ProductImage - одним INSERT.
+    Если какой-то файл не удалось сохранить, транзакция откатывается,
+    а ошибки по файлам показываются в форме. Файлы, записанные в откатившейся
+    транзакции (галерея и новое превью), освобождаются.
+    """
+
+    def form_valid(self, form):
+        images, errors = [], []
+        committed = False
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+
+                images, errors = ingest_product_images(self.object, form.cleaned_data.get("images") or [])
+                if errors:
+                    transaction.set_rollback(True)
+                else:
+                    schedule_thumbnails(self.object.pk)
+            committed = not errors
+        finally:
+            if not committed:
+                release_images(images)
+                release_preview(form.instance)
+
+        if errors:
+            form.add_error("images", errors)
+            return self.form_invalid(form)
+
+        return response
+
+
+class ProductCreateView(UserPassesTestMixin, ProductImagesMixin, CreateView):
     """Класс создания продукта"""
     model = Product
     form_class = ProductForm
@@ -512,21 +629,13 @@ class ProductCreateView(UserPassesTestMixin, CreateView):
     def form_valid(self, form):
         """Функционал автоматичесукого заполнения создателя формы"""
         form.instance.created_by = self.request.user
-        response = super().form_valid(form)
-
-        for image in form.files.getlist("images"):
-            ProductImage.objects.create(
-                product=self.object,
-                image=image
-            )
-
-        return response
+        return super().form_valid(form)
 
     def test_func(self):
         return self.request.user.is_superuser
 
 
-class ProductUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ProductUpdateView(LoginRequiredMixin, UserPassesTestMixin, CachedObjectMixin, ProductImagesMixin, UpdateView):
     """Редактирование продукта."""
     model = Product
     form_class = ProductForm
@@ -551,24 +660,13 @@ class ProductUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
 
         is_author = False
 
-        if product.created_by:  # Если есть создатель продукта
-            is_author = (product.created_by.id == user.id)  # Если пользователь создатель продукта
+        if product.created_by_id:  # Если есть создатель продукта (без загрузки пользователя)
+            is_author = (product.created_by_id == user.id)  # Если пользователь создатель продукта
 
         is_access = is_author and has_permissions
 
         return is_access
 
-    def form_valid(self, form):
-        response = super().form_valid(form)
-
-        for image in form.files.getlist("images"):
-            ProductImage.objects.create(
-                product=self.object,
-                image=image
-            )
-
-        return response
-
 
 class ProductDeleteView(DeleteView):
     model = Product
@@ -582,12 +680,13 @@ class ProductDeleteView(DeleteView):
 
 
 class ProductsDataExportView(View):
+    """Асинхронная выгрузка продуктов в формате JsonResponse"""
 
-    def get(self, request: HttpRequest) -> JsonResponse:
+    async def get(self, request: HttpRequest) -> JsonResponse:
         cahce_key = "products_data_export"
-        products_data = cache.get(cahce_key)
+        products_data = await cache.aget(cahce_key)
         if products_data is None:
-            products = Product.objects.order_by("pk").all()
+            products = Product.all_objects.order_by("pk").only("pk", "name", "price", "archived")
             products_data = [
                 {
                     "pk": product.pk,
@@ -595,8 +694,8 @@ class ProductsDataExportView(View):
                     "price": str(product.price),
                     "archived": product.archived,
                 }
-                for product in products
+                async for product in products
             ]
-            cache.set(cahce_key, products_data, 300)
+            await cache.aset(cahce_key, products_data, 300)
 
         return JsonResponse({"products": products_data})